@@ -0,0 +1,169 @@
+import os, time, sqlite3, logging, threading
+from bisect import bisect_left
+from datetime import datetime, timezone
+from database import connect, immediate
+
+# Temps de séjour et débit des postes, calculés au fil de l'eau depuis le journal des mouvements.
+# fold() intègre les mouvements d'id > meta.analytics_hwm dans des agrégats par poste et par jour
+# (station_day) et un histogramme des séjours (station_dwell_hist) ; les visites en cours sont dans
+# station_visit. Les lectures (API, /analytics) ne touchent que les agrégats, jamais movement.
+# Jours en UTC, comme CURRENT_TIMESTAMP.
+
+log=logging.getLogger(__name__)
+
+FOLD_BATCH=int(os.getenv('ANALYTICS_BATCH','5000'))
+FOLD_SECONDS=float(os.getenv('ANALYTICS_INTERVAL','30'))
+# bornes supérieures (s) des classes de l'histogramme ; au-delà : dernière classe (dwell_max)
+BUCKETS=(60,120,300,600,900,1800,3600,7200,14400,28800,86400,172800,604800)
+HWM_KEY='analytics_hwm'
+
+def epoch(ts):
+    return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp()
+
+def high_water_mark(db):
+    row=db.execute('SELECT value FROM meta WHERE key=?',(HWM_KEY,)).fetchone()
+    return row[0] if row else 0
+
+def pending(db):
+    """Mouvements pas encore intégrés ? (lecture seule : pas de verrou d'écriture à vide)"""
+    return bool(read_movements(db,high_water_mark(db),1))
+
+def read_movements(db, hwm, batch):
+    """Mouvements d'id > hwm dans l'ordre des id. Si l'archive est attachée (alias `archive`, cf. archive.py),
+    ses mouvements sont lus aussi : après un reset, le recalcul repart de zéro et ne doit pas perdre
+    les mouvements déjà archivés. Une ligne présente des deux côtés n'est lue que dans la base principale."""
+    cols='id, item_id, from_location_id, to_location_id, action, CAST(COALESCE(occurred_at,created_at) AS TEXT)'   # heure au poste
+    if not db.execute("SELECT 1 FROM pragma_database_list WHERE name='archive'").fetchone():
+        return db.execute(f'SELECT {cols} FROM main.movement WHERE id>? ORDER BY id LIMIT ?',(hwm,batch)).fetchall()
+    return db.execute(f"""SELECT * FROM (SELECT {cols} FROM main.movement WHERE id>? ORDER BY id LIMIT ?)
+                          UNION ALL
+                          SELECT * FROM (SELECT {cols} FROM archive.movement m WHERE id>?
+                                           AND NOT EXISTS (SELECT 1 FROM main.movement x WHERE x.id=m.id) ORDER BY id LIMIT ?)
+                          ORDER BY 1 LIMIT ?""",(hwm,batch,hwm,batch,batch)).fetchall()
+
+def fold(db, batch=FOLD_BATCH):
+    """Intègre au plus `batch` mouvements après le high-water mark. Retourne le nombre lu.
+
+    Le high-water mark est lu et avancé dans la même transaction d'écriture que les agrégats :
+    plusieurs workers peuvent appeler fold() sans double comptage."""
+    with immediate(db):
+        hwm=high_water_mark(db)
+        rows=read_movements(db,hwm,batch)
+        if not rows: return 0
+        stations={r[0] for r in db.execute("SELECT id FROM location WHERE kind='POSTE'")}
+        nogo_locs={r[0] for r in db.execute("SELECT id FROM location WHERE code LIKE 'ETAGERE-3-%'")}
+        touched={r[1] for r in rows}
+        visits={}
+        for chunk in range(0,len(touched),500):
+            ids=list(touched)[chunk:chunk+500]
+            visits.update({r[0]:list(r[1:]) for r in db.execute(
+                f"SELECT item_id, location_id, arrived_at, nogo FROM station_visit WHERE item_id IN ({','.join('?'*len(ids))})",ids)})
+        days={}; hist={}
+        def day(loc, d):
+            return days.setdefault((loc,d),[0,0,0,0.0,0.0])   # entrées, sorties, nogo, somme, max
+        for _id,item_id,src,dst,action,created in rows:
+            t=epoch(created); d=created[:10]
+            visit=visits.get(item_id)
+            if visit and dst==visit[0] and src==visit[0]:
+                # renvoi au même poste (INSPECT_NOK) : la visite continue, marquée NOGO
+                if action=='INSPECT_NOK': visit[2]=1
+                continue
+            if visit:
+                loc,arrived,nogo=visits.pop(item_id)
+                dwell=max(0.0,t-arrived); agg=day(loc,d)
+                agg[1]+=1; agg[2]+=1 if nogo or dst in nogo_locs else 0; agg[3]+=dwell; agg[4]=max(agg[4],dwell)
+                key=(loc,d,bisect_left(BUCKETS,dwell)); hist[key]=hist.get(key,0)+1
+            if dst in stations:
+                visits[item_id]=[dst,t,1 if action=='INSPECT_NOK' else 0]; day(dst,d)[0]+=1
+        db.executemany("""INSERT INTO station_day(location_id,day,items_in,items_out,nogo,dwell_sum,dwell_max) VALUES (?,?,?,?,?,?,?)
+                          ON CONFLICT(location_id,day) DO UPDATE SET items_in=items_in+excluded.items_in, items_out=items_out+excluded.items_out,
+                            nogo=nogo+excluded.nogo, dwell_sum=dwell_sum+excluded.dwell_sum, dwell_max=MAX(dwell_max,excluded.dwell_max)""",
+                       [k+tuple(v) for k,v in days.items()])
+        db.executemany("""INSERT INTO station_dwell_hist(location_id,day,bucket,n) VALUES (?,?,?,?)
+                          ON CONFLICT(location_id,day,bucket) DO UPDATE SET n=n+excluded.n""",[k+(n,) for k,n in hist.items()])
+        db.executemany('DELETE FROM station_visit WHERE item_id=?',[(i,) for i in touched if i not in visits])
+        db.executemany('INSERT OR REPLACE INTO station_visit(item_id,location_id,arrived_at,nogo) VALUES (?,?,?,?)',
+                       [(i,*v) for i,v in visits.items() if i in touched])
+        db.execute('INSERT INTO meta(key,value) VALUES (?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value',(HWM_KEY,rows[-1][0]))
+    return len(rows)
+
+def fold_all(db, batch=FOLD_BATCH, progress=None):
+    """Rattrape tout le retard, par lots (le verrou d'écriture est rendu entre deux lots)."""
+    total=0
+    while True:
+        n=fold(db,batch); total+=n
+        if progress and n: progress(total)
+        if n<batch: return total
+
+def reset(db):
+    """Vide les agrégats et remet le high-water mark à zéro (avant un recalcul complet)."""
+    with immediate(db):
+        for table in ('station_day','station_dwell_hist','station_visit'): db.execute(f'DELETE FROM {table}')
+        db.execute('DELETE FROM meta WHERE key=?',(HWM_KEY,))
+
+def quantile(hist, q, dwell_max):
+    """Quantile estimé depuis l'histogramme {classe: n} (interpolation linéaire dans la classe)."""
+    total=sum(hist.values())
+    if not total: return None
+    rank=q*total; seen=0
+    for b in sorted(hist):
+        n=hist[b]
+        if seen+n>=rank:
+            lo=BUCKETS[b-1] if b else 0.0
+            hi=min(BUCKETS[b],dwell_max) if b<len(BUCKETS) else dwell_max
+            return round(lo+(max(hi,lo)-lo)*(rank-seen)/n,1)
+        seen+=n
+    return round(dwell_max,1)
+
+def summarize(agg, hist):
+    items_in,items_out,nogo,dwell_sum,dwell_max=agg
+    return {'items_in':items_in,'items_out':items_out,'nogo':nogo,
+            'nogo_rate':round(nogo/items_out,4) if items_out else None,
+            'dwell_mean_s':round(dwell_sum/items_out,1) if items_out else None,
+            'dwell_median_s':quantile(hist,0.5,dwell_max),'dwell_p95_s':quantile(hist,0.95,dwell_max),
+            'dwell_max_s':round(dwell_max,1) if items_out else None}
+
+def station_report(db, since=None, until=None):
+    """Agrégats par poste sur [since, until] (jours 'AAAA-MM-JJ' inclus), total et détail par jour."""
+    where=' AND '.join(c for c,v in (('day>=?',since),('day<=?',until)) if v) or '1'
+    args=[v for v in (since,until) if v]
+    stations={r[0]:{'location_id':r[0],'code':r[1],'days':{},'hist':{},'agg':[0,0,0,0.0,0.0]}
+              for r in db.execute("SELECT id, code FROM location WHERE kind='POSTE' ORDER BY code")}
+    for loc,d,*agg in db.execute(f'SELECT location_id, day, items_in, items_out, nogo, dwell_sum, dwell_max FROM station_day WHERE {where} ORDER BY day',args):
+        st=stations.get(loc)
+        if st is None: continue
+        st['days'][d]=(agg,{}); tot=st['agg']
+        for i in range(4): tot[i]+=agg[i]
+        tot[4]=max(tot[4],agg[4])
+    for loc,d,b,n in db.execute(f'SELECT location_id, day, bucket, n FROM station_dwell_hist WHERE {where}',args):
+        st=stations.get(loc)
+        if st is None or d not in st['days']: continue
+        st['days'][d][1][b]=n; st['hist'][b]=st['hist'].get(b,0)+n
+    return [{'location_id':st['location_id'],'code':st['code'],**summarize(st['agg'],st['hist']),
+             'days':[{'day':d,**summarize(agg,h)} for d,(agg,h) in st['days'].items()]} for st in stations.values()]
+
+def in_progress(db):
+    """Articles actuellement à chaque poste et depuis quand (visites ouvertes)."""
+    return {r[0]:{'items':r[1],'oldest_arrival':r[2]} for r in db.execute(
+        'SELECT location_id, COUNT(*), MIN(arrived_at) FROM station_visit GROUP BY location_id')}
+
+class Folder(threading.Thread):
+    """Intégration périodique en arrière-plan ; sans retard, une simple lecture par tour."""
+    def __init__(self, database, interval=FOLD_SECONDS, archive_path=None):
+        super().__init__(name='analytics-folder',daemon=True)
+        self.database=database; self.interval=interval; self.archive_path=archive_path
+        self._stopping=threading.Event(); self.folded=0; self.last_run=None
+    def stop(self): self._stopping.set()
+    def run(self):
+        # archive attachée : un recalcul en cours (reset) reprend aussi les mouvements archivés
+        db=connect(self.database,timeout=30,attach={'archive':self.archive_path} if self.archive_path else None)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    if pending(db): self.folded+=fold_all(db)
+                    self.last_run=time.time()
+                except sqlite3.Error as e:
+                    log.warning('analytics-folder: %s',e)
+                self._stopping.wait(self.interval)
+        finally:
+            db.close()
@@ -0,0 +1,133 @@
+import json, base64, binascii
+from datetime import datetime, timezone
+
+# API JSON en lecture (/api/v1/...) : pagination par curseur (keyset) sur (created_at, id),
+# ou (updated_at, id) avec updated_since pour la synchro incrémentale. Pas d'OFFSET : chaque page
+# reprend après la dernière clé vue, coût constant quelle que soit la profondeur.
+
+PAGE_DEFAULT=100
+PAGE_MAX=1000
+EXPORT_CHUNK=1000
+
+ITEM_COLUMNS="""i.id, i.sku, i.description, i.size, i.status, i.location_id, l.code AS location_code, l.kind AS location_kind,
+  i.avis_no, i.order_no, i.bl_no, i.photo_path, CAST(i.created_at AS TEXT) AS created_at, CAST(i.updated_at AS TEXT) AS updated_at"""
+MOVEMENT_COLUMNS="""m.id, m.item_id, m.from_location_id, lf.code AS from_code, m.to_location_id, lt.code AS to_code,
+  m.action, m.user, CAST(m.created_at AS TEXT) AS created_at, CAST(COALESCE(m.occurred_at,m.created_at) AS TEXT) AS occurred_at"""
+
+class ApiError(ValueError):
+    pass
+
+def encode_cursor(key, row_key, row_id):
+    raw=json.dumps([key,row_key,row_id],separators=(',',':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, key):
+    error=ApiError('curseur invalide (ou filtre changé en cours de pagination)')
+    try:
+        k,value,row_id=json.loads(base64.urlsafe_b64decode(cursor+'='*(-len(cursor)%4)))
+    except (ValueError,TypeError,binascii.Error):
+        raise error
+    if k!=key or not isinstance(value,str) or not isinstance(row_id,int) or isinstance(row_id,bool): raise error
+    return value,row_id
+
+def timestamp_arg(args, name):
+    """AAAA-MM-JJ ou AAAA-MM-JJ[T ]HH:MM[:SS][fuseau] -> 'AAAA-MM-JJ HH:MM:SS' UTC, le format des colonnes :
+    comparé tel quel en texte, '2026-01-05T10:00' aurait exclu toute la journée."""
+    raw=args.get(name)
+    if not raw: return None
+    try: value=datetime.fromisoformat(raw)
+    except ValueError: raise ApiError(f'{name} doit être une date AAAA-MM-JJ ou AAAA-MM-JJ HH:MM:SS')
+    if value.tzinfo: value=value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def page_limit(args):
+    try: limit=int(args.get('limit',PAGE_DEFAULT))
+    except ValueError: raise ApiError('limit doit être un entier')
+    return max(1,min(PAGE_MAX,limit))
+
+def values(args, name):
+    return [v for v in ','.join(args.getlist(name)).split(',') if v]
+
+def items_query(args):
+    """(sql, conditions, params, colonne de tri, nom de clé, branches) pour /api/v1/items."""
+    where=[]; params=[]; branches=None
+    statuses=values(args,'status')
+    if len(statuses)==1:
+        where.append('i.status=?'); params+=statuses
+    elif statuses:
+        branches=('i.status=?',statuses)
+    kinds=values(args,'location_kind')
+    if kinds:
+        where.append(f"i.location_id IN (SELECT id FROM location WHERE kind IN ({','.join('?'*len(kinds))}))"); params+=kinds
+    if args.get('location'):
+        where.append('i.location_id=(SELECT id FROM location WHERE code=?)'); params.append(args['location'])
+    for field in ('avis_no','order_no','bl_no','sku'):
+        if args.get(field):
+            where.append(f'i.{field}=?'); params.append(args[field])
+    key,column='created','i.created_at'
+    updated_since=timestamp_arg(args,'updated_since')
+    if updated_since:
+        key,column='updated','i.updated_at'
+        where.append('i.updated_at>=?'); params.append(updated_since)
+    sql=f'SELECT {ITEM_COLUMNS} FROM item i LEFT JOIN location l ON l.id=i.location_id'
+    return sql,where,params,column,key,branches
+
+def movements_query(args):
+    where=[]; params=[]
+    if args.get('item_id'):
+        try: params.append(int(args['item_id']))
+        except ValueError: raise ApiError('item_id doit être un entier')
+        where.append('m.item_id=?')
+    actions=values(args,'action')
+    if actions:
+        where.append(f"m.action IN ({','.join('?'*len(actions))})"); params+=actions
+    since,until=timestamp_arg(args,'since'),timestamp_arg(args,'until')
+    if since:
+        where.append('m.created_at>=?'); params.append(since)
+    if until:
+        where.append('m.created_at<?'); params.append(until)
+    # base principale et archive (cf. archive.py), fusionnées page par page
+    sql=tuple(f"""SELECT {MOVEMENT_COLUMNS} FROM {table} m
+      LEFT JOIN location lf ON lf.id=m.from_location_id LEFT JOIN location lt ON lt.id=m.to_location_id"""
+      for table in ('main.movement','archive.movement'))
+    return sql,where,params,'m.created_at','movements',None
+
+def keyset_page(db, query, after, limit):
+    """Une page après la clé `after` ((valeur, id) ou None). Retourne (lignes, clé de la dernière ligne ou None).
+
+    Filtre à plusieurs valeurs (branches) ou plusieurs tables sources (sql en tuple) : une
+    sous-requête keyset par combinaison, chacune servie par son index dans l'ordre, fusionnées en
+    UNION ALL ; sinon l'index ne donne plus l'ordre et SQLite trierait toutes les lignes restantes
+    à chaque page. Une ligne en cours d'archivage (présente des deux côtés) n'est rendue qu'une fois."""
+    sql,where,params,column,_key,branches=query
+    alias,field=column.split('.')
+    where=list(where); params=list(params)
+    if after is not None:
+        where.append(f'({column}, {alias}.id) > (?, ?)'); params+=list(after)
+    order=f' ORDER BY {column}, {alias}.id LIMIT ?'
+    sources=sql if isinstance(sql,tuple) else (sql,)
+    if branches or len(sources)>1:
+        cond,vals=branches or (None,[None]); parts=[]; args=[]
+        for source in sources:
+            for v in vals:
+                conds=where+([cond] if cond else [])
+                parts.append('SELECT * FROM ('+source+(' WHERE '+' AND '.join(conds) if conds else '')+order+')')
+                args+=params+([v] if cond else [])+[limit+1]
+        sql=' UNION ALL '.join(parts)+f' ORDER BY {field}, id LIMIT ?'; args.append(limit+1)
+    else:
+        sql+=(' WHERE '+' AND '.join(where) if where else '')+order; args=params+[limit+1]
+    rows=[]; fetched=0
+    for r in db.execute(sql,args):
+        fetched+=1
+        if not rows or r['id']!=rows[-1]['id']: rows.append(dict(r))
+    # la suite se décide sur les lignes lues, pas sur les lignes rendues : un doublon écarté raccourcit
+    # la page, il ne doit pas faire croire qu'elle est la dernière
+    more=fetched>limit; rows=rows[:limit]
+    return rows,((rows[-1][field],rows[-1]['id']) if more else None)
+
+def export_lines(db, query, after=None):
+    """Toutes les lignes en NDJSON, lues par blocs keyset (pas de lecture ouverte pendant tout l'export)."""
+    while True:
+        rows,after=keyset_page(db,query,after,EXPORT_CHUNK)
+        for r in rows: yield json.dumps(r,ensure_ascii=False)+'\n'
+        if after is None: return
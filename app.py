@@ -1,10 +1,24 @@
 import os
+import csv
 import sqlite3
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, g, abort, send_from_directory, flash
-from werkzeug.utils import secure_filename
-from mir_client import MiRClient
-from processus import Item, Location, can_move, next_status_for_location, choose_slot
+import time
+import click
+from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, request, redirect, url_for, g, abort, send_file, send_from_directory, flash, has_request_context, jsonify, stream_with_context
+import mir_client
+from mir_client import get_client
+import mir_dispatch
+import metrics
+import events
+import photos
+import api
+import analytics
+import archive
+import sync
+from migrations import migrate, counter_drift, rebuild_counters
+from database import immediate, ConnectionPool
+from reception import import_items, parse_rows, detect_format, allocate_skus, format_sku, clean
+from processus import Item, Location, can_move_many, next_status_for_location, fts_query, SlotAllocator, placement_strategy, STATION_ACTIONS
 
 BASE_DIR=os.path.dirname(os.path.abspath(__file__))
 DATA_DIR=os.path.join(BASE_DIR,'data')
@@ -12,29 +26,53 @@ UPLOAD_DIR=os.path.join(BASE_DIR,'uploads')
 os.makedirs(DATA_DIR,exist_ok=True)
 os.makedirs(UPLOAD_DIR,exist_ok=True)
 DATABASE=os.environ.get('DATABASE',os.path.join(DATA_DIR,'stock.db'))
+ARCHIVE_DATABASE=os.environ.get('ARCHIVE_DATABASE') or archive.default_path(DATABASE)
 
 MIR_AFTER_STOCK=os.getenv('MIR_MISSION_AFTER_STOCK')
 ALLOWED_EXTENSIONS={'png','jpg','jpeg','gif','webp'}
+SEARCH_PAGE_SIZE=50
+SEARCH_RANK_MAX=int(os.getenv('SEARCH_RANK_MAX','1000'))   # au-delà, un terme est trop courant pour bm25
+BATCH_MAX=500
+HISTORY_LIMIT=100
+PHOTO_MAX_AGE=365*24*3600
+ANALYTICS_DAYS=30
 
 def allowed_file(filename:str)->bool:
     return '.' in filename and filename.rsplit('.',1)[1].lower() in ALLOWED_EXTENSIONS
 
 def create_app():
+    t_start=time.perf_counter()
     app=Flask(__name__)
+    app.logger.setLevel(os.getenv('LOG_LEVEL','INFO'))
     app.config['UPLOAD_FOLDER']=UPLOAD_DIR
     app.secret_key=os.environ.get('SECRET_KEY','dev-secret')
 
+    # Photos : upload haché au fil de l'eau, variantes générées par un pool de threads
+    app.request_class=photos.PhotoRequest
+    variants=photos.VariantPool(UPLOAD_DIR); app.extensions['photo_variants']=variants
+
+    # Pool borné de connexions réutilisées (SQLITE_POOL_SIZE) ; les GET/HEAD lisent sur une connexion en lecture seule
+    # L'archive des mouvements est attachée à chaque connexion (alias `archive`, cf. archive.py)
+    pool=ConnectionPool(DATABASE,attach={archive.ALIAS:ARCHIVE_DATABASE},detect_types=sqlite3.PARSE_DECLTYPES,factory=metrics.InstrumentedConnection)
+    app.extensions['db_pool']=pool
+
     def get_db():
         if 'db' not in g:
-            g.db=sqlite3.connect(DATABASE,detect_types=sqlite3.PARSE_DECLTYPES)
+            readonly=has_request_context() and request.method in ('GET','HEAD')
+            g.db=pool.acquire(readonly)
             g.db.row_factory=sqlite3.Row
+            if app.config.get('SQL_TRACE'): g.db.set_trace_callback(app.config['SQL_TRACE'])
         return g.db
 
+    # Instrumentation : latence par route, requêtes SQL par requête, appels MiR -> /metrics
+    metrics.init_app(app,mir_client.client_stats,pool.stats)
+    if metrics.observe_mir not in mir_client.observers: mir_client.observers.append(metrics.observe_mir)
+
     @app.teardown_appcontext
     def close_db(exc):
         db=g.pop('db',None)
         if db is not None:
-            db.close()
+            pool.release(db)
 
     @app.route('/healthz')
     def healthz():
@@ -44,134 +82,44 @@ def create_app():
     def readyz():
         try:
             db=get_db(); db.execute('SELECT 1')
-            return {'ready': True}, 200
+            return {'ready': True, 'startup': app.config.get('STARTUP')}, 200
         except Exception as e:
             return {'ready': False, 'error': str(e)}, 500
 
     def init_db():
-        db=get_db(); db.execute('PRAGMA foreign_keys=ON;')
-        # baseline
-        db.execute("""CREATE TABLE IF NOT EXISTS location(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          code TEXT NOT NULL UNIQUE,
-          name TEXT NOT NULL,
-          kind TEXT NOT NULL CHECK(kind IN ('SOL','ETAGERE','POSTE')),
-          capacity INTEGER,
-          size TEXT,
-          active INTEGER NOT NULL DEFAULT 1
-        );""")
-        db.execute("""CREATE TABLE IF NOT EXISTS item(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          sku TEXT NOT NULL,
-          description TEXT,
-          photo_path TEXT,
-          size TEXT CHECK(size IN ('GRAND','PETIT') OR size IS NULL),
-          status TEXT NOT NULL CHECK(status IN ('RECU','PHOTO','INSPECTION','EMBALLAGE','STOCK','NOGO')),
-          location_id INTEGER,
-          avis_no TEXT,
-          order_no TEXT,
-          bl_no TEXT,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          FOREIGN KEY(location_id) REFERENCES location(id) ON DELETE SET NULL
-        );""")
-        db.execute("""CREATE TABLE IF NOT EXISTS movement(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          item_id INTEGER NOT NULL,
-          from_location_id INTEGER,
-          to_location_id INTEGER,
-          action TEXT NOT NULL,
-          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-          user TEXT,
-          FOREIGN KEY(item_id) REFERENCES item(id) ON DELETE CASCADE
-        );""")
-        db.commit()
-        # migration colonnes
-        def column_exists(table, col):
-            rows=db.execute(f"PRAGMA table_info({table})").fetchall()
-            return any(r['name']==col for r in rows)
-        if not column_exists('location','size'):
-            db.execute('ALTER TABLE location ADD COLUMN size TEXT')
-        if not column_exists('location','active'):
-            db.execute('ALTER TABLE location ADD COLUMN active INTEGER NOT NULL DEFAULT 1')
-        if not column_exists('item','size'):
-            db.execute('ALTER TABLE item ADD COLUMN size TEXT')
-        db.commit()
-        # backfill SOL sizes
-        db.execute("""
-            UPDATE location SET size='GRAND'
-            WHERE kind='SOL' AND (size IS NULL OR size='') AND (code GLOB 'S-A[1-4]' OR code GLOB 'S-B[1-4]')
-        """)
-        db.execute("""
-            UPDATE location SET size='PETIT'
-            WHERE kind='SOL' AND (size IS NULL OR size='') AND (
-             code GLOB 'S-C[1-6]' OR code GLOB 'S-D[1-6]' OR code GLOB 'S-E[1-6]' OR
-             code GLOB 'S-F[1-6]' OR code GLOB 'S-G[1-6]' OR code GLOB 'S-H[1-6]')
-        """)
-        db.commit()
-
-        # seed if empty
-        c=db.execute('SELECT COUNT(*) AS c FROM location').fetchone()['c']
-        if c==0:
-            for code in ['S-A1','S-A2','S-A3','S-A4','S-B1','S-B2','S-B3','S-B4']:
-                db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
-                           (code,f'Grand Chariot {code}','SOL',1,'GRAND'))
-            for row in ['C','D','E','F','G','H']:
-                for i in range(1,7):
-                    code=f'S-{row}{i}'
-                    db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
-                               (code,f'Petit Chariot {code}','SOL',1,'PETIT'))
-            for code,name in [('POSTE-PHOTO','Poste Photo'),('POSTE-INSPECTION','Poste Inspection'),('POSTE-EMBALLAGE','Poste Emballage')]:
-                db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
-                           (code,name,'POSTE',1,None))
-            for e in [1,2,3]:
-                for s in ['A','B','C','D']:
-                    code=f'ETAGERE-{e}-{s}'
-                    db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
-                               (code,f'Etagère {e} plateau {s}','ETAGERE',None,None))
-            db.commit()
-
-        # === NORMALISATION DES EMPLACEMENTS (après seed) ===
-        allowed_shelves = [f"ETAGERE-{e}-{s}" for e in (1,2,3) for s in ("A","B","C","D")]
-        placeholders = ",".join(["?"]*len(allowed_shelves))
-        # Désactiver les étagères non référencées ET vides
-        db.execute(f"""
-            UPDATE location
-               SET active = 0
-             WHERE kind = 'ETAGERE'
-               AND code NOT IN ({placeholders})
-               AND id NOT IN (
-                    SELECT l.id
-                      FROM location l
-                      JOIN item i ON i.location_id = l.id
-                     WHERE l.kind='ETAGERE'
-               )
-        """, allowed_shelves)
-        db.commit()
-        # Renommer les 12 plateaux standard
-        for e in (1,2,3):
-            for s in ("A","B","C","D"):
-                code=f"ETAGERE-{e}-{s}"
-                if e in (1,2):
-                    name=f"Étagère {e} (Encours) – Plateau {s}"
-                else:
-                    name=f"Étagère 3 (NOGO) – Plateau {s}"
-                db.execute("UPDATE location SET name=? WHERE code=? AND kind='ETAGERE'", (name, code))
-        db.commit()
-        # Renommer les SOL selon la taille
-        db.execute("""
-            UPDATE location
-               SET name = 'Grand Chariot ' || code
-             WHERE kind='SOL' AND size='GRAND'
-        """)
-        db.execute("""
-            UPDATE location
-               SET name = 'Petit Chariot ' || code
-             WHERE kind='SOL' AND size='PETIT'
-        """)
-        db.commit()
-
-    with app.app_context(): init_db()
+        t0=time.perf_counter(); before,after=migrate(DATABASE); archive.ensure(ARCHIVE_DATABASE)
+        return {'pid':os.getpid(),'schema_from':before,'schema':after,'migrated':after>before,
+                'migrate_ms':round((time.perf_counter()-t0)*1000,1)}
+
+    startup=init_db(); startup['cold_start_ms']=round((time.perf_counter()-t_start)*1000,1)
+    app.config['STARTUP']=startup
+    app.logger.info('worker %(pid)s prêt en %(cold_start_ms)s ms (schéma v%(schema)s, migration %(migrate_ms)s ms)',startup)
+
+    # Missions MiR post-stock : envoyées par un thread du worker, jamais dans la requête
+    dispatcher=None
+    if os.getenv('MIR_DISPATCHER','1' if MIR_AFTER_STOCK or os.getenv('MIR_FLEET') else '0')!='0':
+        dispatcher=mir_dispatch.Dispatcher(DATABASE); dispatcher.start()
+    app.extensions['mir_dispatcher']=dispatcher
+
+    # Flux /events : un broker par worker, un seul poller du statut robot pour tous (bail)
+    broker=poller=None
+    if os.getenv('EVENTS','1')!='0':
+        broker=events.Broker(DATABASE); broker.start()
+        if os.getenv('MIR_POLLER','1')!='0':
+            poller=events.MirStatusPoller(DATABASE,get_client); poller.start()
+    app.extensions['events']=broker; app.extensions['mir_poller']=poller
+
+    # Temps de séjour aux postes : mouvements intégrés aux agrégats en arrière-plan (analytics.py)
+    folder=None
+    if os.getenv('ANALYTICS','1')!='0':
+        folder=analytics.Folder(DATABASE,archive_path=ARCHIVE_DATABASE); folder.start()
+    app.extensions['analytics']=folder
+
+    # Archivage périodique des mouvements anciens, seulement si un horizon est configuré
+    archiver=None
+    if os.getenv('ARCHIVE_DAYS'):
+        archiver=archive.Archiver(DATABASE,ARCHIVE_DATABASE); archiver.start()
+    app.extensions['archiver']=archiver
 
     # helpers
     def item_by_id(item_id):
@@ -180,49 +128,258 @@ def create_app():
         return get_db().execute('SELECT * FROM location WHERE id=?',(loc_id,)).fetchone()
     def location_by_code(code):
         return get_db().execute('SELECT * FROM location WHERE code=?',(code,)).fetchone()
-    def count_items_in_location(loc_id):
-        return get_db().execute('SELECT COUNT(*) AS c FROM item WHERE location_id=?',(loc_id,)).fetchone()['c']
-
-    def row_to_item(row):
-        code=None
-        if row['location_id']:
-            r=get_db().execute('SELECT code FROM location WHERE id=?',(row['location_id'],)).fetchone()
-            code=r['code'] if r else None
-        return Item(id=row['id'], sku=row['sku'], size=row['size'], status=row['status'], location_code=code)
     def row_to_location(row):
         return Location(id=row['id'], code=row['code'], kind=row['kind'], capacity=row['capacity'], size=row['size'])
 
-    def free_sol_slots():
-        return get_db().execute("""
-          SELECT l.* FROM location l
-          LEFT JOIN item it ON it.location_id=l.id
+    # Emplacements SOL libres : allocateur en mémoire du worker, recalé sur meta.slots_generation
+    slots=SlotAllocator(placement_strategy(os.getenv('SLOT_STRATEGY')))
+    app.extensions['slots']=slots
+
+    def slots_generation(db):
+        return db.execute("SELECT value FROM meta WHERE key='slots_generation'").fetchone()['value']
+
+    def free_slot_ids(db):
+        return [r['id'] for r in db.execute("""
+          SELECT l.id FROM location l
           WHERE l.kind='SOL' AND l.capacity=1 AND l.active=1
-          GROUP BY l.id HAVING COUNT(it.id)=0
-          ORDER BY l.code
-        """).fetchall()
+            AND NOT EXISTS (SELECT 1 FROM slot_occupancy s WHERE s.location_id=l.id)
+        """)]
+
+    def slot_allocator():
+        db=get_db(); gen=slots_generation(db)
+        if gen!=slots.generation:
+            with slots.lock:
+                locs=[row_to_location(r) for r in db.execute("SELECT * FROM location WHERE kind='SOL' AND capacity=1 AND active=1")]
+                free=set(free_slot_ids(db))
+                slots.load(locs,[l.id for l in locs if l.id not in free],gen)
+        return slots
+
+    def free_sol_slots():
+        return slot_allocator().free_slots()
+
+    @app.cli.command('check-slots')
+    def check_slots():
+        """Compare l'allocateur d'emplacements à la base."""
+        alloc=slot_allocator(); missing,extra=alloc.diff(free_slot_ids(get_db()))
+        print(f"génération {alloc.generation} : libres {alloc.counts()}, manquants {missing}, en trop {extra}")
+        if missing or extra: raise SystemExit(1)
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--check',is_flag=True,help='Signale les écarts sans reconstruire.')
+    def reconcile_counters(check):
+        """Recompte occupation et statuts, signale les écarts et reconstruit les compteurs."""
+        db=get_db()
+        with immediate(db):
+            drift=counter_drift(db)
+            for table,rows in drift.items():
+                for key,stored,real in rows: print(f'{table} {key} : stocké {stored}, réel {real}')
+            if drift and not check: rebuild_counters(db)
+        print(f"{sum(map(len,drift.values()))} écart(s){'' if check or not drift else ', compteurs reconstruits'}")
+        if drift and check: raise SystemExit(1)
+
+    def reserve_slot(db,item_id,dest):
+        # Libère la place éventuelle de l'article puis en réserve une sur la destination (si capacité finie).
+        # Sous SAVEPOINT : si la destination est prise, l'article garde sa place d'origine.
+        db.execute('SAVEPOINT reserve_slot')
+        try:
+            db.execute('DELETE FROM slot_occupancy WHERE item_id=?',(item_id,))
+            if dest['capacity'] is not None:
+                taken={r['slot'] for r in db.execute('SELECT slot FROM slot_occupancy WHERE location_id=?',(dest['id'],))}
+                slot=next((i for i in range(dest['capacity']) if i not in taken),dest['capacity'])
+                db.execute('INSERT INTO slot_occupancy(location_id,slot,item_id) VALUES (?,?,?)',(dest['id'],slot,item_id))
+        except sqlite3.IntegrityError:
+            db.execute('ROLLBACK TO reserve_slot'); db.execute('RELEASE reserve_slot')
+            raise ValueError(f"{dest['code']} est déjà occupé")
+        except BaseException:
+            db.execute('ROLLBACK TO reserve_slot'); db.execute('RELEASE reserve_slot'); raise
+        db.execute('RELEASE reserve_slot')
+
+    def move_items(moves,action='MOVE',user=None,occurred_at=None):
+        """Déplace un lot [(item_id, to_location_id)] en une transaction ; occurred_at : heure de l'action
+        au poste si elle précède l'enregistrement (file hors ligne, cf. sync.py), created_at reste l'heure d'écriture.
+        Retourne un résultat par mouvement : {'item_id','ok','status','location','error'}."""
+        db=get_db(); item_ids=list({m[0] for m in moves}); dest_ids=list({m[1] for m in moves})
+        def marks(values): return ','.join('?'*len(values))
+        with immediate(db):
+            items={r['id']:r for r in db.execute(f'SELECT i.*, l.code AS loc_code, l.kind AS loc_kind, l.size AS loc_size, l.capacity AS loc_capacity FROM item i LEFT JOIN location l ON l.id=i.location_id WHERE i.id IN ({marks(item_ids)})',item_ids)}
+            dests={r['id']:r for r in db.execute(f'SELECT * FROM location WHERE id IN ({marks(dest_ids)})',dest_ids)}
+            occ={r['location_id']:r['c'] for r in db.execute(f'SELECT location_id, COUNT(*) AS c FROM item WHERE location_id IN ({marks(dest_ids)}) GROUP BY location_id',dest_ids)}
+            known=[(i,d) for i,d in moves if i in items and d in dests]
+            checks=iter(can_move_many([(Item(id=i,sku=items[i]['sku'],size=items[i]['size'],status=items[i]['status'],location_code=items[i]['loc_code']),
+                                        row_to_location(dests[d])) for i,d in known],occ))
+            gen_before=slots_generation(db); results=[]; movements=[]; updates=[]; done=[]; published=[]
+            for item_id,dest_id in moves:
+                it=items.get(item_id); dest=dests.get(dest_id)
+                res={'item_id':item_id,'ok':False,'status':None,'location':dest['code'] if dest else None,'error':None}
+                results.append(res)
+                if not it or not dest:
+                    res['error']='article introuvable' if not it else 'emplacement introuvable'; continue
+                ok,msg=next(checks)
+                if ok:
+                    try: reserve_slot(db,item_id,dest)
+                    except ValueError as e: ok,msg=False,str(e)
+                if not ok:
+                    res['error']=msg; continue
+                new_status=next_status_for_location(row_to_location(dest)) or it['status']
+                movements.append((item_id,it['location_id'],dest_id,action,user,occurred_at))
+                updates.append((dest_id,new_status,item_id)); done.append((it['location_id'],dest_id))
+                res.update(ok=True,status=new_status)
+                published.append(('item-moved',{'id':item_id,'sku':it['sku'],'size':it['size'],'status':new_status,'action':action,
+                                                'photo_path':it['photo_path'],'from_id':it['location_id'],'from_code':it['loc_code'],
+                                                'to_id':dest_id,'to_code':dest['code'],'to_kind':dest['kind'],'to_capacity':dest['capacity']}))
+                if it['loc_capacity'] is not None and it['location_id']!=dest_id:
+                    published.append(('slot-freed',{'id':it['location_id'],'code':it['loc_code'],'kind':it['loc_kind'],
+                                                    'size':it['loc_size'],'capacity':it['loc_capacity']}))
+            db.executemany('INSERT INTO movement(item_id,from_location_id,to_location_id,action,user,occurred_at) VALUES (?,?,?,?,?,?)',movements)
+            db.executemany('UPDATE item SET location_id=?, status=?, updated_at=CURRENT_TIMESTAMP WHERE id=?',updates)
+            if published: events.publish_many(db,published)
+            gen_after=slots_generation(db)
+        # Allocateur à jour avant le lot : on applique le delta au lieu de tout recharger
+        with slots.lock:
+            if slots.generation==gen_before:
+                for from_id,to_id in done:
+                    if from_id: slots.release(from_id)
+                    slots.take(to_id)
+                slots.generation=gen_after
+        return results
 
     def move_item(item_id,to_location_id,action='MOVE',user=None):
-        db=get_db(); it=item_by_id(item_id); dest=location_by_id(to_location_id)
-        if not it or not dest: abort(400)
-        occ=count_items_in_location(dest['id'])
-        ok,msg=can_move(row_to_item(it),row_to_location(dest),occ)
-        if not ok: raise ValueError(msg)
-        db.execute('INSERT INTO movement(item_id,from_location_id,to_location_id,action,user) VALUES (?,?,?,?,?)',
-                   (item_id,it['location_id'],to_location_id,action,user))
-        new_status=next_status_for_location(row_to_location(dest)) or it['status']
-        db.execute('UPDATE item SET location_id=?, status=?, updated_at=CURRENT_TIMESTAMP WHERE id=?',(to_location_id,new_status,item_id))
-        db.commit(); return new_status
+        res=move_items([(item_id,to_location_id)],action,user)[0]
+        if res['error'] in ('article introuvable','emplacement introuvable'): abort(400)
+        if not res['ok']: raise ValueError(res['error'])
+        return res['status']
+
+    def batch_ids(raw):
+        # identifiants d'un lot : entiers uniques ; le reste est rapporté par identifiant, sans bloquer le lot
+        ids=[]; invalid=[]; seen=set()
+        for i in raw:
+            if isinstance(i,bool) or not (isinstance(i,int) or (isinstance(i,str) and i.strip().isdigit())):
+                invalid.append((i,'identifiant invalide')); continue
+            i=int(i)
+            if i in seen: invalid.append((i,'article en double dans le lot')); continue
+            seen.add(i); ids.append(i)
+        return ids,invalid
+
+    @app.route('/api/items/batch',methods=['POST'])
+    def api_items_batch():
+        # {"item_ids":[...], "action":"TO_PHOTO"|...|"PUT_STOCK"|"MOVE", "to_location"|"to_location_id": ..., "user": ...}
+        data=request.get_json(silent=True) or {}
+        raw=data.get('item_ids')
+        action=(data.get('action') or 'MOVE').upper(); user=data.get('user')
+        if not isinstance(raw,list) or not raw: return {'error':'item_ids requis (liste)'},400
+        if len(raw)>BATCH_MAX: return {'error':f'lot limité à {BATCH_MAX} articles'},400
+        ids,unplaced=batch_ids(raw); picked=set()
+        if action=='PUT_STOCK' and data.get('to_location_id') is None and not data.get('to_location'):
+            # mise en stock automatique : un SOL par article, pris dans l'allocateur selon la taille
+            alloc=slot_allocator(); moves=[]
+            sizes={r['id']:r['size'] for r in get_db().execute(f"SELECT id, size FROM item WHERE id IN ({','.join('?'*len(ids))})",ids)}
+            for i in ids:
+                loc=alloc.allocate(sizes[i]) if i in sizes else None
+                if loc: moves.append((i,loc.id)); picked.add(loc.id)
+                else: unplaced.append((i,'article introuvable' if i not in sizes else 'Aucun emplacement SOL compatible'))
+        else:
+            if data.get('to_location_id') is not None:
+                try: dest=location_by_id(int(data['to_location_id']))
+                except (TypeError,ValueError): return {'error':'to_location_id invalide'},400
+            elif data.get('to_location') or action in STATION_ACTIONS: dest=location_by_code(data.get('to_location') or STATION_ACTIONS[action])
+            else: return {'error':'destination ou action requise'},400
+            if not dest: return {'error':'emplacement inconnu'},400
+            moves=[(i,dest['id']) for i in ids]
+        try:
+            results=move_items(moves,action,user) if moves else []
+        except BaseException:
+            for loc_id in picked: slots.release(loc_id)
+            raise
+        for (_i,loc_id),r in zip(moves,results):
+            if not r['ok'] and loc_id in picked: slots.release(loc_id)
+        results+=[{'item_id':i,'ok':False,'status':None,'location':None,'error':err} for i,err in unplaced]
+        ok=sum(r['ok'] for r in results)
+        return {'moved':ok,'failed':len(results)-ok,'results':results},200
+
+    # Synchro des postes (sync.py) : mêmes règles que les formulaires, appliquées opération par opération
+    def sync_item(item_id, expected=None):
+        if item_id is None: raise sync.Rejected('item_id ou item_ref requis')
+        it=get_db().execute('SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON l.id=i.location_id WHERE i.id=?',(item_id,)).fetchone()
+        if not it: raise sync.Rejected('article introuvable')
+        if expected and it['status'] not in expected:
+            raise sync.Conflict(f"{it['sku']} est en {it['status']} (attendu : {'/'.join(expected)})",{'status':it['status'],'location':it['loc_code']})
+        return it
+    def sync_move(it, dest, action, user, at):
+        if not dest: raise sync.Rejected('emplacement inconnu')
+        if at:
+            # pas avant le dernier mouvement de l'article (appliqué depuis par un autre poste) : séjours dans l'ordre
+            last=get_db().execute('SELECT MAX(COALESCE(occurred_at,created_at)) FROM movement WHERE item_id=?',(it['id'],)).fetchone()[0]
+            if last and str(last)>at: at=str(last)
+        res=move_items([(it['id'],dest['id'])],action,user,at)[0]
+        if not res['ok']: raise sync.Conflict(res['error'],{'status':it['status'],'location':it['loc_code']})
+        return {'item_id':it['id'],'item_status':res['status'],'location':res['location']}
+    def sync_create(op, _item_id, _at):
+        fields,err=clean(op)
+        if err: raise sync.Rejected(err)
+        db=get_db()
+        if fields['sku'] and db.execute('SELECT 1 FROM item WHERE sku=?',(fields['sku'],)).fetchone():
+            raise sync.Conflict(f"SKU {fields['sku']} déjà enregistré")
+        new_id,sku=insert_item(db,*(fields[f] for f in ('sku','description','size','avis_no','order_no','bl_no')))
+        return {'item_id':new_id,'sku':sku,'item_status':'RECU'}
+    def sync_move_op(op, item_id, at):
+        action=str(op.get('action') or 'MOVE').upper()
+        expected=[op['expect_status']] if op.get('expect_status') else None
+        it=sync_item(item_id,expected)
+        if op.get('to_location_id') is not None: dest=location_by_id(int(op['to_location_id']))
+        elif op.get('to_location') or action in STATION_ACTIONS: dest=location_by_code(op.get('to_location') or STATION_ACTIONS[action])
+        else: raise sync.Rejected('destination ou action requise')
+        return sync_move(it,dest,action,op.get('user'),at)
+    def sync_inspect(op, item_id, at):
+        result=str(op.get('result') or '').upper()
+        if result not in ('OK','NOK'): raise sync.Rejected('result doit valoir OK ou NOK')
+        it=sync_item(item_id,('INSPECTION',))
+        return sync_move(it,location_by_code(STATION_ACTIONS[f'INSPECT_{result}']),f'INSPECT_{result}',op.get('user'),at)
+    def sync_put_stock(op, item_id, at):
+        it=sync_item(item_id,('EMBALLAGE',))
+        if op.get('slot_id') is not None: slot=location_by_id(int(op['slot_id']))
+        else:
+            slot_loc=slot_allocator().peek(it['size'])
+            if not slot_loc: raise sync.Conflict('Aucun emplacement SOL compatible',{'status':it['status'],'location':it['loc_code']})
+            slot=location_by_id(slot_loc.id)
+        res=sync_move(it,slot,'PUT_STOCK',op.get('user'),at)
+        if MIR_AFTER_STOCK: res['mir_job_id'],_=mir_dispatch.enqueue(get_db(),MIR_AFTER_STOCK,'PUT_STOCK',it['id'],commit=False)
+        return res
+    SYNC_HANDLERS={'create_item':sync_create,'move':sync_move_op,'inspect':sync_inspect,'put_stock':sync_put_stock}
+
+    @app.route('/api/sync',methods=['POST'])
+    def api_sync():
+        # {"station": "POSTE-PHOTO", "ops": [{"key": uuid, "ts": epoch, "kind": "create_item"|"move"|"inspect"|"put_stock", ...}]}
+        try: station,ops=sync.parse(request.get_json(silent=True))
+        except sync.SyncError as e: return {'error':str(e)},400
+        db=get_db()
+        try:
+            with immediate(db):
+                results=sync.apply(db,station,ops,SYNC_HANDLERS)
+                sync.purge(db)
+        except BaseException:
+            # lot annulé en entier : l'allocateur a pu prendre des places qui ne le sont plus en base
+            with slots.lock: slots.generation=None
+            raise
+        metrics.observe_sync(results)
+        if dispatcher and any(r.get('mir_job_id') and not r.get('duplicate') for r in results): dispatcher.wake()
+        return sync.summary(results),200
 
     @app.route('/')
     def index():
-        db=get_db(); kg={'GRAND':{},'PETIT':{}}
-        for size in ['GRAND','PETIT']:
-            total=db.execute("SELECT COUNT(*) AS c FROM location WHERE kind='SOL' AND size=?",(size,)).fetchone()['c']
-            occ=db.execute("SELECT COUNT(*) AS c FROM item i JOIN location l ON i.location_id=l.id WHERE l.kind='SOL' AND l.size=?",(size,)).fetchone()['c']
-            kg[size]={'total':total,'occupied':occ,'free':total-occ}
-        statuses=db.execute('SELECT status, COUNT(*) AS c FROM item GROUP BY status').fetchall()
+        db=get_db(); kg={size:{'total':0,'occupied':0,'free':0} for size in ('GRAND','PETIT')}
+        for r in db.execute("""SELECT l.size, COUNT(*) AS total, COALESCE(SUM(c.items),0) AS occ
+                                FROM location l LEFT JOIN location_count c ON c.location_id=l.id
+                               WHERE l.kind='SOL' AND l.size IN ('GRAND','PETIT') GROUP BY l.size"""):
+            kg[r['size']]={'total':r['total'],'occupied':r['occ'],'free':r['total']-r['occ']}
+        statuses=db.execute('SELECT status, items AS c FROM status_count WHERE items>0 ORDER BY status').fetchall()
         return render_template('index.html',kg=kg,statuses=statuses)
 
+    def insert_item(db,sku,desc,size,avis,od,bl):
+        if not sku: sku=format_sku(allocate_skus(db,1))
+        new_id=db.execute('INSERT INTO item(sku,description,size,avis_no,order_no,bl_no,status,location_id) VALUES (?,?,?,?,?,?, "RECU", NULL)',(sku,desc,size,avis,od,bl)).lastrowid
+        events.publish(db,'item-created',{'id':new_id,'sku':sku,'size':size,'status':'RECU','description':desc})
+        return new_id,sku
+
     @app.route('/items',methods=['GET','POST'])
     def items():
         db=get_db()
@@ -231,42 +388,68 @@ def create_app():
             size=(request.form.get('size') or 'PETIT').upper()
             if size not in ('GRAND','PETIT'):
                 flash('Taille requise (GRAND/PETIT)','error'); return redirect(url_for('items'))
-            if not sku:
-                row=db.execute("SELECT sku FROM item WHERE sku LIKE 'SKU-%' ORDER BY CAST(SUBSTR(sku,5) AS INTEGER) DESC LIMIT 1").fetchone()
-                if row is None: sku='SKU-00001'
-                else: last=int(row['sku'].split('-')[1]); sku=f'SKU-{last+1:05d}'
             desc=(request.form.get('description') or '').strip()
             avis=(request.form.get('avis_no') or '').strip() or None
             od=(request.form.get('order_no') or '').strip() or None
             bl=(request.form.get('bl_no') or '').strip() or None
-            db.execute('INSERT INTO item(sku,description,size,avis_no,order_no,bl_no,status,location_id) VALUES (?,?,?,?,?,?, "RECU", NULL)',(sku,desc,size,avis,od,bl))
-            new_id=db.execute('SELECT last_insert_rowid() AS id').fetchone()['id']
-            db.commit(); flash(f'Article créé {sku} ({size})','ok')
+            with immediate(db): new_id,sku=insert_item(db,sku,desc,size,avis,od,bl)
+            flash(f'Article créé {sku} ({size})','ok')
             return redirect(url_for('item_detail',item_id=new_id))
-        q=(request.args.get('q') or '').strip()
+        q=(request.args.get('q') or '').strip(); page=max(1,request.args.get('page',1,type=int)); has_next=False; after=None
         if q:
-            rows=db.execute("""
-              SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON i.location_id=l.id
-              WHERE i.sku LIKE ? OR i.description LIKE ? OR i.avis_no LIKE ? OR i.order_no LIKE ? OR i.bl_no LIKE ?
-              ORDER BY i.created_at DESC
-            """,(f'%{q}%',)*5).fetchall()
+            match=fts_query(q); rows=[]
+            if match:
+                # bm25 compte tous les documents de chaque terme : classement par pertinence seulement si chaque
+                # terme est rare (≤ SEARCH_RANK_MAX articles, compté sans aller au-delà) ; sinon les plus récents
+                # d'abord, page suivante par clé (rowid) : le coût ne dépend plus de la taille de la table
+                ranked=all(db.execute('SELECT COUNT(*) FROM (SELECT 1 FROM item_fts WHERE item_fts MATCH ? LIMIT ?)',
+                                      (term,SEARCH_RANK_MAX+1)).fetchone()[0]<=SEARCH_RANK_MAX for term in match.split())
+                sql="""SELECT i.*, l.code AS loc_code FROM item_fts
+                        JOIN item i ON i.id=item_fts.rowid LEFT JOIN location l ON i.location_id=l.id
+                       WHERE item_fts MATCH ?"""
+                if ranked:
+                    rows=db.execute(sql+' ORDER BY item_fts.rank LIMIT ? OFFSET ?',(match,SEARCH_PAGE_SIZE+1,(page-1)*SEARCH_PAGE_SIZE)).fetchall()
+                else:
+                    before=request.args.get('after',type=int)
+                    rows=db.execute(sql+(' AND item_fts.rowid<?' if before else '')+' ORDER BY item_fts.rowid DESC LIMIT ?',
+                                    (match,*([before] if before else []),SEARCH_PAGE_SIZE+1)).fetchall()
+                has_next=len(rows)>SEARCH_PAGE_SIZE; rows=rows[:SEARCH_PAGE_SIZE]
+                if has_next and not ranked: after=rows[-1]['id']
         else:
             rows=db.execute("SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON i.location_id=l.id ORDER BY i.created_at DESC LIMIT 200").fetchall()
-        return render_template('items.html',items=rows,q=q)
+        return render_template('items.html',items=rows,q=q,page=page,has_next=has_next,after=after)
+
+    @app.route('/api/items/import',methods=['POST'])
+    def api_items_import():
+        # fichier multipart 'file' ou corps brut (text/csv, application/json, application/x-ndjson)
+        f=request.files.get('file')
+        if f: stream,fmt=f.stream,detect_format(f.filename,f.mimetype)
+        else: stream,fmt=request.stream,detect_format(None,request.mimetype)
+        try:
+            report=import_items(get_db(),parse_rows(stream,fmt))
+        except (ValueError,UnicodeDecodeError,csv.Error) as e:
+            return {'error':f'fichier illisible: {e}'},400
+        return report,200
+
+    @app.cli.command('import-items')
+    @click.argument('path',type=click.Path(exists=True,dir_okay=False))
+    def import_items_command(path):
+        """Importe des articles depuis un fichier CSV, JSON ou NDJSON."""
+        t0=time.perf_counter()
+        with open(path,'rb') as fh: report=import_items(get_db(),parse_rows(fh,detect_format(path)))
+        dt=time.perf_counter()-t0
+        print(f"{report['created']} articles créés, {report['rejected']} rejetés en {dt:.2f}s ({report['created']/dt:.0f}/s), SKU auto {report['skus']}")
+        for e in report['errors']: print(f"  ligne {e['row']}: {e['error']}")
 
     @app.route('/items/<int:item_id>')
     def item_detail(item_id):
         db=get_db(); it=item_by_id(item_id)
         if not it: abort(404)
         loc=location_by_id(it['location_id']) if it['location_id'] else None
-        moves=db.execute("""
-          SELECT m.*, lf.code AS from_code, lt.code AS to_code FROM movement m
-          LEFT JOIN location lf ON m.from_location_id=lf.id
-          LEFT JOIN location lt ON m.to_location_id=lt.id
-          WHERE m.item_id=? ORDER BY m.created_at DESC
-        """,(item_id,)).fetchall()
+        moves=archive.history(db,item_id,HISTORY_LIMIT+1)
+        truncated=len(moves)>HISTORY_LIMIT; moves=moves[:HISTORY_LIMIT]
         sol_free=free_sol_slots()
-        return render_template('item_detail.html',it=it,loc=loc,moves=moves,sol_free=sol_free)
+        return render_template('item_detail.html',it=it,loc=loc,moves=moves,sol_free=sol_free,truncated=truncated)
 
     @app.route('/items/<int:item_id>/move',methods=['POST'])
     def move(item_id):
@@ -307,7 +490,7 @@ def create_app():
     @app.route('/work/photo')
     def work_photo():
         db=get_db(); rows=db.execute("SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON i.location_id=l.id WHERE i.status IN ('RECU','PHOTO') ORDER BY i.created_at ASC").fetchall()
-        return render_template('work_photo.html',items=rows)
+        return render_template('work_photo.html',items=rows,since=events.last_event_id(db))
 
     @app.route('/items/<int:item_id>/upload_photo',methods=['POST'])
     def upload_photo(item_id):
@@ -317,15 +500,14 @@ def create_app():
         f=request.files['photo']
         if f.filename=='': flash('Fichier non sélectionné','error'); return redirect(url_for('item_detail',item_id=item_id))
         if not allowed_file(f.filename): flash('Extension non autorisée','error'); return redirect(url_for('item_detail',item_id=item_id))
-        fname=secure_filename(f.filename); import os as _os
-        base,ext=_os.path.splitext(fname)
-        from datetime import datetime as _dt
-        ts=_dt.utcnow().strftime('%Y%m%d-%H%M%S')
-        final=f"{it['id']}_{base}_{ts}{ext}"
-        path=_os.path.join(UPLOAD_DIR,final)
-        f.save(path)
+        try:
+            final,created=photos.store(UPLOAD_DIR,f.stream)
+        except ValueError as e:
+            flash(str(e),'error'); return redirect(url_for('item_detail',item_id=item_id))
+        variants.schedule(final)
         db=get_db(); db.execute("UPDATE item SET photo_path=?, status='PHOTO', updated_at=CURRENT_TIMESTAMP WHERE id=?",(final,item_id))
-        db.commit(); flash('Photo enregistrée (statut=PHOTO)','ok')
+        events.publish(db,'item-updated',{'id':item_id,'sku':it['sku'],'status':'PHOTO','photo_path':final})
+        db.commit(); flash('Photo enregistrée (statut=PHOTO)' if created else 'Photo déjà connue, réutilisée (statut=PHOTO)','ok')
         return redirect(url_for('item_detail',item_id=item_id))
 
     @app.route('/work/inspection',methods=['GET','POST'])
@@ -339,40 +521,89 @@ def create_app():
             except ValueError as e: flash(str(e),'error')
             return redirect(url_for('work_inspection'))
         rows=db.execute("SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON i.location_id=l.id WHERE i.status IN ('INSPECTION') ORDER BY i.created_at ASC").fetchall()
-        return render_template('work_inspection.html',items=rows)
+        return render_template('work_inspection.html',items=rows,since=events.last_event_id(db))
 
     @app.route('/work/emballage',methods=['GET','POST'])
     def work_emballage():
         db=get_db()
         if request.method=='POST':
             item_id=int(request.form.get('item_id')); it=item_by_id(item_id)
-            slots=free_sol_slots(); slot_id=request.form.get('slot_id')
+            slot_id=request.form.get('slot_id')
             if slot_id:
-                slot=location_by_id(int(slot_id)); slot_loc=Location(id=slot['id'],code=slot['code'],kind=slot['kind'],capacity=slot['capacity'],size=slot['size'])
+                slot=location_by_id(int(slot_id))
             else:
-                slot_loc=choose_slot([Location(id=s['id'],code=s['code'],kind=s['kind'],capacity=s['capacity'],size=s['size']) for s in slots], Item(id=it['id'],sku=it['sku'],size=it['size'],status=it['status'],location_code=None))
+                slot_loc=slot_allocator().peek(it['size']) if it else None
                 slot=location_by_id(slot_loc.id) if slot_loc else None
             if not slot: flash('Aucun emplacement SOL compatible','error'); return redirect(url_for('work_emballage'))
             try:
-                move_item(item_id,slot['id'],'PUT_STOCK')
-                db.execute("UPDATE item SET status='STOCK', updated_at=CURRENT_TIMESTAMP WHERE id=?",(item_id,)); db.commit(); flash('Article stocké','ok')
+                move_item(item_id,slot['id'],'PUT_STOCK'); flash('Article stocké','ok')
                 if MIR_AFTER_STOCK:
-                    try: MiRClient().start_mission(MIR_AFTER_STOCK); flash('MiR: mission post-stock envoyée','ok')
-                    except Exception as e: flash(f'MiR post-stock: {e}','error')
+                    job_id,created=mir_dispatch.enqueue(db,MIR_AFTER_STOCK,'PUT_STOCK',item_id)
+                    if dispatcher: dispatcher.wake()
+                    flash(f"MiR: mission post-stock {'en file' if created else 'déjà en attente'} (#{job_id})",'ok')
             except ValueError as e: flash(str(e),'error')
             return redirect(url_for('work_emballage'))
         rows=db.execute("SELECT i.*, l.code AS loc_code FROM item i LEFT JOIN location l ON i.location_id=l.id WHERE i.status IN ('EMBALLAGE') ORDER BY i.created_at ASC").fetchall()
-        sol_slots=free_sol_slots(); return render_template('work_emballage.html',items=rows,sol_slots=sol_slots)
+        sol_slots=free_sol_slots(); return render_template('work_emballage.html',items=rows,sol_slots=sol_slots,since=events.last_event_id(db))
 
     @app.route('/uploads/<path:filename>')
     def uploads(filename): return send_from_directory(UPLOAD_DIR,filename)
 
+    # Photos adressées par contenu : URL immuable, ETag fort = empreinte, GET conditionnel et Range
+    @app.route('/photos/<variant>/<name>')
+    def photo(variant,name):
+        if not photos.is_addressed(name) or (variant!='original' and variant not in photos.VARIANTS): abort(404)
+        original=photos.blob_path(UPLOAD_DIR,name); digest=name.split('.')[0]
+        path,etag,max_age=original,digest,PHOTO_MAX_AGE
+        if variant!='original':
+            path,etag=photos.variant_path(UPLOAD_DIR,name,variant),f'{digest}-{variant}'
+            if not os.path.exists(path):
+                # variante pas encore prête : original servi, revalidé à chaque affichage
+                variants.schedule(name); path,etag,max_age=original,digest,0
+        if not os.path.exists(path): abort(404)
+        resp=send_file(path,conditional=True,etag=etag,max_age=max_age)
+        if max_age: resp.cache_control.immutable=True
+        else: resp.cache_control.no_cache=True
+        return resp
+
+    @app.template_filter('duration')
+    def duration(seconds):
+        if seconds is None: return '—'
+        seconds=int(seconds)
+        if seconds<3600: return f'{seconds//60} min {seconds%60:02d} s'
+        if seconds<86400: return f'{seconds//3600} h {seconds%3600//60:02d}'
+        return f'{seconds//86400} j {seconds%86400//3600} h'
+
+    @app.template_global()
+    def photo_url(name, variant='thumb'):
+        if not name: return None
+        if not photos.is_addressed(name): return url_for('uploads',filename=name)   # photos d'avant le stockage adressé
+        return url_for('photo',variant=variant,name=name)
+
+    @app.cli.command('photos-backfill')
+    def photos_backfill():
+        """Passe les anciennes photos en stockage adressé et génère les variantes manquantes."""
+        db=get_db(); moved=scheduled=0
+        for r in db.execute('SELECT id, photo_path FROM item WHERE photo_path IS NOT NULL').fetchall():
+            name=r['photo_path']
+            if not photos.is_addressed(name):
+                legacy=os.path.join(UPLOAD_DIR,name)
+                if not os.path.exists(legacy): print(f'article {r["id"]} : {name} introuvable'); continue
+                try:
+                    with open(legacy,'rb') as fh: name,_created=photos.store(UPLOAD_DIR,fh)
+                except ValueError as e: print(f'article {r["id"]} : {e}'); continue
+                with immediate(db): db.execute('UPDATE item SET photo_path=? WHERE id=?',(name,r['id']))
+                moved+=1
+            scheduled+=variants.schedule(name)
+        variants.join()
+        print(f'{moved} photo(s) migrée(s), {scheduled} jeu(x) de variantes générés {variants.stats()}')
+
     @app.route('/locations')
     def locations():
         db=get_db(); kind=request.args.get('kind'); show_all=(request.args.get('show')=='all')
         base="""
-          SELECT l.*, (SELECT COUNT(*) FROM item i WHERE i.location_id=l.id) AS occ
-            FROM location l
+          SELECT l.*, COALESCE(c.items,0) AS occ
+            FROM location l LEFT JOIN location_count c ON c.location_id=l.id
         """
         where=[]; params=[]
         if kind in ('SOL','ETAGERE','POSTE'):
@@ -386,21 +617,180 @@ def create_app():
         locs=db.execute(sql, tuple(params)).fetchall()
         return render_template('locations.html', locations=locs, kind=kind, show_all=show_all)
 
+    # API JSON en lecture : curseur keyset, export NDJSON en flux, ETag/304 (cf. api.py)
+    def api_page(name, build):
+        try:
+            query=build(); limit=api.page_limit(request.args)
+            after=api.decode_cursor(request.args['cursor'],query[4]) if request.args.get('cursor') else None
+        except api.ApiError as e:
+            return {'error':str(e)},400
+        db=get_db()
+        if request.args.get('format')=='ndjson' or request.accept_mimetypes.best=='application/x-ndjson':
+            return Response(stream_with_context(api.export_lines(db,query,after)),mimetype='application/x-ndjson')
+        rows,last=api.keyset_page(db,query,after,limit)
+        cursor=api.encode_cursor(query[4],*last) if last else None
+        resp=jsonify({name:rows,'next_cursor':cursor})
+        if cursor:
+            resp.headers['Link']=f'<{url_for(request.endpoint,**{**request.args.to_dict(flat=False),"cursor":cursor})}>; rel="next"'
+        resp.cache_control.no_cache=True; resp.add_etag()
+        return resp.make_conditional(request)
+
+    @app.route('/api/v1/items')
+    def api_v1_items():
+        # ?status=STOCK,NOGO &location_kind=SOL &location=S-A1 &avis_no= &order_no= &bl_no= &sku= &updated_since=
+        return api_page('items',lambda: api.items_query(request.args))
+
+    @app.route('/api/v1/movements')
+    def api_v1_movements():
+        # ?item_id= &action=PUT_STOCK,MOVE &since= &until=
+        return api_page('movements',lambda: api.movements_query(request.args))
+
+    @app.route('/api/v1/items/<int:item_id>')
+    def api_v1_item(item_id):
+        db=get_db()
+        it=db.execute(f'SELECT {api.ITEM_COLUMNS} FROM item i LEFT JOIN location l ON l.id=i.location_id WHERE i.id=?',(item_id,)).fetchone()
+        if not it: return {'error':'article introuvable'},404
+        resp=jsonify({**dict(it),'movements':url_for('api_v1_movements',item_id=item_id)})
+        resp.cache_control.no_cache=True; resp.add_etag()
+        return resp.make_conditional(request)
+
+    @app.route('/api/v1/locations')
+    def api_v1_locations():
+        where=[]; params=[]
+        kinds=api.values(request.args,'kind')
+        if kinds: where.append(f"l.kind IN ({','.join('?'*len(kinds))})"); params+=kinds
+        if request.args.get('active') in ('0','1'): where.append('l.active=?'); params.append(int(request.args['active']))
+        rows=get_db().execute(f"""SELECT l.id, l.code, l.name, l.kind, l.size, l.capacity, l.active, COALESCE(c.items,0) AS items
+                                   FROM location l LEFT JOIN location_count c ON c.location_id=l.id
+                                  {'WHERE '+' AND '.join(where) if where else ''} ORDER BY l.kind, l.code""",params).fetchall()
+        resp=jsonify({'locations':[dict(r) for r in rows]})
+        resp.cache_control.no_cache=True; resp.add_etag()
+        return resp.make_conditional(request)
+
+    def analytics_range():
+        until=request.args.get('until') or datetime.utcnow().strftime('%Y-%m-%d')
+        since=request.args.get('since')
+        try: end=datetime.strptime(until,'%Y-%m-%d')
+        except ValueError: raise api.ApiError('until doit être une date AAAA-MM-JJ')
+        if not since: since=(end-timedelta(days=ANALYTICS_DAYS-1)).strftime('%Y-%m-%d')
+        try: datetime.strptime(since,'%Y-%m-%d')
+        except ValueError: raise api.ApiError('since doit être une date AAAA-MM-JJ')
+        return since,until
+
+    @app.route('/api/v1/analytics/stations')
+    def api_v1_station_analytics():
+        # ?since=AAAA-MM-JJ &until=AAAA-MM-JJ (défaut : les 30 derniers jours) ; lit uniquement les agrégats
+        try: since,until=analytics_range()
+        except api.ApiError as e: return {'error':str(e)},400
+        db=get_db(); current=analytics.in_progress(db)
+        stations=[{**st,'in_progress':current.get(st['location_id'],{}).get('items',0)} for st in analytics.station_report(db,since,until)]
+        resp=jsonify({'since':since,'until':until,'folded_through':analytics.high_water_mark(db),'stations':stations})
+        resp.cache_control.no_cache=True; resp.add_etag()
+        return resp.make_conditional(request)
+
+    @app.route('/analytics')
+    def analytics_view():
+        try: since,until=analytics_range()
+        except api.ApiError as e: flash(str(e),'error'); return redirect(url_for('analytics_view'))
+        db=get_db()
+        return render_template('analytics.html',stations=analytics.station_report(db,since,until),current=analytics.in_progress(db),since=since,until=until)
+
+    @app.cli.command('archive-movements')
+    @click.option('--days',type=int,default=archive.ARCHIVE_DAYS,show_default=True,help='Horizon : mouvements plus anciens archivés.')
+    @click.option('--enable-incremental-vacuum',is_flag=True,help='Une fois : passe la base en auto_vacuum=INCREMENTAL (VACUUM complet).')
+    def archive_cmd(days,enable_incremental_vacuum):
+        """Archive les mouvements anciens des articles STOCK/NOGO, compacte et compare taille/latence avant/après."""
+        db=get_db()
+        def show(label,r):
+            s=r['sizes']
+            print(f"{label}: base {s['main']['bytes']/1e6:.1f} Mo ({s['main']['free_bytes']/1e6:.1f} libres), archive {s['archive']['bytes']/1e6:.1f} Mo, "
+                  f"mouvements {r['movements']['main']} + {r['movements']['archive']} archivés, historique p50 {r['history']['p50_ms']} ms p95 {r['history']['p95_ms']} ms")
+        show('avant',archive.report(db))
+        if enable_incremental_vacuum: archive.enable_incremental_vacuum(db)
+        t0=time.perf_counter()
+        n=archive.archive_movements(db,days,progress=lambda total: print(f'{total} mouvement(s)…'))
+        skipped=archive.compact(db)
+        print(f'{n} mouvement(s) archivé(s) en {time.perf_counter()-t0:.1f} s (horizon {days} j)')
+        for schema in skipped: print(f'{schema} : auto_vacuum inactif, place non rendue (--enable-incremental-vacuum)')
+        show('après',archive.report(db))
+
+    @app.cli.command('analytics-backfill')
+    @click.option('--rebuild',is_flag=True,help="Repart de zéro (vide les agrégats) au lieu de reprendre au high-water mark.")
+    def analytics_backfill(rebuild):
+        """Intègre l'historique des mouvements aux agrégats des postes."""
+        db=get_db(); t0=time.perf_counter()
+        if rebuild: analytics.reset(db)
+        n=analytics.fold_all(db,progress=lambda total: print(f'{total} mouvement(s)…'))
+        print(f'{n} mouvement(s) intégré(s) en {time.perf_counter()-t0:.1f} s (high-water mark {analytics.high_water_mark(db)})')
+
     @app.route('/api/mir/status')
     def api_mir_status():
-        try: return MiRClient().status(),200
+        try: return get_client().status(),200
         except Exception as e: return {'error':str(e)},502
     @app.route('/api/mir/missions')
     def api_mir_missions():
-        try: return {'missions':MiRClient().missions()},200
+        try: return {'missions':get_client().missions()},200
         except Exception as e: return {'error':str(e)},502
     @app.route('/api/mir/mission/<guid>',methods=['POST'])
     def api_mir_start(guid):
-        try: return {'ok':True,'result':MiRClient().start_mission(guid)},200
+        try: return {'ok':True,'result':get_client().start_mission(guid)},200
         except Exception as e: return {'ok':False,'error':str(e)},502
+    @app.route('/api/mir/stats')
+    def api_mir_stats():
+        try: return get_client().stats(),200
+        except Exception as e: return {'error':str(e)},502
+
+    @app.route('/api/mir/jobs')
+    def api_mir_jobs():
+        return {'jobs':[dict(r) for r in mir_dispatch.recent_jobs(get_db(),request.args.get('limit',50,type=int))]},200
+    @app.route('/api/mir/jobs/<int:job_id>')
+    def api_mir_job(job_id):
+        r=get_db().execute('SELECT * FROM mir_job WHERE id=?',(job_id,)).fetchone()
+        if not r: abort(404)
+        return dict(r),200
+
+    @app.route('/api/mir/fleet')
+    def api_mir_fleet():
+        if not dispatcher: return {'error':'dispatcher inactif (MIR_DISPATCHER=0)'},503
+        return {'robots':dispatcher.fleet.snapshot(),'busy':sorted(mir_dispatch.busy_robots(get_db()))},200
+    @app.route('/api/mir/transport',methods=['POST'])
+    def api_mir_transport():
+        """Transport d'articles vers un poste : {item_ids, destination} ; regroupés dans la mission en attente du poste."""
+        data=request.get_json(silent=True) or {}
+        if not isinstance(data.get('item_ids'),list) or not data['item_ids']: return {'error':'item_ids requis (liste)'},400
+        if len(data['item_ids'])>BATCH_MAX: return {'error':f'lot limité à {BATCH_MAX} articles'},400
+        ids,invalid=batch_ids(data['item_ids'])
+        if invalid: return {'error':'item_ids invalides','invalid':[{'item_id':i,'error':e} for i,e in invalid]},400
+        db=get_db()
+        known={r[0] for r in db.execute(f"SELECT id FROM item WHERE id IN ({','.join('?'*len(ids))})",ids)}
+        unknown=[i for i in ids if i not in known]
+        if unknown: return {'error':'articles inconnus','unknown':unknown},400
+        try: missions={m.get('name'):m.get('guid') for m in get_client().missions()}
+        except Exception as e: return {'error':str(e)},502
+        guid=missions.get(data.get('destination'))
+        if not guid: return {'error':'mission inconnue pour cette destination'},400
+        with immediate(db):
+            for item_id in ids: job_id,_=mir_dispatch.enqueue(db,guid,'TRANSPORT',item_id,commit=False)
+        if dispatcher: dispatcher.wake()
+        return {'ok':True,'job_id':job_id,'items':len(ids)},202
 
     @app.route('/mir')
-    def mir_dashboard(): return render_template('mir_dashboard.html')
+    def mir_dashboard(): return render_template('mir_dashboard.html',since=events.last_event_id(get_db()))
+
+    @app.route('/events')
+    def events_stream():
+        # ?types=item-moved,slot-freed  ?since=<id> (ou en-tête Last-Event-ID à la reconnexion)
+        if broker is None: abort(404)
+        db=get_db(); types=[t for t in (request.args.get('types') or '').split(',') if t]
+        last=request.headers.get('Last-Event-ID') or request.args.get('since') or ''
+        after=int(last) if last.isdigit() else events.last_event_id(db)
+        first=db.execute('SELECT MIN(id) FROM event_log').fetchone()[0]
+        sub=broker.subscribe(types,after)
+        stream=broker.stream(sub,after)
+        if first is not None and after<first-1:
+            # événements déjà purgés : le client doit recharger sa vue
+            broker.unsubscribe(sub); stream=iter([events.format_sse(events.last_event_id(db),'resync','{}')])
+        return Response(stream,mimetype='text/event-stream',headers={'Cache-Control':'no-cache','X-Accel-Buffering':'no'})
 
     return app
 
@@ -0,0 +1,158 @@
+import os, time, random, sqlite3, logging, threading
+from datetime import datetime, timedelta
+from database import connect, immediate
+import analytics
+
+# Archivage des mouvements anciens dans une base SQLite attachée (alias `archive`, par défaut
+# <base>-archive.db à côté de la base principale, ARCHIVE_DATABASE pour un autre volume).
+# Ne partent que les mouvements plus vieux que l'horizon, d'articles sortis du flux (STOCK/NOGO) et
+# déjà intégrés aux agrégats des postes (id <= meta.analytics_hwm). L'historique d'un article lit
+# les deux bases (history(), /api/v1/movements) ; la base principale rend la place par
+# incremental_vacuum au lieu d'un VACUUM complet.
+
+log=logging.getLogger(__name__)
+
+ALIAS='archive'
+ARCHIVE_DAYS=int(os.getenv('ARCHIVE_DAYS') or 365)
+ARCHIVE_BATCH=int(os.getenv('ARCHIVE_BATCH','5000'))
+ARCHIVE_EVERY=float(os.getenv('ARCHIVE_INTERVAL_HOURS','24'))*3600
+ARCHIVED_STATUSES=('STOCK','NOGO')
+COLUMNS='id, item_id, from_location_id, to_location_id, action, created_at, user, occurred_at'
+HISTORY_SQL="""SELECT * FROM (SELECT m.*, COALESCE(m.occurred_at, m.created_at) AS moved_at, lf.code AS from_code, lt.code AS to_code FROM {table} m
+  LEFT JOIN location lf ON m.from_location_id=lf.id
+  LEFT JOIN location lt ON m.to_location_id=lt.id
+  WHERE m.item_id=?{dedupe} ORDER BY m.created_at DESC, m.id DESC LIMIT ?)"""
+
+def default_path(database):
+    return os.path.splitext(database)[0]+'-archive.db'
+
+def ensure(path):
+    """Crée la base d'archive si besoin (même colonnes que movement, sans clé étrangère : item est ailleurs)."""
+    db=connect(path,isolation_level=None)
+    try:
+        if db.execute('PRAGMA user_version').fetchone()[0]>=2: return
+        db.execute('BEGIN IMMEDIATE')
+        db.execute("""CREATE TABLE IF NOT EXISTS movement(
+          id INTEGER PRIMARY KEY,
+          item_id INTEGER NOT NULL,
+          from_location_id INTEGER,
+          to_location_id INTEGER,
+          action TEXT NOT NULL,
+          created_at TIMESTAMP,
+          user TEXT,
+          occurred_at TIMESTAMP
+        )""")
+        if 'occurred_at' not in {r[1] for r in db.execute('PRAGMA table_info(movement)')}:   # archive v1
+            db.execute('ALTER TABLE movement ADD COLUMN occurred_at TIMESTAMP')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_archive_item_created ON movement(item_id, created_at)')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_archive_created ON movement(created_at)')
+        db.execute('PRAGMA user_version=2')
+        db.execute('COMMIT')
+    finally:
+        db.close()
+
+def history(db, item_id, limit):
+    """Derniers mouvements d'un article, base principale et archive confondues (plus récent d'abord).
+    Une ligne copiée mais pas encore supprimée de la base principale n'est lue que dans celle-ci."""
+    sql=(HISTORY_SQL.format(table='main.movement',dedupe='')+' UNION ALL '+
+         HISTORY_SQL.format(table=f'{ALIAS}.movement',dedupe=' AND NOT EXISTS (SELECT 1 FROM main.movement x WHERE x.id=m.id)'))
+    return db.execute(sql+' ORDER BY created_at DESC, id DESC LIMIT ?',(item_id,limit,item_id,limit,limit)).fetchall()
+
+def archive_movements(db, days=ARCHIVE_DAYS, batch=ARCHIVE_BATCH, progress=None):
+    """Déplace les mouvements archivables par lots. Retourne le nombre archivé.
+
+    En WAL, une transaction sur deux bases attachées n'est pas atomique pour l'ensemble : chaque lot
+    est d'abord copié (INSERT OR IGNORE, rejouable) et validé, puis supprimé de la base principale
+    seulement s'il est bien dans l'archive. Une coupure entre les deux laisse un doublon, jamais un trou."""
+    cutoff=(datetime.utcnow()-timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    statuses=','.join('?'*len(ARCHIVED_STATUSES))
+    after=('',0); total=0
+    while True:
+        with immediate(db):
+            hwm=analytics.high_water_mark(db)
+            rows=db.execute(f"""SELECT CAST(m.created_at AS TEXT), m.id FROM main.movement m JOIN item i ON i.id=m.item_id
+                                 WHERE m.created_at<? AND (m.created_at, m.id)>(?, ?) AND m.id<=? AND i.status IN ({statuses})
+                                 ORDER BY m.created_at, m.id LIMIT ?""",(cutoff,*after,hwm,*ARCHIVED_STATUSES,batch)).fetchall()
+            if not rows: return total
+            ids=[r[1] for r in rows]; marks=','.join('?'*len(ids))
+            db.execute(f'INSERT OR IGNORE INTO {ALIAS}.movement({COLUMNS}) SELECT {COLUMNS} FROM main.movement WHERE id IN ({marks})',ids)
+        with immediate(db):
+            total+=db.execute(f'DELETE FROM main.movement WHERE id IN ({marks}) AND id IN (SELECT id FROM {ALIAS}.movement WHERE id IN ({marks}))',
+                              ids+ids).rowcount
+        after=tuple(rows[-1])
+        if progress: progress(total)
+        if len(rows)<batch: return total
+
+def sizes(db):
+    """Taille (octets) et pages libres de chaque base ; auto_vacuum 2 = INCREMENTAL."""
+    out={}
+    for schema in ('main',ALIAS):
+        page=db.execute(f'PRAGMA {schema}.page_size').fetchone()[0]
+        out[schema]={'bytes':db.execute(f'PRAGMA {schema}.page_count').fetchone()[0]*page,
+                     'free_bytes':db.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]*page,
+                     'auto_vacuum':db.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0]}
+    return out
+
+def compact(db, pages=0):
+    """Rend au système les pages libres (incremental_vacuum, pages=0 : toutes) puis tronque le WAL.
+    Retourne les bases qui ne sont pas en auto_vacuum=INCREMENTAL (cf. enable_incremental_vacuum)."""
+    skipped=[]
+    for schema in ('main',ALIAS):
+        if db.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0]!=2: skipped.append(schema); continue
+        # executescript : le module sqlite3 ne fait qu'une étape d'un PRAGMA sans résultat (une seule page rendue)
+        db.executescript(f'PRAGMA {schema}.incremental_vacuum({int(pages)});')
+    db.execute('PRAGMA main.wal_checkpoint(TRUNCATE)').fetchall()
+    db.execute(f'PRAGMA {ALIAS}.wal_checkpoint(TRUNCATE)').fetchall()
+    return skipped
+
+def enable_incremental_vacuum(db, schema='main'):
+    """Passe une base existante en auto_vacuum=INCREMENTAL : un VACUUM complet, une seule fois
+    (réécrit tout le fichier : prévoir l'espace disque libre équivalent)."""
+    if db.in_transaction: db.commit()
+    db.execute(f'PRAGMA {schema}.auto_vacuum=INCREMENTAL')
+    db.execute(f'VACUUM {schema}')
+
+def history_latency(db, sample=200, limit=100):
+    """Latence (ms) de l'historique article sur un échantillon : p50, p95."""
+    ids=[r[0] for r in db.execute('SELECT id FROM item ORDER BY random() LIMIT ?',(sample,))]
+    times=[]
+    for item_id in ids:
+        t0=time.perf_counter(); history(db,item_id,limit); times.append((time.perf_counter()-t0)*1000)
+    times.sort()
+    if not times: return {'p50_ms':None,'p95_ms':None}
+    return {'p50_ms':round(times[len(times)//2],3),'p95_ms':round(times[min(len(times)-1,int(len(times)*0.95))],3)}
+
+def report(db, sample=200):
+    return {'sizes':sizes(db),
+            'movements':{schema:db.execute(f'SELECT COUNT(*) FROM {schema}.movement').fetchone()[0] for schema in ('main',ALIAS)},
+            'history':history_latency(db,sample)}
+
+class Archiver(threading.Thread):
+    """Archivage périodique (ARCHIVE_INTERVAL_HOURS) ; un seul worker par période grâce à meta.archive_last_run."""
+    def __init__(self, database, archive_path, days=ARCHIVE_DAYS, every=ARCHIVE_EVERY):
+        super().__init__(name='movement-archiver',daemon=True)
+        self.database=database; self.archive_path=archive_path; self.days=days; self.every=every
+        self._stopping=threading.Event(); self.archived=0
+    def stop(self): self._stopping.set()
+    def claim(self, db):
+        now=time.time()
+        with immediate(db):
+            row=db.execute("SELECT value FROM meta WHERE key='archive_last_run'").fetchone()
+            if row and now-float(row[0])<self.every: return False
+            db.execute("INSERT INTO meta(key,value) VALUES ('archive_last_run',?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",(now,))
+        return True
+    def run(self):
+        self._stopping.wait(random.uniform(30,120))   # pas au démarrage de tous les workers à la fois
+        db=connect(self.database,timeout=30,attach={ALIAS:self.archive_path})
+        try:
+            while not self._stopping.is_set():
+                try:
+                    if self.claim(db):
+                        n=archive_movements(db,self.days); self.archived+=n
+                        if n: compact(db)
+                        log.info('movement-archiver: %s mouvement(s) archivé(s)',n)
+                except sqlite3.Error as e:
+                    log.warning('movement-archiver: %s',e)
+                self._stopping.wait(min(self.every,3600))
+        finally:
+            db.close()
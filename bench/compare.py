@@ -0,0 +1,40 @@
+import sys, json, argparse
+
+# Compare deux résultats de bench/run.py ; code retour 1 si régression.
+#   python bench/compare.py bench/results/avant.json bench/results/apres.json --threshold 20
+
+def load(path):
+    with open(path) as f: return json.load(f)
+
+def compare(base, new, threshold=20.0, min_ms=2.0):
+    rows=[]; regressions=[]
+    for name in sorted(set(base['routes'])|set(new['routes'])):
+        a=base['routes'].get(name); b=new['routes'].get(name)
+        if not a or not b:
+            rows.append((name,a,b,None,None)); continue
+        d99=(b['p99_ms']-a['p99_ms'])/a['p99_ms']*100 if a['p99_ms'] else 0.0
+        drps=(b['rps']-a['rps'])/a['rps']*100 if a['rps'] else 0.0
+        rows.append((name,a,b,d99,drps))
+        if d99>threshold and b['p99_ms']-a['p99_ms']>min_ms: regressions.append(f'{name}: p99 {a["p99_ms"]} -> {b["p99_ms"]} ms (+{d99:.0f}%)')
+        if b['errors']>a['errors']: regressions.append(f'{name}: erreurs 5xx {a["errors"]} -> {b["errors"]}')
+    return rows,regressions
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument('base'); ap.add_argument('new')
+    ap.add_argument('--threshold',type=float,default=20.0,help='hausse de p99 tolérée en %%')
+    ap.add_argument('--min-ms',type=float,default=2.0,help='écart absolu minimal pour compter une régression')
+    a=ap.parse_args()
+    base,new=load(a.base),load(a.new)
+    for m in (base,new): print(f"{m['meta']['label']} ({m['meta'].get('git')}, {m['meta']['timestamp']}) : {m['total']['rps']} req/s, p99 {m['total']['p99_ms']} ms")
+    rows,regressions=compare(base,new,a.threshold,a.min_ms)
+    print(f"{'route':<40}{'p50 avant':>11}{'après':>9}{'p99 avant':>11}{'après':>9}{'Δp99':>8}{'Δrps':>8}")
+    for name,x,y,d99,drps in rows:
+        if d99 is None: print(f'{name:<40} (absente d\'un des deux résultats)'); continue
+        print(f"{name:<40}{x['p50_ms']:>11}{y['p50_ms']:>9}{x['p99_ms']:>11}{y['p99_ms']:>9}{d99:>+7.0f}%{drps:>+7.0f}%")
+    print(f"SQLite attente verrou : {base['sqlite']['lock_wait_avg_ms']} -> {new['sqlite']['lock_wait_avg_ms']} ms/transaction")
+    for r in regressions: print('RÉGRESSION', r)
+    return 1 if regressions else 0
+
+if __name__=='__main__':
+    sys.exit(main())
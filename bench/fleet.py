@@ -0,0 +1,102 @@
+import os, sys, json, time, random, sqlite3, argparse, platform, tempfile
+
+# Banc du dispatcher de flotte contre la flotte simulée (mir_sim.py), hors ligne et en temps accéléré :
+# des articles arrivent vers les postes au rythme --rate (par heure simulée), le dispatcher les
+# regroupe par mission et les confie aux robots libres. Rapporte débit (articles et missions par
+# heure simulée), latence de file (arrivée -> envoi) et de livraison (arrivée -> mission terminée).
+#   python bench/fleet.py --robots 3 --items 600 --rate 400 --speed 200
+#   python bench/fleet.py --robots 1 --fail-rate 0.05 --abort-rate 0.02
+#   python bench/fleet.py --robots 2 --kill-claims 5   (workers morts en plein envoi : bail repris, mission fusionnée)
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+from bench.run import percentile
+
+def run(args):
+    os.environ['MIR_DRY_RUN']='false'
+    import mir_dispatch
+    from migrations import migrate
+    from mir_client import MiRClient, DRY_MISSIONS
+    from mir_sim import Simulator
+    from fleet import Fleet
+    speed=args.speed
+    # attentes du dispatcher (temps réel) ramenées à l'échelle du temps simulé
+    mir_dispatch.BACKOFF_BASE=args.backoff/speed; mir_dispatch.BACKOFF_MAX=60/speed
+    tmp=tempfile.mkdtemp(prefix='fleet-bench-'); path=os.path.join(tmp,'fleet.db'); migrate(path)
+    sim=Simulator(args.robots,args.mission_seconds,speed,args.latency_ms,args.latency_ms/2,args.fail_rate,args.abort_rate,args.seed).serve()
+    fleet=Fleet({name:MiRClient(base=url,status_ttl=1/speed,retries=2) for name,url in sim.urls().items()})
+    dispatcher=mir_dispatch.Dispatcher(path,fleet,poll=5/speed,track_every=5/speed); dispatcher.start()
+    rnd=random.Random(args.seed); guids=[m['guid'] for m in DRY_MISSIONS]
+    db=sqlite3.connect(path,timeout=30)
+    started=time.perf_counter(); kills=extra=0
+    kill_every=args.items//(args.kill_claims+1) if args.kill_claims else 0
+    for item_id in range(1,args.items+1):
+        guid=rnd.choice(guids); mir_dispatch.enqueue(db,guid,'BENCH',item_id)
+        if kill_every and item_id%kill_every==0 and kills<args.kill_claims:
+            # worker mort en plein envoi : la mission du poste est réservée puis jamais envoyée ; le poste est
+            # redemandé (mission jumelle en attente) et le bail a expiré : le dispatcher doit fusionner les deux
+            db.execute("UPDATE mir_job SET next_attempt_at=0 WHERE mission_guid=? AND status='PENDING'",(guid,)); db.commit()
+            for job_id,claimed_guid,_,_ in mir_dispatch.claim_due(db,['mort'],limit=1):
+                kills+=1; extra+=1
+                mir_dispatch.enqueue(db,claimed_guid,'BENCH',args.items+extra,commit=False)
+                db.execute('UPDATE mir_job SET claimed_at=0 WHERE id=?',(job_id,)); db.commit()
+        dispatcher.wake()
+        time.sleep(rnd.expovariate(args.rate/3600*speed))   # arrivées poissoniennes
+    deadline=time.perf_counter()+args.timeout
+    while time.perf_counter()<deadline:
+        left=db.execute("SELECT COUNT(*) FROM mir_job WHERE finished_at IS NULL").fetchone()[0]
+        if not left: break
+        time.sleep(0.05)
+    elapsed=(time.perf_counter()-started)*speed   # secondes simulées
+    alive=dispatcher.is_alive()
+    dispatcher.stop(); dispatcher.join(5); sim.stop()
+    rows=db.execute("""SELECT i.added_at, j.sent_at, j.finished_at, j.status, j.mission_state
+                         FROM mir_job_item i JOIN mir_job j ON j.id=i.job_id WHERE j.status!='MERGED'""").fetchall()
+    done=[r for r in rows if r[4]=='Done']
+    queue=sorted((r[1]-r[0])*speed for r in done); delivery=sorted((r[2]-r[0])*speed for r in done)
+    missions=db.execute("SELECT COUNT(*), SUM(attempts) FROM mir_job WHERE mission_state='Done'").fetchone()
+    per_robot={r[0]:r[1] for r in db.execute("SELECT robot, COUNT(*) FROM mir_job WHERE mission_state='Done' GROUP BY robot")}
+    merged=db.execute("SELECT COUNT(*) FROM mir_job WHERE status='MERGED' AND last_error='bail expiré'").fetchone()[0]
+    db.close()
+    hours=elapsed/3600
+    return {'robots':args.robots,'items':args.items+extra,'rate_per_hour':args.rate,'speed':speed,
+            'mission_seconds':args.mission_seconds,'fail_rate':args.fail_rate,'abort_rate':args.abort_rate,
+            'sim_hours':round(hours,2),'delivered':len(done),'failed':sum(1 for r in rows if r[3]=='FAILED'),
+            'items_per_hour':round(len(done)/hours,1) if hours else None,
+            'missions':missions[0],'missions_per_hour':round(missions[0]/hours,1) if hours else None,
+            'attempts':missions[1],'avg_batch':round(len(done)/missions[0],2) if missions[0] else None,
+            'queue_latency_s':{'p50':round(percentile(queue,0.5),1),'p95':round(percentile(queue,0.95),1)} if queue else None,
+            'delivery_latency_s':{'p50':round(percentile(delivery,0.5),1),'p95':round(percentile(delivery,0.95),1)} if delivery else None,
+            'per_robot':per_robot,'killed_claims':kills,'merged_after_lease':merged,'dispatcher_alive':alive,'sim':sim.stats()}
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument('--robots',type=int,default=3)
+    ap.add_argument('--items',type=int,default=600)
+    ap.add_argument('--rate',type=float,default=400,help='articles par heure simulée')
+    ap.add_argument('--mission-seconds',type=float,default=120)
+    ap.add_argument('--speed',type=float,default=200,help='accélération du temps simulé')
+    ap.add_argument('--latency-ms',type=float,default=20)
+    ap.add_argument('--fail-rate',type=float,default=0.0)
+    ap.add_argument('--abort-rate',type=float,default=0.0)
+    ap.add_argument('--backoff',type=float,default=2.0,help='backoff initial des nouveaux essais (s simulées)')
+    ap.add_argument('--kill-claims',type=int,default=0,help='réservations abandonnées par un worker « mort »')
+    ap.add_argument('--timeout',type=float,default=120,help='attente max (s réelles) de la fin des missions')
+    ap.add_argument('--seed',type=int,default=42)
+    ap.add_argument('--out',default=os.path.join(ROOT,'bench','results'))
+    args=ap.parse_args()
+    result={'label':f'fleet-{args.robots}r','host':platform.node(),'at':time.strftime('%Y-%m-%d %H:%M:%S'),**run(args)}
+    os.makedirs(args.out,exist_ok=True)
+    out=os.path.join(args.out,f"fleet-{args.robots}r-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out,'w') as fh: json.dump(result,fh,indent=1)
+    q=result['queue_latency_s'] or {}; d=result['delivery_latency_s'] or {}
+    print(f"{result['robots']} robot(s) : {result['delivered']}/{result['items']} articles livrés en {result['sim_hours']} h simulées, "
+          f"{result['items_per_hour']} articles/h, {result['missions_per_hour']} missions/h (lot moyen {result['avg_batch']}), "
+          f"file p50 {q.get('p50')} s p95 {q.get('p95')} s, livraison p50 {d.get('p50')} s p95 {d.get('p95')} s, échecs {result['failed']}")
+    if args.kill_claims:
+        print(f"réservations abandonnées {result['killed_claims']}, fusionnées au bail {result['merged_after_lease']}, "
+              f"dispatcher {'vivant' if result['dispatcher_alive'] else 'ARRÊTÉ'}")
+    print(out)
+
+if __name__=='__main__':
+    main()
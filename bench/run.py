@@ -0,0 +1,228 @@
+import os, re, sys, json, time, random, shutil, sqlite3, argparse, platform, tempfile, threading, subprocess
+from collections import defaultdict
+
+# Charge synthétique « opérateurs d'entrepôt » : réception, flux photo -> inspection -> emballage,
+# mise en stock, recherches, emplacements, dashboard et polling MiR (dry-run).
+# Rapporte p50/p99 et débit par route + contention SQLite, résultat JSON comparable (bench/compare.py).
+#   python bench/run.py --scale 10k --mode client --duration 20
+#   python bench/run.py --scale 100k --mode gunicorn --workers 3 --concurrency 12
+#   python bench/run.py --scale 10k --sync-batch 10   (flux des postes par lots /api/sync au lieu des formulaires)
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+from bench.seed import seed, SCALES
+
+WEIGHTS={'receive':10,'flow':10,'release':4,'search':15,'list':5,'detail':10,
+         'locations':10,'dashboard':10,'queues':10,'mir':20}
+SEARCH_TERMS=['SKU-0','SKU-00012','vérin','pompe moteur','CMD1','BL7','AV3','joint','carter roulement']
+
+class ClientDriver:
+    """Appels via le client de test Flask, dans le processus."""
+    def __init__(self, app): self.app=app; self.local=threading.local()
+    def request(self, method, path, data=None, json=None):
+        c=getattr(self.local,'client',None)
+        if c is None: c=self.local.client=self.app.test_client()
+        r=c.open(path,method=method,data=data,json=json)
+        return r.status_code,r.headers.get('Location'),r.get_data(as_text=True) if path=='/metrics' else None
+
+class HttpDriver:
+    """Appels HTTP réels (gunicorn), une session keep-alive par thread."""
+    def __init__(self, base): self.base=base; self.local=threading.local()
+    def request(self, method, path, data=None, json=None):
+        import requests
+        s=getattr(self.local,'session',None)
+        if s is None: s=self.local.session=requests.Session()
+        r=s.request(method,self.base+path,data=data,json=json,allow_redirects=False,timeout=30)
+        return r.status_code,r.headers.get('Location'),r.text if path=='/metrics' else None
+
+class Operator:
+    def __init__(self, driver, shared, rnd, record):
+        self.d=driver; self.shared=shared; self.rnd=rnd; self.record=record
+    def call(self, name, method, path, data=None, json=None):
+        t0=time.perf_counter()
+        try:
+            status,location,_=self.d.request(method,path,data,json)
+        except Exception:
+            status,location=599,None
+        self.record(name,time.perf_counter()-t0,status)
+        return status,location
+    def pick(self, key):
+        with self.shared['lock']:
+            pool=self.shared[key]
+            return pool.pop(self.rnd.randrange(len(pool))) if pool else None
+    def push(self, key, value):
+        with self.shared['lock']: self.shared[key].append(value)
+    # --- opérations -------------------------------------------------------
+    def receive(self):
+        _,loc=self.call('POST /items','POST','/items',{'size':self.rnd.choice(['PETIT','PETIT','GRAND']),'description':'bench','bl_no':f'BL{self.rnd.randint(1,500)}'})
+        m=re.search(r'/items/(\d+)',loc or '')
+        if m: self.push('recu',int(m.group(1)))
+    def flow(self):
+        if self.shared['sync_batch']: return self.sync_flow(self.shared['sync_batch'])
+        item_id=self.pick('recu')
+        if item_id is None: return self.receive()
+        self.call('POST /items/<id>/send_to_photo','POST',f'/items/{item_id}/send_to_photo')
+        self.call('POST /items/<id>/send_to_inspection','POST',f'/items/{item_id}/send_to_inspection')
+        self.call('POST /work/inspection','POST','/work/inspection',{'item_id':item_id,'result':'OK'})
+        self.call('POST /work/emballage','POST','/work/emballage',{'item_id':item_id})
+        self.push('stock',item_id)
+    def sync_flow(self, n):
+        # même parcours que flow() pour n articles, envoyé en un seul lot comme le fait static/sync.js
+        ids=[i for i in (self.pick('recu') for _ in range(n)) if i is not None]
+        if not ids: return self.receive()
+        ts=time.time(); ops=[]
+        for item_id in ids:
+            ops+=[{'key':f'{item_id}-{kind}','ts':ts,'item_id':item_id,**op} for kind,op in
+                  (('photo',{'kind':'move','action':'TO_PHOTO'}),('insp',{'kind':'move','action':'TO_INSPECTION'}),
+                   ('ok',{'kind':'inspect','result':'OK'}),('stock',{'kind':'put_stock'}))]
+        self.call('POST /api/sync','POST','/api/sync',json={'station':'BENCH','ops':ops})
+        for item_id in ids: self.push('stock',item_id)
+    def release(self):
+        item_id=self.pick('stock')
+        if item_id is not None:
+            self.call('POST /items/<id>/move','POST',f'/items/{item_id}/move',{'to_location_id':self.shared['shelf']})
+    def search(self): self.call('GET /items?q=','GET','/items?q='+self.rnd.choice(SEARCH_TERMS))
+    def list(self): self.call('GET /items','GET','/items')
+    def detail(self): self.call('GET /items/<id>','GET',f"/items/{self.rnd.randint(1,self.shared['max_id'])}")
+    def locations(self): self.call('GET /locations','GET','/locations')
+    def dashboard(self): self.call('GET /','GET','/')
+    def queues(self):
+        path=self.rnd.choice(['/work/photo','/work/inspection','/work/emballage']); self.call('GET '+path,'GET',path)
+    def mir(self): self.call('GET /api/mir/status','GET','/api/mir/status')
+
+def percentile(sorted_values, q):
+    if not sorted_values: return None
+    return sorted_values[min(len(sorted_values)-1,int(round(q*(len(sorted_values)-1))))]
+
+def parse_metrics(text):
+    out={}
+    for line in (text or '').splitlines():
+        m=re.match(r'(sqlite_lock_wait_seconds_(?:sum|count)|sqlite_busy_errors_total|sql_slow_queries_total)(?:\{\})? ([0-9.e+-]+)$',line)
+        if m: out[m.group(1)]=out.get(m.group(1),0.0)+float(m.group(2))
+    return out
+
+def run_load(driver, shared, duration, concurrency, seed_value=1):
+    samples=defaultdict(list); errors=defaultdict(int); lock=threading.Lock()
+    ops=list(WEIGHTS); weights=[WEIGHTS[o] for o in ops]
+    def record(name, seconds, status):
+        with lock:
+            samples[name].append(seconds)
+            if status>=500: errors[name]+=1
+    def loop(k):
+        rnd=random.Random(seed_value*1000+k); op=Operator(driver,shared,rnd,record); deadline=time.time()+duration
+        while time.time()<deadline:
+            getattr(op,rnd.choices(ops,weights)[0])()
+    threads=[threading.Thread(target=loop,args=(k,)) for k in range(concurrency)]
+    t0=time.time()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return samples,errors,time.time()-t0
+
+def summarize(samples, errors, elapsed):
+    routes={}
+    for name,values in sorted(samples.items()):
+        v=sorted(values)
+        routes[name]={'count':len(v),'errors':errors.get(name,0),'rps':round(len(v)/elapsed,2),
+                      'p50_ms':round(percentile(v,0.5)*1000,2),'p90_ms':round(percentile(v,0.9)*1000,2),
+                      'p99_ms':round(percentile(v,0.99)*1000,2),'max_ms':round(v[-1]*1000,2)}
+    allv=sorted(x for v in samples.values() for x in v)
+    total={'count':len(allv),'errors':sum(errors.values()),'rps':round(len(allv)/elapsed,2),
+           'p50_ms':round((percentile(allv,0.5) or 0)*1000,2),'p99_ms':round((percentile(allv,0.99) or 0)*1000,2)}
+    return routes,total
+
+def git_rev():
+    try: return subprocess.check_output(['git','rev-parse','--short','HEAD'],cwd=ROOT,text=True,stderr=subprocess.DEVNULL).strip()
+    except Exception: return None
+
+def prepare_db(args, workdir):
+    n=SCALES.get(str(args.scale).lower()) or int(args.scale)
+    cache=os.path.join(args.cache,f'seed-{n}-{args.years:g}y.db')
+    if not os.path.exists(cache):
+        os.makedirs(args.cache,exist_ok=True)
+        print(f'seed {n} articles sur {args.years:g} an(s)…',flush=True)
+        print(seed(cache+'.tmp',n,args.years),flush=True); os.replace(cache+'.tmp',cache)
+    path=os.path.join(workdir,'bench.db'); shutil.copy(cache,path)
+    return path,n
+
+def shared_state(path):
+    db=sqlite3.connect(path)
+    shared={'lock':threading.Lock(),
+            'recu':[r[0] for r in db.execute("SELECT id FROM item WHERE status='RECU' AND location_id IS NULL")],
+            'stock':[r[0] for r in db.execute("SELECT i.id FROM item i JOIN location l ON l.id=i.location_id WHERE l.kind='SOL'")],
+            'shelf':db.execute("SELECT id FROM location WHERE code='ETAGERE-1-A'").fetchone()[0],
+            'max_id':db.execute('SELECT MAX(id) FROM item').fetchone()[0] or 1,'sync_batch':0}
+    db.close(); return shared
+
+def start_gunicorn(args, env):
+    port=args.port
+    cmd=[sys.executable,'-m','gunicorn','-w',str(args.workers),'-b',f'127.0.0.1:{port}',*args.gunicorn_args.split(),'app:app']
+    proc=subprocess.Popen(cmd,cwd=ROOT,env=env,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    import requests
+    for _ in range(200):
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/readyz',timeout=1).status_code==200: return proc
+        except requests.RequestException: pass
+        time.sleep(0.1)
+    proc.terminate(); raise RuntimeError('gunicorn ne démarre pas')
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument('--scale',default='10k',help='10k, 100k, 1m ou un nombre d\'articles')
+    ap.add_argument('--years',type=float,default=1.0)
+    ap.add_argument('--mode',choices=['client','gunicorn'],default='client')
+    ap.add_argument('--workers',type=int,default=3)
+    ap.add_argument('--gunicorn-args',default='')
+    ap.add_argument('--port',type=int,default=8099)
+    ap.add_argument('--concurrency',type=int,default=4)
+    ap.add_argument('--duration',type=float,default=20)
+    ap.add_argument('--sync-batch',type=int,default=0,help='flux des postes par lots /api/sync de N articles')
+    ap.add_argument('--label',default=None)
+    ap.add_argument('--cache',default=os.path.join(tempfile.gettempdir(),'raspi-stock-bench'))
+    ap.add_argument('--out',default=os.path.join(ROOT,'bench','results'))
+    args=ap.parse_args()
+
+    workdir=tempfile.mkdtemp(prefix='bench-')
+    path,n=prepare_db(args,workdir)
+    env=dict(os.environ,DATABASE=path,MIR_DRY_RUN='true',LOG_LEVEL='WARNING',SLOW_QUERY_MS='1000',
+             METRICS_DIR=os.path.join(workdir,'metrics'))
+    shared=shared_state(path); shared['sync_batch']=args.sync_batch; proc=None
+    try:
+        if args.mode=='gunicorn':
+            proc=start_gunicorn(args,env); driver=HttpDriver(f'http://127.0.0.1:{args.port}')
+        else:
+            os.environ.update(env)
+            import app as app_module
+            driver=ClientDriver(app_module.app)
+        before=parse_metrics(driver.request('GET','/metrics')[2])
+        samples,errors,elapsed=run_load(driver,shared,args.duration,args.concurrency)
+        after=parse_metrics(driver.request('GET','/metrics')[2])
+    finally:
+        if proc: proc.terminate(); proc.wait()
+    routes,total=summarize(samples,errors,elapsed)
+    delta={k:after.get(k,0)-before.get(k,0) for k in set(after)|set(before)}
+    waits=delta.get('sqlite_lock_wait_seconds_count',0)
+    result={
+        'meta':{'label':args.label or f'{args.mode}-{args.scale}','git':git_rev(),'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'mode':args.mode,'sync_batch':args.sync_batch,'workers':args.workers if args.mode=='gunicorn' else 1,'concurrency':args.concurrency,
+                'duration_s':round(elapsed,1),'items':n,'years':args.years,'python':platform.python_version(),
+                'sqlite':sqlite3.sqlite_version,'platform':platform.platform()},
+        'total':total,'routes':routes,
+        'sqlite':{'write_transactions':int(waits),
+                  'lock_wait_total_s':round(delta.get('sqlite_lock_wait_seconds_sum',0),4),
+                  'lock_wait_avg_ms':round(delta.get('sqlite_lock_wait_seconds_sum',0)/waits*1000,3) if waits else 0.0,
+                  'busy_errors':int(delta.get('sqlite_busy_errors_total',0)),
+                  'slow_queries':int(delta.get('sql_slow_queries_total',0))},
+    }
+    os.makedirs(args.out,exist_ok=True)
+    out=os.path.join(args.out,f"{result['meta']['label']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out,'w') as f: json.dump(result,f,indent=2,ensure_ascii=False)
+    print(f"{'route':<40}{'n':>7}{'rps':>9}{'p50 ms':>9}{'p99 ms':>9}{'5xx':>6}")
+    for name,r in routes.items():
+        print(f"{name:<40}{r['count']:>7}{r['rps']:>9}{r['p50_ms']:>9}{r['p99_ms']:>9}{r['errors']:>6}")
+    print(f"{'TOTAL':<40}{total['count']:>7}{total['rps']:>9}{total['p50_ms']:>9}{total['p99_ms']:>9}{total['errors']:>6}")
+    print(f"SQLite : {result['sqlite']}")
+    print(f'résultat : {out}')
+    shutil.rmtree(workdir,ignore_errors=True)
+
+if __name__=='__main__':
+    main()
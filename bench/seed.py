@@ -0,0 +1,79 @@
+import os, sys, time, random, sqlite3, argparse
+from datetime import datetime, timedelta
+
+# Génère une base réaliste à l'échelle : articles passés par tout le flux
+# (RECU -> PHOTO -> INSPECTION -> EMBALLAGE -> STOCK/NOGO) avec leurs mouvements étalés sur N années.
+#   python bench/seed.py /tmp/bench.db --items 100000 --years 2
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+
+SCALES={'10k':10_000,'100k':100_000,'1m':1_000_000}
+WORDS=['Vérin','Pompe','Vanne','Moteur','Carter','Roulement','Flasque','Arbre','Pignon','Joint','Capot','Support']
+
+def ts(d):
+    return d.strftime('%Y-%m-%d %H:%M:%S')
+
+def seed(path, n_items, years=1.0, seed_value=42, batch=5000):
+    from migrations import migrate
+    migrate(path)
+    rnd=random.Random(seed_value)
+    db=sqlite3.connect(path)
+    db.execute('PRAGMA synchronous=OFF')
+    loc={r[0]:r[1] for r in db.execute('SELECT code, id FROM location')}
+    sols=[(r[0],r[1]) for r in db.execute("SELECT id, size FROM location WHERE kind='SOL' AND active=1")]
+    nogo_shelves=[loc[c] for c in loc if c.startswith('ETAGERE-3-')]
+    t_end=datetime.utcnow(); t0=t_end-timedelta(days=365*years); span=(t_end-t0).total_seconds()
+    first=(db.execute("SELECT next FROM sku_sequence WHERE name='SKU'").fetchone() or [1])[0]
+    base_id=(db.execute("SELECT seq FROM sqlite_sequence WHERE name='item'").fetchone() or [0])[0]
+    free_sols=list(sols); rnd.shuffle(free_sols)
+    created=0; started=time.time()
+    while created<n_items:
+        n=min(batch,n_items-created); items=[]; moves=[]; occupancy=[]
+        for k in range(n):
+            i=created+k; item_id=base_id+i+1
+            size='GRAND' if rnd.random()<0.2 else 'PETIT'
+            at=t0+timedelta(seconds=span*i/max(1,n_items))
+            nogo=rnd.random()<0.04
+            steps=[('TO_PHOTO',loc['POSTE-PHOTO']),('TO_INSPECTION',loc['POSTE-INSPECTION'])]
+            steps+=[('INSPECT_NOK',loc['POSTE-INSPECTION']),('MOVE',rnd.choice(nogo_shelves))] if nogo else \
+                   [('INSPECT_OK',loc['POSTE-EMBALLAGE']),('PUT_STOCK',rnd.choice([s[0] for s in sols if s[1]==size]))]
+            # les 200 derniers sont encore dans le flux (hors poste), les autres sont sortis du stock ou en NOGO
+            recent=n_items-i<=200
+            stage=rnd.randint(0,3) if recent else 4
+            status=['RECU','PHOTO','INSPECTION','EMBALLAGE','NOGO' if nogo else 'STOCK'][stage]
+            if nogo and stage==3: status='INSPECTION'
+            t=at; prev=None
+            for action,dest in steps[:stage]:
+                t+=timedelta(minutes=rnd.randint(5,240)); moves.append((item_id,prev,dest,action,ts(t))); prev=dest
+            location_id=None
+            if stage==4 and nogo: location_id=prev
+            elif stage==4 and n_items-i<=200+len(sols):
+                slot=next((s for s in free_sols if s[1]==size),None)
+                if slot:
+                    free_sols.remove(slot); location_id=slot[0]; occupancy.append((slot[0],item_id))
+                    moves[-1]=moves[-1][:2]+(slot[0],)+moves[-1][3:]
+            items.append((f'SKU-{first+i:05d}',f'{rnd.choice(WORDS)} {rnd.choice(WORDS).lower()} {i}',size,status,location_id,
+                          f'AV{rnd.randint(1,n_items//20+1)}',f'CMD{rnd.randint(1,n_items//10+1)}',f'BL{rnd.randint(1,n_items//15+1)}',ts(at),ts(t)))
+        db.execute('BEGIN')
+        db.executemany('INSERT INTO item(sku,description,size,status,location_id,avis_no,order_no,bl_no,created_at,updated_at) VALUES (?,?,?,?,?,?,?,?,?,?)',items)
+        db.executemany('INSERT INTO movement(item_id,from_location_id,to_location_id,action,created_at) VALUES (?,?,?,?,?)',moves)
+        db.executemany('INSERT INTO slot_occupancy(location_id,slot,item_id) VALUES (?,0,?)',occupancy)
+        db.execute('COMMIT')
+        created+=n
+    db.execute('PRAGMA synchronous=FULL')
+    n_moves=db.execute('SELECT COUNT(*) FROM movement').fetchone()[0]
+    db.close()
+    return {'items':created,'movements':n_moves,'seconds':round(time.time()-started,1)}
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument('path')
+    ap.add_argument('--items',default='10k',help='10k, 100k, 1m ou un nombre')
+    ap.add_argument('--years',type=float,default=1.0)
+    a=ap.parse_args()
+    n=SCALES.get(a.items.lower()) or int(a.items)
+    print(seed(a.path,n,a.years))
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,76 @@
+import os, sys, time, random, sqlite3, argparse, tempfile, multiprocessing as mp
+
+# Stress du chemin de mise en stock : N processus (≈ workers gunicorn) postent en boucle
+# /work/emballage vers des SOL tirés au hasard, et libèrent des SOL vers une étagère.
+# À la fin on vérifie qu'aucun emplacement à capacité finie n'a plus d'occupants que sa capacité.
+#   python bench/stress_putaway.py --procs 8 --seconds 10
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+
+def prepare(path, n_items):
+    from migrations import migrate
+    migrate(path)
+    db=sqlite3.connect(path)
+    db.executemany("INSERT INTO item(sku,size,status) VALUES (?,?,'EMBALLAGE')",
+                   [(f'STRESS-{i:05d}','GRAND' if i%5==0 else 'PETIT') for i in range(n_items)])
+    db.commit(); db.close()
+
+def worker(args):
+    seed,seconds=args
+    import app as app_module
+    client=app_module.app.test_client(); rnd=random.Random(seed)
+    db=sqlite3.connect(os.environ['DATABASE'],timeout=30)
+    sols=[r[0] for r in db.execute("SELECT id FROM location WHERE kind='SOL'")]
+    shelf=db.execute("SELECT id FROM location WHERE code='ETAGERE-1-A'").fetchone()[0]
+    items=[r[0] for r in db.execute('SELECT id FROM item')]
+    db.close()
+    attempts=releases=errors=0; deadline=time.time()+seconds
+    while time.time()<deadline:
+        item_id=rnd.choice(items)
+        if rnd.random()<0.7:
+            r=client.post('/work/emballage',data={'item_id':item_id,'slot_id':rnd.choice(sols)}); attempts+=1
+        else:
+            r=client.post(f'/items/{item_id}/move',data={'to_location_id':shelf}); releases+=1
+        errors+=r.status_code>=500
+    return attempts,releases,errors
+
+def verify(path):
+    db=sqlite3.connect(path)
+    over=db.execute("""
+        SELECT l.code, l.capacity, COUNT(i.id) FROM location l JOIN item i ON i.location_id=l.id
+         WHERE l.capacity IS NOT NULL GROUP BY l.id HAVING COUNT(i.id) > l.capacity
+    """).fetchall()
+    drift=db.execute("""
+        SELECT COUNT(*) FROM item i JOIN location l ON l.id=i.location_id
+         WHERE l.capacity IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM slot_occupancy s WHERE s.item_id=i.id AND s.location_id=i.location_id)
+    """).fetchone()[0]
+    puts=db.execute("SELECT COUNT(*) FROM movement WHERE action='PUT_STOCK'").fetchone()[0]
+    moves=db.execute('SELECT COUNT(*) FROM movement').fetchone()[0]
+    db.close()
+    return over,drift,puts,moves
+
+def main():
+    ap=argparse.ArgumentParser()
+    ap.add_argument('--procs',type=int,default=8)
+    ap.add_argument('--seconds',type=float,default=10)
+    ap.add_argument('--items',type=int,default=200)
+    a=ap.parse_args()
+    path=os.path.join(tempfile.mkdtemp(prefix='stress-'),'stress.db')
+    os.environ['DATABASE']=path; os.environ.setdefault('LOG_LEVEL','WARNING')
+    prepare(path,a.items)
+    t0=time.time()
+    with mp.get_context('spawn').Pool(a.procs) as pool:
+        res=pool.map(worker,[(i,a.seconds) for i in range(a.procs)])
+    elapsed=time.time()-t0
+    over,drift,puts,moves=verify(path)
+    attempts,releases,errors=(sum(r[k] for r in res) for k in range(3))
+    print(f'{a.procs} processus, {elapsed:.1f}s : {attempts} tentatives de mise en stock, {releases} libérations, {errors} erreurs 5xx')
+    print(f'{moves} mouvements validés ({moves/a.seconds:.0f} moves/s sur {a.seconds:.0f}s de charge), dont {puts} PUT_STOCK')
+    print(f'double réservations : {len(over)}  écarts slot_occupancy : {drift}')
+    for code,cap,n in over: print(f'  {code}: {n} articles pour capacité {cap}')
+    return 1 if over or drift else 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import os, sqlite3, threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Réglages appliqués à toutes les connexions (requêtes, migrations, dispatcher MiR).
+# WAL : les lecteurs ne bloquent plus derrière un écrivain ; synchronous=NORMAL y reste sûr
+# (seule la dernière transaction peut être perdue sur coupure de courant, jamais la cohérence).
+BUSY_TIMEOUT=float(os.getenv('SQLITE_BUSY_TIMEOUT','10'))
+STATEMENT_CACHE=256
+POOL_SIZE=int(os.getenv('SQLITE_POOL_SIZE','4'))   # connexions de chaque type (lecture/écriture) par worker
+PRAGMAS=(('foreign_keys','ON'),
+         ('synchronous','NORMAL'),
+         ('cache_size',-int(os.getenv('SQLITE_CACHE_KB','16384'))),
+         ('mmap_size',int(os.getenv('SQLITE_MMAP_MB','64'))*1024*1024),
+         ('temp_store','MEMORY'))
+
+def connect(path, readonly=False, timeout=BUSY_TIMEOUT, attach=None, **kwargs):
+    """Ouvre une connexion réglée (WAL, busy_timeout, PRAGMAS). readonly : mode=ro, refuse toute écriture.
+    attach : {alias: chemin} de bases attachées (même mode, ex. l'archive des mouvements)."""
+    kwargs.setdefault('cached_statements',STATEMENT_CACHE)
+    if readonly:
+        db=sqlite3.connect(f'file:{quote(os.path.abspath(path))}?mode=ro',uri=True,timeout=timeout,**kwargs)
+    else:
+        db=sqlite3.connect(path,timeout=timeout,**kwargs)
+        if db.execute('PRAGMA journal_mode').fetchone()[0]!='wal':
+            # base neuve : auto_vacuum ne se règle qu'avant la première écriture (le passage en WAL en est une) ;
+            # INCREMENTAL permet de rendre la place libérée sans VACUUM complet (cf. archive.compact)
+            if not db.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone():
+                db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            db.execute('PRAGMA journal_mode=WAL')
+    for name,value in PRAGMAS:
+        db.execute(f'PRAGMA {name}={value}')
+    for alias,other in (attach or {}).items():
+        db.execute('ATTACH DATABASE ? AS '+alias,(f'file:{quote(os.path.abspath(other))}?mode=ro' if readonly else other,))
+        db.execute(f'PRAGMA {alias}.synchronous=NORMAL')
+    return db
+
+class ConnectionPool:
+    """Connexions réutilisées (écriture / lecture seule) : plus d'ouverture ni de réglage par requête,
+    cache des instructions préparées conservé. Au plus `size` connexions de chaque type par worker,
+    quel que soit le nombre de threads (gthread) : au-delà, la requête attend qu'une connexion se libère."""
+    def __init__(self, path, size=POOL_SIZE, wait=BUSY_TIMEOUT, **kwargs):
+        # une connexion passe d'un thread à l'autre, jamais utilisée par deux à la fois
+        self.path=path; self.size=size; self.wait=wait; self.kwargs={**kwargs,'check_same_thread':False}
+        self._idle={'reader':[],'writer':[]}; self._open={'reader':0,'writer':0}; self._kind={}
+        self._cond=threading.Condition()
+        self.opened=self.reused=self.discarded=self.waited=0
+    def acquire(self, readonly=False):
+        key='reader' if readonly else 'writer'
+        with self._cond:
+            if not self._idle[key] and self._open[key]>=self.size:
+                self.waited+=1
+                if not self._cond.wait_for(lambda: self._idle[key] or self._open[key]<self.size,self.wait):
+                    raise sqlite3.OperationalError(f'pool de connexions épuisé ({self.size} {key})')
+            if self._idle[key]:
+                self.reused+=1; return self._idle[key].pop()
+            self._open[key]+=1; self.opened+=1
+        try:
+            db=connect(self.path,readonly=readonly,**self.kwargs)
+        except BaseException:
+            with self._cond: self._open[key]-=1; self._cond.notify_all()
+            raise
+        with self._cond: self._kind[db]=key
+        return db
+    def release(self, db):
+        # transaction laissée ouverte par une requête en erreur : on l'annule avant réutilisation
+        try:
+            if db.in_transaction: db.rollback()
+            db.set_trace_callback(None)
+        except sqlite3.Error:
+            return self.discard(db)
+        with self._cond:
+            key=self._kind.get(db)
+            if key is None: return
+            self._idle[key].append(db); self._cond.notify_all()
+    def discard(self, db):
+        with self._cond:
+            key=self._kind.pop(db,None)
+            if key is not None:
+                if db in self._idle[key]: self._idle[key].remove(db)
+                self._open[key]-=1; self.discarded+=1; self._cond.notify_all()
+        try: db.close()
+        except sqlite3.Error: pass
+    def stats(self):
+        with self._cond:
+            return {'opened':self.opened,'reused':self.reused,'discarded':self.discarded,'waited':self.waited}
+
+@contextmanager
+def immediate(db):
+    # Transaction d'écriture prise d'emblée (BEGIN IMMEDIATE) : le verrou d'écriture est acquis
+    # avant les lectures de contrôle, aucun autre worker ne peut s'intercaler entre check et écriture.
+    # Si une transaction est déjà ouverte, on s'y joint : l'appelant reste maître du commit.
+    if db.in_transaction:
+        yield db; return
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.rollback(); raise
+    db.commit()
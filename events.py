@@ -0,0 +1,159 @@
+import os, json, time, queue, sqlite3, logging, threading
+from database import connect, immediate
+
+# Flux d'événements poussés aux écrans (Server-Sent Events sur /events).
+# Les écritures publient dans event_log, dans leur propre transaction ; chaque worker a un seul
+# Broker qui lit le journal et diffuse aux abonnés du processus : la charge SQL ne dépend pas du
+# nombre d'écrans ouverts. Le statut robot est lu par un seul poller pour tous les workers (bail dans meta).
+
+log=logging.getLogger(__name__)
+
+POLL_SECONDS=float(os.getenv('EVENTS_POLL','0.25'))
+KEEP_EVENTS=int(os.getenv('EVENTS_KEEP','20000'))
+HEARTBEAT_SECONDS=15.0
+REPLAY_MAX=1000
+SUBSCRIBER_QUEUE=1000
+MIR_POLL_SECONDS=float(os.getenv('MIR_POLL_INTERVAL','2'))
+
+def publish(db, kind, payload):
+    """Ajoute un événement au journal, dans la transaction de l'appelant."""
+    publish_many(db,[(kind,payload)])
+
+def publish_many(db, events):
+    now=time.time()
+    db.executemany('INSERT INTO event_log(type,payload,created_at) VALUES (?,?,?)',
+                   [(kind,json.dumps(payload,ensure_ascii=False),now) for kind,payload in events])
+
+def last_event_id(db):
+    return db.execute('SELECT COALESCE(MAX(id),0) FROM event_log').fetchone()[0]
+
+def events_since(db, last_id, limit=REPLAY_MAX):
+    return [tuple(r) for r in db.execute('SELECT id, type, payload FROM event_log WHERE id>? ORDER BY id LIMIT ?',(last_id,limit))]
+
+def format_sse(event_id, kind, payload):
+    return f'id: {event_id}\nevent: {kind}\ndata: {payload}\n\n'
+
+class Subscription:
+    def __init__(self, types=None):
+        self.types=frozenset(types) if types else None
+        self.queue=queue.Queue(SUBSCRIBER_QUEUE)
+    def wants(self, kind): return self.types is None or kind in self.types
+
+class Broker:
+    """Diffusion dans le processus : un thread lit event_log pour tous les abonnés du worker."""
+    def __init__(self, database, poll=POLL_SECONDS):
+        self.database=database; self.poll=poll
+        self._subs=set(); self._lock=threading.Lock()
+        self._wake=threading.Event(); self._stopping=threading.Event(); self._thread=None
+        self.last_id=None; self.delivered=self.dropped=0
+    def start(self):
+        self._thread=threading.Thread(target=self._run,name='events-broker',daemon=True); self._thread.start()
+    def stop(self): self._stopping.set(); self._wake.set()
+    def wake(self): self._wake.set()
+    def subscribe(self, types=None, after=0):
+        """Abonne un client ; il reçoit les événements d'id > after (rejeu depuis le journal inclus)."""
+        sub=Subscription(types)
+        with self._lock:
+            self._subs.add(sub)
+            if self.last_id is None or after<self.last_id: self.last_id=after
+        self._wake.set()
+        return sub
+    def unsubscribe(self, sub):
+        with self._lock: self._subs.discard(sub)
+    def subscribers(self):
+        with self._lock: return len(self._subs)
+    def fanout(self, rows):
+        with self._lock: subs=list(self._subs)
+        for event in rows:
+            for sub in subs:
+                if not sub.wants(event[1]): continue
+                try:
+                    sub.queue.put_nowait(event); self.delivered+=1
+                except queue.Full:
+                    # client trop lent : on le déconnecte, il se resynchronise à la reconnexion
+                    self.unsubscribe(sub); self.dropped+=1
+                    try: sub.queue.get_nowait()
+                    except queue.Empty: pass
+                    sub.queue.put_nowait(None)
+    def _run(self):
+        db=connect(self.database,readonly=True)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    with self._lock:
+                        if not self._subs: self.last_id=None   # personne n'écoute : pas de lecture du journal
+                        start=self.last_id
+                    if start is not None:
+                        rows=events_since(db,start)
+                        if rows:
+                            with self._lock:
+                                # un abonné arrivé entre-temps a pu reculer last_id : on relira, les flux dédoublonnent
+                                if self.last_id==start: self.last_id=rows[-1][0]
+                            self.fanout(rows)
+                            if len(rows)==REPLAY_MAX: continue
+                except sqlite3.Error as e:
+                    log.warning('events-broker: %s',e)
+                self._wake.wait(self.poll if self.last_id is not None else None); self._wake.clear()
+        finally:
+            db.close()
+    def stream(self, sub, last_sent, heartbeat=HEARTBEAT_SECONDS):
+        """Générateur SSE d'un abonné ; last_sent = dernier id déjà connu du client."""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try: event=sub.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': ping\n\n'; continue
+                if event is None:
+                    yield format_sse(last_sent,'resync','{}'); return
+                if event[0]<=last_sent: continue
+                last_sent=event[0]
+                yield format_sse(*event)
+        finally:
+            self.unsubscribe(sub)
+
+class MirStatusPoller(threading.Thread):
+    """Poller unique du statut robot pour tous les workers : celui qui tient le bail (meta.mir_poller)
+    interroge le robot et publie robot-status quand il change ; il purge aussi le journal."""
+    def __init__(self, database, client_factory, interval=MIR_POLL_SECONDS):
+        super().__init__(name='mir-status-poller',daemon=True)
+        self.database=database; self.client_factory=client_factory; self.interval=interval
+        self.owner=f'{os.getpid()}-{id(self):x}'; self.leader=False
+        self._stopping=threading.Event(); self._last=None; self._pruned=0.0
+    def stop(self): self._stopping.set()
+    def acquire(self, db):
+        # lecture d'abord : tant qu'un autre worker tient le bail, aucune écriture (ni verrou) de notre part
+        now=time.time()
+        row=db.execute("SELECT json_extract(value,'$.owner'), json_extract(value,'$.until') FROM meta WHERE key='mir_poller'").fetchone()
+        if row and row[0]!=self.owner and (row[1] or 0)>=now: return False
+        lease=json.dumps({'owner':self.owner,'until':now+3*self.interval})
+        cur=db.execute("""INSERT INTO meta(key,value) VALUES ('mir_poller',?)
+                          ON CONFLICT(key) DO UPDATE SET value=excluded.value
+                          WHERE json_extract(meta.value,'$.until')<? OR json_extract(meta.value,'$.owner')=?""",
+                       (lease,now,self.owner))
+        db.commit()
+        return cur.rowcount==1
+    def poll(self, db):
+        try:
+            status=self.client_factory().status(fresh=True)
+        except Exception as e:
+            status={'error':str(e)}
+        if status!=self._last:
+            with immediate(db): publish(db,'robot-status',status)
+            self._last=status
+        if time.time()-self._pruned>60:
+            with immediate(db):
+                db.execute('DELETE FROM event_log WHERE id<=(SELECT MAX(id) FROM event_log)-?',(KEEP_EVENTS,))
+            self._pruned=time.time()
+    def run(self):
+        db=connect(self.database)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    self.leader=self.acquire(db)
+                    if self.leader: self.poll(db)
+                except sqlite3.Error as e:
+                    log.warning('mir-status-poller: %s',e)
+                self._stopping.wait(self.interval)
+        finally:
+            db.close()
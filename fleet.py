@@ -0,0 +1,48 @@
+import os, threading
+from mir_client import MiRClient, get_client
+
+# Flotte de robots MiR : un client par robot (MIR_FLEET="mir1=http://10.0.0.11/api/v2.0.0,mir2=...",
+# identifiants communs MIR_USER/MIR_PASS). Sans MIR_FLEET, la flotte est le robot unique de
+# MIR_BASE_URL (client du processus). Les missions (guid) sont supposées identiques sur tous les robots.
+
+MIN_BATTERY=float(os.getenv('MIR_FLEET_MIN_BATTERY','25'))
+READY_STATES=('Ready',)
+
+def parse_fleet(spec):
+    """'nom=url,nom2=url2' -> [(nom, url)] ; un nom manquant devient mir1, mir2…"""
+    robots=[]
+    for i,part in enumerate(p.strip() for p in (spec or '').split(',') if p.strip()):
+        name,_,url=part.partition('=') if '=' in part.split('://')[0] else ('',None,part)
+        robots.append((name.strip() or f'mir{i+1}',url.strip()))
+    return robots
+
+class Fleet:
+    def __init__(self, clients):
+        self.clients=dict(clients)   # nom -> MiRClient
+        self._lock=threading.Lock(); self.last={}
+    @classmethod
+    def from_env(cls, **client_kwargs):
+        robots=parse_fleet(os.getenv('MIR_FLEET'))
+        if not robots: return cls({'mir':get_client()})
+        return cls({name:MiRClient(base=url,**client_kwargs) for name,url in robots})
+    def client(self, name):
+        return self.clients[name]
+    def snapshot(self):
+        """État de chaque robot d'après status() (en cache TTL) : prêt, batterie, état, erreur."""
+        out={}
+        for name,client in self.clients.items():
+            try:
+                st=client.status()
+                battery=float(st.get('battery_percentage') or 0)
+                out[name]={'state':st.get('state_text'),'battery':battery,
+                           'ready':st.get('state_text') in READY_STATES and battery>=MIN_BATTERY}
+            except Exception as e:
+                out[name]={'state':None,'battery':None,'ready':False,'error':str(e)}
+        with self._lock: self.last=out
+        return out
+    def available(self, busy=()):
+        """Robots prêts et non occupés, la batterie la plus haute d'abord."""
+        snap=self.snapshot()
+        return sorted((n for n,s in snap.items() if s['ready'] and n not in busy),key=lambda n:-snap[n]['battery'])
+    def stats(self):
+        with self._lock: return {'robots':dict(self.last)}
@@ -0,0 +1,212 @@
+import os, re, json, time, sqlite3, logging, threading, contextvars
+from flask import request, Response
+
+# Instrumentation requêtes HTTP / SQL / MiR, exposée au format texte Prometheus sur /metrics.
+# Chaque worker garde ses métriques en mémoire et en écrit un instantané dans METRICS_DIR ;
+# /metrics additionne les instantanés de tous les workers (compteurs et histogrammes).
+
+log=logging.getLogger(__name__)
+
+METRICS_DIR=os.getenv('METRICS_DIR',os.path.join(os.getenv('TMPDIR','/tmp'),'raspi-stock-metrics'))
+SLOW_QUERY_MS=float(os.getenv('SLOW_QUERY_MS','50'))
+FLUSH_SECONDS=2.0
+
+LATENCY_BUCKETS=(0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+COUNT_BUCKETS=(1,2,3,5,8,13,21,34,55,89,144)
+LAG_BUCKETS=(1,5,15,60,300,900,3600,14400,86400)
+
+HELP={
+    'http_request_duration_seconds':('histogram','Durée des requêtes HTTP par route'),
+    'sql_queries_per_request':('histogram','Nombre de requêtes SQL par requête HTTP'),
+    'sql_time_per_request_seconds':('histogram','Temps SQL cumulé par requête HTTP'),
+    'sql_statement_duration_seconds':('histogram','Durée des instructions SQL par type'),
+    'sql_slow_queries_total':('counter',f'Instructions SQL plus lentes que {SLOW_QUERY_MS:g} ms'),
+    'sqlite_lock_wait_seconds':('histogram','Attente du verrou d\'écriture (BEGIN IMMEDIATE)'),
+    'sqlite_busy_errors_total':('counter','Erreurs database is locked'),
+    'mir_request_duration_seconds':('histogram','Durée des appels HTTP au robot MiR'),
+    'mir_request_errors_total':('counter','Appels MiR en erreur'),
+    'mir_cache_events_total':('counter','Cache du client MiR (hits/misses/coalesced/errors/negative)'),
+    'sync_operations_total':('counter','Opérations reçues des postes par type et résultat'),
+    'sync_operation_lag_seconds':('histogram','Délai entre l\'opération au poste et son application'),
+    'sqlite_connections_total':('counter','Connexions SQLite du pool (opened/reused/discarded/waited)'),
+}
+
+class Registry:
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.counters={}    # (name, labels) -> valeur
+        self.histograms={}  # (name, labels) -> [buckets, compteurs, somme, total]
+        self.collectors=[]  # fonctions appelées avant chaque instantané (valeurs absolues du worker)
+        self.started=time.time(); self._last_flush=0.0
+    def inc(self, name, labels=(), value=1.0):
+        with self.lock:
+            key=(name,labels); self.counters[key]=self.counters.get(key,0.0)+value
+    def set(self, name, labels, value):
+        with self.lock: self.counters[(name,labels)]=float(value)
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self.lock:
+            h=self.histograms.get((name,labels))
+            if h is None: h=self.histograms[(name,labels)]=[buckets,[0]*len(buckets),0.0,0]
+            for i,b in enumerate(h[0]):
+                if value<=b: h[1][i]+=1
+            h[2]+=value; h[3]+=1
+    def snapshot(self):
+        with self.lock:
+            return {'counters':[[n,list(map(list,l)),v] for (n,l),v in self.counters.items()],
+                    'histograms':[[n,list(map(list,l)),list(h[0]),list(h[1]),h[2],h[3]] for (n,l),h in self.histograms.items()]}
+
+REGISTRY=Registry()
+_request_stats=contextvars.ContextVar('request_stats',default=None)
+
+def snapshot_path():
+    return os.path.join(METRICS_DIR,f'{os.getpid()}-{int(REGISTRY.started)}.json')
+
+def flush(force=False):
+    now=time.monotonic()
+    if not force and now-REGISTRY._last_flush<FLUSH_SECONDS: return
+    REGISTRY._last_flush=now
+    for collect in REGISTRY.collectors:
+        try: collect()
+        except Exception as e: log.warning('metrics: collecteur en erreur: %s',e)
+    try:
+        os.makedirs(METRICS_DIR,exist_ok=True)
+        path=snapshot_path(); tmp=path+'.tmp'
+        with open(tmp,'w') as f: json.dump(REGISTRY.snapshot(),f)
+        os.replace(tmp,path)
+    except OSError as e:
+        log.warning('metrics: instantané non écrit: %s',e)
+
+def merged():
+    """Additionne les instantanés de tous les workers (y compris ceux arrêtés : compteurs monotones)."""
+    counters={}; hists={}
+    try: names=[n for n in os.listdir(METRICS_DIR) if n.endswith('.json')]
+    except OSError: names=[]
+    for name in names:
+        try:
+            with open(os.path.join(METRICS_DIR,name)) as f: snap=json.load(f)
+        except (OSError,ValueError): continue
+        for n,labels,v in snap['counters']:
+            key=(n,tuple(map(tuple,labels))); counters[key]=counters.get(key,0.0)+v
+        for n,labels,buckets,counts,total,count in snap['histograms']:
+            key=(n,tuple(map(tuple,labels))); h=hists.get(key)
+            if h is None: hists[key]=[buckets,list(counts),total,count]
+            else:
+                h[1]=[a+b for a,b in zip(h[1],counts)]; h[2]+=total; h[3]+=count
+    return counters,hists
+
+def _labels(labels, extra=()):
+    items=list(labels)+list(extra)
+    if not items: return ''
+    esc=lambda v: str(v).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n')
+    return '{'+','.join(f'{k}="{esc(v)}"' for k,v in items)+'}'
+
+def render(counters, hists):
+    out=[]; seen=set()
+    def header(name):
+        if name in seen: return
+        seen.add(name); kind,text=HELP.get(name,('untyped',name))
+        out.append(f'# HELP {name} {text}'); out.append(f'# TYPE {name} {kind}')
+    for (name,labels),v in sorted(counters.items()):
+        header(name); out.append(f'{name}{_labels(labels)} {v:g}')
+    for (name,labels),(buckets,counts,total,count) in sorted(hists.items()):
+        header(name)
+        for b,c in zip(buckets,counts): out.append(f'{name}_bucket{_labels(labels,[("le",f"{b:g}")])} {c}')
+        out.append(f'{name}_bucket{_labels(labels,[("le","+Inf")])} {count}')
+        out.append(f'{name}_sum{_labels(labels)} {total:g}')
+        out.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(out)+'\n'
+
+# --- SQL --------------------------------------------------------------------
+
+_STRING=re.compile(r"'(?:[^']|'')*'"); _NUMBER=re.compile(r'\b\d+(\.\d+)?\b'); _IN_LIST=re.compile(r'\((\s*\?\s*,)+\s*\?\s*\)')
+
+def normalize_sql(sql):
+    sql=' '.join(sql.split())
+    sql=_STRING.sub('?',sql); sql=_NUMBER.sub('?',sql)
+    return _IN_LIST.sub('(?…)',sql)
+
+def _observe_sql(sql, seconds, error=None):
+    kind=(sql.lstrip().split(None,1)[0].upper() if sql.strip() else '?')
+    if kind=='BEGIN' and 'IMMEDIATE' in sql.upper(): REGISTRY.observe('sqlite_lock_wait_seconds',(),seconds)
+    REGISTRY.observe('sql_statement_duration_seconds',(('kind',kind),),seconds)
+    if error is not None and 'locked' in str(error): REGISTRY.inc('sqlite_busy_errors_total')
+    if seconds*1000>=SLOW_QUERY_MS:
+        REGISTRY.inc('sql_slow_queries_total')
+        log.warning('requête lente %.1f ms: %s',seconds*1000,normalize_sql(sql)[:500])
+    stats=_request_stats.get()
+    if stats is not None:
+        stats[0]+=1; stats[1]+=seconds
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion sqlite3 chronométrant execute/executemany (à passer en factory= de sqlite3.connect)."""
+    def execute(self, sql, *args):
+        t0=time.perf_counter(); err=None
+        try: return super().execute(sql,*args)
+        except sqlite3.Error as e: err=e; raise
+        finally: _observe_sql(sql,time.perf_counter()-t0,err)
+    def executemany(self, sql, *args):
+        t0=time.perf_counter(); err=None
+        try: return super().executemany(sql,*args)
+        except sqlite3.Error as e: err=e; raise
+        finally: _observe_sql(sql,time.perf_counter()-t0,err)
+
+# --- MiR --------------------------------------------------------------------
+
+_MIR_ID=re.compile(r'/(\d+|[0-9a-f]{8}-[0-9a-f-]{27})(?=/|$)')
+
+def observe_mir(method, path, seconds, error):
+    labels=(('method',method),('endpoint',_MIR_ID.sub('/:id',path)))
+    REGISTRY.observe('mir_request_duration_seconds',labels,seconds)
+    if error is not None: REGISTRY.inc('mir_request_errors_total',labels)
+
+# --- Synchro des postes --------------------------------------------------
+
+def observe_sync(results):
+    for r in results:
+        status='duplicate' if r.get('duplicate') else r['status']
+        REGISTRY.inc('sync_operations_total',(('kind',str(r.get('kind'))),('status',status)))
+        if 'lag_s' in r and not r.get('duplicate'): REGISTRY.observe('sync_operation_lag_seconds',(),r['lag_s'],LAG_BUCKETS)
+
+# --- Flask ------------------------------------------------------------------
+
+def init_app(app, mir_stats=None, pool_stats=None):
+    if pool_stats:
+        def collect_pool():
+            for event,value in pool_stats().items():
+                REGISTRY.set('sqlite_connections_total',(('event',event),),value)
+        REGISTRY.collectors.append(collect_pool)
+    if mir_stats:
+        def collect_mir():
+            for event,value in (mir_stats() or {}).items():
+                if event in ('hits','misses','coalesced','errors','negative'):
+                    REGISTRY.set('mir_cache_events_total',(('event',event),),value)
+        REGISTRY.collectors.append(collect_mir)
+
+    @app.before_request
+    def _start_timer():
+        request.environ['metrics.t0']=time.perf_counter()
+        request.environ['metrics.token']=_request_stats.set([0,0.0])
+
+    @app.teardown_request
+    def _record(exc):
+        t0=request.environ.pop('metrics.t0',None)
+        token=request.environ.pop('metrics.token',None)
+        if t0 is None: return
+        stats=_request_stats.get() or [0,0.0]
+        if token is not None: _request_stats.reset(token)
+        route=request.url_rule.rule if request.url_rule else 'unmatched'
+        status=request.environ.get('metrics.status',500 if exc else 200)
+        REGISTRY.observe('http_request_duration_seconds',(('route',route),('method',request.method),('status',str(status))),time.perf_counter()-t0)
+        REGISTRY.observe('sql_queries_per_request',(('route',route),),stats[0],COUNT_BUCKETS)
+        REGISTRY.observe('sql_time_per_request_seconds',(('route',route),),stats[1])
+        flush()
+
+    @app.after_request
+    def _status(resp):
+        request.environ['metrics.status']=resp.status_code
+        return resp
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        flush(force=True)
+        return Response(render(*merged()),mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,401 @@
+import os, sys, sqlite3
+from database import connect
+
+# Migrations ordonnées, idempotentes, indexées sur PRAGMA user_version.
+# Chaque étape doit pouvoir être rejouée sur une base déjà (partiellement) migrée :
+# les bases existantes démarrent à user_version=0 et repassent toutes les étapes une fois.
+
+def column_exists(db, table, col):
+    rows=db.execute(f"PRAGMA table_info({table})").fetchall()
+    return any(r['name']==col for r in rows)
+
+def _v1_base_schema(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS location(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      code TEXT NOT NULL UNIQUE,
+      name TEXT NOT NULL,
+      kind TEXT NOT NULL CHECK(kind IN ('SOL','ETAGERE','POSTE')),
+      capacity INTEGER,
+      size TEXT,
+      active INTEGER NOT NULL DEFAULT 1
+    );""")
+    db.execute("""CREATE TABLE IF NOT EXISTS item(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      sku TEXT NOT NULL,
+      description TEXT,
+      photo_path TEXT,
+      size TEXT CHECK(size IN ('GRAND','PETIT') OR size IS NULL),
+      status TEXT NOT NULL CHECK(status IN ('RECU','PHOTO','INSPECTION','EMBALLAGE','STOCK','NOGO')),
+      location_id INTEGER,
+      avis_no TEXT,
+      order_no TEXT,
+      bl_no TEXT,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      FOREIGN KEY(location_id) REFERENCES location(id) ON DELETE SET NULL
+    );""")
+    db.execute("""CREATE TABLE IF NOT EXISTS movement(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      item_id INTEGER NOT NULL,
+      from_location_id INTEGER,
+      to_location_id INTEGER,
+      action TEXT NOT NULL,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      user TEXT,
+      FOREIGN KEY(item_id) REFERENCES item(id) ON DELETE CASCADE
+    );""")
+
+def _v2_add_columns(db):
+    if not column_exists(db,'location','size'):
+        db.execute('ALTER TABLE location ADD COLUMN size TEXT')
+    if not column_exists(db,'location','active'):
+        db.execute('ALTER TABLE location ADD COLUMN active INTEGER NOT NULL DEFAULT 1')
+    if not column_exists(db,'item','size'):
+        db.execute('ALTER TABLE item ADD COLUMN size TEXT')
+
+def _v3_backfill_sol_sizes(db):
+    db.execute("""
+        UPDATE location SET size='GRAND'
+        WHERE kind='SOL' AND (size IS NULL OR size='') AND (code GLOB 'S-A[1-4]' OR code GLOB 'S-B[1-4]')
+    """)
+    db.execute("""
+        UPDATE location SET size='PETIT'
+        WHERE kind='SOL' AND (size IS NULL OR size='') AND (
+         code GLOB 'S-C[1-6]' OR code GLOB 'S-D[1-6]' OR code GLOB 'S-E[1-6]' OR
+         code GLOB 'S-F[1-6]' OR code GLOB 'S-G[1-6]' OR code GLOB 'S-H[1-6]')
+    """)
+
+def _v4_seed_locations(db):
+    c=db.execute('SELECT COUNT(*) AS c FROM location').fetchone()['c']
+    if c: return
+    for code in ['S-A1','S-A2','S-A3','S-A4','S-B1','S-B2','S-B3','S-B4']:
+        db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
+                   (code,f'Grand Chariot {code}','SOL',1,'GRAND'))
+    for row in ['C','D','E','F','G','H']:
+        for i in range(1,7):
+            code=f'S-{row}{i}'
+            db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
+                       (code,f'Petit Chariot {code}','SOL',1,'PETIT'))
+    for code,name in [('POSTE-PHOTO','Poste Photo'),('POSTE-INSPECTION','Poste Inspection'),('POSTE-EMBALLAGE','Poste Emballage')]:
+        db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
+                   (code,name,'POSTE',1,None))
+    for e in [1,2,3]:
+        for s in ['A','B','C','D']:
+            code=f'ETAGERE-{e}-{s}'
+            db.execute("INSERT INTO location(code,name,kind,capacity,size) VALUES (?,?,?,?,?)",
+                       (code,f'Etagère {e} plateau {s}','ETAGERE',None,None))
+
+def _v5_normalize_locations(db):
+    allowed_shelves=[f"ETAGERE-{e}-{s}" for e in (1,2,3) for s in ("A","B","C","D")]
+    placeholders=",".join(["?"]*len(allowed_shelves))
+    # Désactiver les étagères non référencées ET vides
+    db.execute(f"""
+        UPDATE location
+           SET active = 0
+         WHERE kind = 'ETAGERE'
+           AND code NOT IN ({placeholders})
+           AND id NOT IN (
+                SELECT l.id
+                  FROM location l
+                  JOIN item i ON i.location_id = l.id
+                 WHERE l.kind='ETAGERE'
+           )
+    """, allowed_shelves)
+    # Renommer les 12 plateaux standard
+    for e in (1,2,3):
+        for s in ("A","B","C","D"):
+            code=f"ETAGERE-{e}-{s}"
+            if e in (1,2):
+                name=f"Étagère {e} (Encours) – Plateau {s}"
+            else:
+                name=f"Étagère 3 (NOGO) – Plateau {s}"
+            db.execute("UPDATE location SET name=? WHERE code=? AND kind='ETAGERE'", (name, code))
+    # Renommer les SOL selon la taille
+    db.execute("UPDATE location SET name = 'Grand Chariot ' || code WHERE kind='SOL' AND size='GRAND'")
+    db.execute("UPDATE location SET name = 'Petit Chariot ' || code WHERE kind='SOL' AND size='PETIT'")
+
+# Index gérés : nom -> DDL. Toute requête de l'app doit pouvoir s'appuyer dessus (cf. query_plans.py).
+INDEXES={
+    'idx_item_location':'CREATE INDEX IF NOT EXISTS idx_item_location ON item(location_id)',
+    'idx_item_status_created':'CREATE INDEX IF NOT EXISTS idx_item_status_created ON item(status, created_at)',
+    'idx_item_created':'CREATE INDEX IF NOT EXISTS idx_item_created ON item(created_at)',
+    'idx_item_sku':'CREATE INDEX IF NOT EXISTS idx_item_sku ON item(sku)',
+    'idx_movement_item_created':'CREATE INDEX IF NOT EXISTS idx_movement_item_created ON movement(item_id, created_at)',
+    # API /api/v1 : synchro incrémentale, export des mouvements, filtres ERP
+    'idx_item_updated':'CREATE INDEX IF NOT EXISTS idx_item_updated ON item(updated_at)',
+    'idx_movement_created':'CREATE INDEX IF NOT EXISTS idx_movement_created ON movement(created_at)',
+    'idx_item_avis':'CREATE INDEX IF NOT EXISTS idx_item_avis ON item(avis_no)',
+    'idx_item_order':'CREATE INDEX IF NOT EXISTS idx_item_order ON item(order_no)',
+    'idx_item_bl':'CREATE INDEX IF NOT EXISTS idx_item_bl ON item(bl_no)',
+}
+
+def ensure_indexes(db):
+    for ddl in INDEXES.values(): db.execute(ddl)
+
+def _v6_indexes(db):
+    ensure_indexes(db)
+
+# Recherche plein texte /items : table FTS5 à contenu externe (item), synchronisée par triggers
+FTS_COLUMNS=('sku','description','avis_no','order_no','bl_no')
+
+def _v7_item_fts(db):
+    cols=','.join(FTS_COLUMNS)
+    new=','.join('new.'+c for c in FTS_COLUMNS); old=','.join('old.'+c for c in FTS_COLUMNS)
+    db.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS item_fts USING fts5(
+      {cols}, content='item', content_rowid='id',
+      tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_item_fts_ai AFTER INSERT ON item BEGIN
+      INSERT INTO item_fts(rowid,{cols}) VALUES (new.id,{new});
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_item_fts_ad AFTER DELETE ON item BEGIN
+      INSERT INTO item_fts(item_fts,rowid,{cols}) VALUES ('delete',old.id,{old});
+    END""")
+    db.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_item_fts_au AFTER UPDATE OF {cols} ON item BEGIN
+      INSERT INTO item_fts(item_fts,rowid,{cols}) VALUES ('delete',old.id,{old});
+      INSERT INTO item_fts(rowid,{cols}) VALUES (new.id,{new});
+    END""")
+    db.execute("INSERT INTO item_fts(item_fts) VALUES ('rebuild')")
+
+# Occupation des emplacements à capacité finie : une ligne par place occupée.
+# La clé (location_id, slot) et le trigger de capacité font rejeter la sur-réservation par la base.
+def _v8_slot_occupancy(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS slot_occupancy(
+      location_id INTEGER NOT NULL,
+      slot INTEGER NOT NULL,
+      item_id INTEGER NOT NULL UNIQUE,
+      PRIMARY KEY(location_id, slot),
+      FOREIGN KEY(location_id) REFERENCES location(id) ON DELETE CASCADE,
+      FOREIGN KEY(item_id) REFERENCES item(id) ON DELETE CASCADE
+    )""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_slot_capacity BEFORE INSERT ON slot_occupancy
+      WHEN NEW.slot < 0 OR NEW.slot >= (SELECT capacity FROM location WHERE id=NEW.location_id)
+      BEGIN SELECT RAISE(ABORT, 'capacité dépassée'); END""")
+    db.execute("""
+        INSERT OR IGNORE INTO slot_occupancy(location_id, slot, item_id)
+        SELECT location_id, rn, id FROM (
+          SELECT i.location_id, i.id, l.capacity,
+                 ROW_NUMBER() OVER (PARTITION BY i.location_id ORDER BY i.id)-1 AS rn
+            FROM item i JOIN location l ON l.id=i.location_id
+           WHERE l.capacity IS NOT NULL
+        ) WHERE rn < capacity
+    """)
+
+# Table clé/valeur de service. 'slots_generation' change à chaque modification de l'occupation
+# ou des emplacements : les caches d'emplacements libres des workers se recalent dessus.
+def _v9_meta_generation(db):
+    db.execute('CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value) WITHOUT ROWID')
+    db.execute("INSERT OR IGNORE INTO meta(key,value) VALUES ('slots_generation',0)")
+    bump="UPDATE meta SET value=value+1 WHERE key='slots_generation';"
+    for name,event in [('trg_slots_gen_occ_ai','AFTER INSERT ON slot_occupancy'),
+                       ('trg_slots_gen_occ_ad','AFTER DELETE ON slot_occupancy'),
+                       ('trg_slots_gen_loc_ai','AFTER INSERT ON location'),
+                       ('trg_slots_gen_loc_au','AFTER UPDATE OF kind,capacity,size,active ON location'),
+                       ('trg_slots_gen_loc_ad','AFTER DELETE ON location')]:
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {bump} END')
+
+# File persistante des missions MiR (cf. mir_dispatch.py)
+def _v10_mir_job(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS mir_job(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      mission_guid TEXT NOT NULL,
+      source TEXT,
+      item_id INTEGER,
+      status TEXT NOT NULL DEFAULT 'PENDING' CHECK(status IN ('PENDING','RUNNING','SENT','FAILED','MERGED')),
+      attempts INTEGER NOT NULL DEFAULT 0,
+      next_attempt_at REAL NOT NULL DEFAULT 0,
+      claimed_at REAL,
+      last_error TEXT,
+      result TEXT,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_mir_job_pending ON mir_job(mission_guid) WHERE status='PENDING'")
+    db.execute('CREATE INDEX IF NOT EXISTS idx_mir_job_due ON mir_job(status, next_attempt_at)')
+
+# Séquence des SKU automatiques (SKU-00001...), remplace le tri sur CAST(SUBSTR(sku,5)) à chaque création.
+# Un SKU saisi à la main au format SKU-n repousse la séquence pour éviter les collisions.
+def _v11_sku_sequence(db):
+    db.execute('CREATE TABLE IF NOT EXISTS sku_sequence(name TEXT PRIMARY KEY, next INTEGER NOT NULL) WITHOUT ROWID')
+    db.execute("""INSERT OR IGNORE INTO sku_sequence(name,next)
+                  SELECT 'SKU', COALESCE(MAX(CAST(SUBSTR(sku,5) AS INTEGER)),0)+1 FROM item WHERE sku GLOB 'SKU-[0-9]*'""")
+    db.execute("""CREATE TRIGGER IF NOT EXISTS trg_item_sku_sequence AFTER INSERT ON item
+      WHEN NEW.sku GLOB 'SKU-[0-9]*' BEGIN
+        UPDATE sku_sequence SET next=MAX(next, CAST(SUBSTR(NEW.sku,5) AS INTEGER)+1) WHERE name='SKU';
+      END""")
+
+# Compteurs matérialisés (articles par emplacement, articles par statut) tenus par triggers
+# dans la transaction même de l'écriture sur item : dashboard et /locations ne recomptent plus la table.
+COUNTER_TABLES={
+    'location_count':("SELECT location_id, COUNT(*) FROM item WHERE location_id IS NOT NULL GROUP BY location_id",'location_id'),
+    'status_count':("SELECT status, COUNT(*) FROM item GROUP BY status",'status'),
+}
+
+def counter_drift(db):
+    """Écarts entre compteurs stockés et recomptage : {table: [(clé, stocké, réel)]}."""
+    drift={}
+    for table,(query,key) in COUNTER_TABLES.items():
+        real={r[0]:r[1] for r in db.execute(query)}
+        stored={r[0]:r[1] for r in db.execute(f'SELECT {key}, items FROM {table} WHERE items<>0')}
+        rows=[(k,stored.get(k,0),real.get(k,0)) for k in sorted(set(real)|set(stored),key=str) if stored.get(k,0)!=real.get(k,0)]
+        if rows: drift[table]=rows
+    return drift
+
+def rebuild_counters(db):
+    for table,(query,key) in COUNTER_TABLES.items():
+        db.execute(f'DELETE FROM {table}')
+        db.execute(f'INSERT INTO {table}({key}, items) {query}')
+
+def _v12_counters(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS location_count(
+      location_id INTEGER PRIMARY KEY REFERENCES location(id) ON DELETE CASCADE,
+      items INTEGER NOT NULL DEFAULT 0)""")
+    db.execute('CREATE TABLE IF NOT EXISTS status_count(status TEXT PRIMARY KEY, items INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID')
+    add_loc="INSERT INTO location_count(location_id,items) VALUES (NEW.location_id,1) ON CONFLICT(location_id) DO UPDATE SET items=items+1;"
+    del_loc="UPDATE location_count SET items=items-1 WHERE location_id=OLD.location_id;"
+    add_st="INSERT INTO status_count(status,items) VALUES (NEW.status,1) ON CONFLICT(status) DO UPDATE SET items=items+1;"
+    del_st="UPDATE status_count SET items=items-1 WHERE status=OLD.status;"
+    for name,event,body in [
+        ('trg_count_item_ai','AFTER INSERT ON item',add_st),
+        ('trg_count_item_ai_loc','AFTER INSERT ON item WHEN NEW.location_id IS NOT NULL',add_loc),
+        ('trg_count_item_ad','AFTER DELETE ON item',del_st),
+        ('trg_count_item_ad_loc','AFTER DELETE ON item WHEN OLD.location_id IS NOT NULL',del_loc),
+        ('trg_count_item_status','AFTER UPDATE OF status ON item WHEN OLD.status IS NOT NEW.status',del_st+add_st),
+        ('trg_count_item_loc_out','AFTER UPDATE OF location_id ON item WHEN OLD.location_id IS NOT NEW.location_id AND OLD.location_id IS NOT NULL',del_loc),
+        ('trg_count_item_loc_in','AFTER UPDATE OF location_id ON item WHEN OLD.location_id IS NOT NEW.location_id AND NEW.location_id IS NOT NULL',add_loc)]:
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+    rebuild_counters(db)
+
+# Journal d'événements (articles déplacés/créés, SOL libérés, statut robot, file MiR) :
+# canal entre workers pour le flux /events, purgé par le détenteur du bail du poller MiR.
+def _v13_event_log(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS event_log(
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      type TEXT NOT NULL,
+      payload TEXT NOT NULL,
+      created_at REAL NOT NULL
+    )""")
+
+# Nouveaux index gérés (INDEXES) pour l'API de lecture : ensure_indexes ne crée que les manquants
+def _v14_api_indexes(db):
+    ensure_indexes(db)
+
+# Temps de séjour aux postes (analytics.py) : agrégats par poste et par jour, histogramme des
+# séjours, visites en cours ; alimentés par analytics.fold() depuis movement (meta.analytics_hwm).
+def _v15_station_analytics(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS station_day(
+      location_id INTEGER NOT NULL REFERENCES location(id) ON DELETE CASCADE,
+      day TEXT NOT NULL,
+      items_in INTEGER NOT NULL DEFAULT 0,
+      items_out INTEGER NOT NULL DEFAULT 0,
+      nogo INTEGER NOT NULL DEFAULT 0,
+      dwell_sum REAL NOT NULL DEFAULT 0,
+      dwell_max REAL NOT NULL DEFAULT 0,
+      PRIMARY KEY(location_id,day)
+    ) WITHOUT ROWID""")
+    db.execute("""CREATE TABLE IF NOT EXISTS station_dwell_hist(
+      location_id INTEGER NOT NULL REFERENCES location(id) ON DELETE CASCADE,
+      day TEXT NOT NULL,
+      bucket INTEGER NOT NULL,
+      n INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY(location_id,day,bucket)
+    ) WITHOUT ROWID""")
+    db.execute("""CREATE TABLE IF NOT EXISTS station_visit(
+      item_id INTEGER PRIMARY KEY REFERENCES item(id) ON DELETE CASCADE,
+      location_id INTEGER NOT NULL,
+      arrived_at REAL NOT NULL,
+      nogo INTEGER NOT NULL DEFAULT 0
+    )""")
+
+# Flotte MiR (mir_dispatch.py, fleet.py) : robot affecté, suivi de la mission sur le robot,
+# articles regroupés sur une même mission en attente (lot vers un poste).
+def _v16_mir_fleet(db):
+    for col,ddl in (('robot','TEXT'),('mission_queue_id','INTEGER'),('mission_state','TEXT'),('sent_at','REAL'),('finished_at','REAL')):
+        if not column_exists(db,'mir_job',col):
+            db.execute(f'ALTER TABLE mir_job ADD COLUMN {col} {ddl}')
+    db.execute("""CREATE TABLE IF NOT EXISTS mir_job_item(
+      job_id INTEGER NOT NULL REFERENCES mir_job(id) ON DELETE CASCADE,
+      item_id INTEGER NOT NULL,
+      added_at REAL NOT NULL,
+      PRIMARY KEY(job_id,item_id)
+    ) WITHOUT ROWID""")
+    db.execute("INSERT OR IGNORE INTO mir_job_item(job_id,item_id,added_at) SELECT id, item_id, next_attempt_at FROM mir_job WHERE item_id IS NOT NULL")
+    # missions déjà envoyées avant le suivi : considérées terminées
+    db.execute("UPDATE mir_job SET finished_at=COALESCE(finished_at,next_attempt_at) WHERE status IN ('SENT','FAILED','MERGED')")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_mir_job_active ON mir_job(robot) WHERE status IN ('RUNNING','SENT') AND finished_at IS NULL")
+
+# Synchro des postes (/api/sync) : une ligne par opération reçue, clé d'idempotence fournie par le poste.
+# Un renvoi (réseau coupé avant la réponse) retrouve le résultat au lieu de rejouer l'opération.
+def _v17_sync_ops(db):
+    db.execute("""CREATE TABLE IF NOT EXISTS sync_op(
+      key TEXT PRIMARY KEY,
+      station TEXT,
+      kind TEXT NOT NULL,
+      client_ts REAL,
+      status TEXT NOT NULL,
+      item_id INTEGER,
+      result TEXT NOT NULL,
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID""")
+    db.execute('CREATE INDEX IF NOT EXISTS idx_sync_op_created ON sync_op(created_at)')
+
+def _v18_movement_occurred_at(db):
+    # heure de l'action au poste quand elle précède l'enregistrement (synchro hors ligne) ; NULL = created_at
+    if not column_exists(db,'movement','occurred_at'):
+        db.execute('ALTER TABLE movement ADD COLUMN occurred_at TIMESTAMP')
+
+MIGRATIONS=[
+    (1,'schéma de base',_v1_base_schema),
+    (2,'colonnes size/active',_v2_add_columns),
+    (3,'tailles des SOL',_v3_backfill_sol_sizes),
+    (4,'seed des emplacements',_v4_seed_locations),
+    (5,'normalisation étagères/SOL',_v5_normalize_locations),
+    (6,'index secondaires',_v6_indexes),
+    (7,'recherche plein texte item_fts',_v7_item_fts),
+    (8,'occupation des emplacements',_v8_slot_occupancy),
+    (9,'table meta et génération des emplacements',_v9_meta_generation),
+    (10,'file des missions MiR',_v10_mir_job),
+    (11,'séquence des SKU',_v11_sku_sequence),
+    (12,'compteurs emplacements/statuts',_v12_counters),
+    (13,"journal d'événements",_v13_event_log),
+    (14,"index de l'API de lecture",_v14_api_indexes),
+    (15,'temps de séjour aux postes',_v15_station_analytics),
+    (16,'flotte MiR et lots de missions',_v16_mir_fleet),
+    (17,'synchro des postes',_v17_sync_ops),
+    (18,"heure des mouvements au poste",_v18_movement_occurred_at),
+]
+SCHEMA_VERSION=MIGRATIONS[-1][0]
+
+def schema_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(path, timeout=60.0):
+    """Amène la base à SCHEMA_VERSION. Retourne (version_initiale, version_finale).
+
+    Chemin rapide sans verrou si le schéma est à jour. Sinon toutes les étapes
+    manquantes tournent dans une seule transaction BEGIN IMMEDIATE : le premier
+    worker migre, les autres attendent le verrou puis constatent la version à jour.
+    """
+    db=connect(path,timeout=timeout,isolation_level=None)
+    db.row_factory=sqlite3.Row
+    try:
+        current=schema_version(db)
+        if current>=SCHEMA_VERSION: return current,current
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            start=schema_version(db)
+            for version,_name,step in MIGRATIONS:
+                if version<=start: continue
+                step(db)
+                db.execute(f'PRAGMA user_version={version}')
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK'); raise
+        return start,max(start,SCHEMA_VERSION)
+    finally:
+        db.close()
+
+if __name__=='__main__':
+    path=sys.argv[1] if len(sys.argv)>1 else os.environ.get('DATABASE',os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','stock.db'))
+    before,after=migrate(path)
+    print(f'{path}: schéma v{before} -> v{after}')
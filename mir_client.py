@@ -1,14 +1,80 @@
-import os, base64, time
+import os, base64, time, threading
+from concurrent.futures import Future
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class TTLCache:
+    """Cache à durée de vie courte, single-flight : un seul appel en vol par clé,
+    les appelants concurrents attendent son résultat (valeur ou exception) au lieu de relancer la requête.
+    Un échec est gardé error_ttl secondes : robot injoignable = un appel (et son timeout) par intervalle, pas un par appelant."""
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._entries={}   # clé -> (expire_at, valeur, exception)
+        self._inflight={}  # clé -> Future de l'appel en cours
+        self.hits=self.misses=self.coalesced=self.errors=self.negative=0
+    def get(self,key,ttl,loader,error_ttl=0):
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry and entry[0]>time.monotonic():
+                if entry[2] is None:
+                    self.hits+=1; return entry[1]
+                self.negative+=1; raise entry[2]
+            flight=self._inflight.get(key)
+            if flight is None:
+                flight=self._inflight[key]=Future(); self.misses+=1; owner=True
+            else:
+                self.coalesced+=1; owner=False
+        if not owner:
+            return flight.result()
+        try:
+            value=loader()
+        except BaseException as e:   # jamais d'attente sans fin : l'appel en vol est toujours résolu
+            with self._lock:
+                self.errors+=1
+                if error_ttl>0 and isinstance(e,Exception): self._entries[key]=(time.monotonic()+error_ttl,None,e)
+                self._inflight.pop(key,None)
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key]=(time.monotonic()+ttl,value,None)
+            self._inflight.pop(key,None)
+        flight.set_result(value)
+        return value
+    def invalidate(self,key=None):
+        with self._lock:
+            if key is None: self._entries.clear()
+            else: self._entries.pop(key,None)
+    def stats(self):
+        with self._lock:
+            return {'hits':self.hits,'misses':self.misses,'coalesced':self.coalesced,'errors':self.errors,'negative':self.negative}
+
+# Missions du mode dry-run (et du robot simulé, cf. mir_sim.py) : une par poste
+DRY_MISSIONS=[
+    {'name':'POSTE-PHOTO','guid':'11111111-2222-3333-4444-555555555555'},
+    {'name':'POSTE-INSPECTION','guid':'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'},
+    {'name':'POSTE-EMBALLAGE','guid':'99999999-8888-7777-6666-555555555555'},
+]
+
+# Observateurs des appels HTTP réels : fn(method, path, seconds, error) (cf. metrics.observe_mir)
+observers=[]
+
+def _notify(method, path, t0, error):
+    for fn in observers:
+        fn(method,path,time.perf_counter()-t0,error)
 
 class MiRClient:
-    def __init__(self, base=None, user=None, password=None, verify=False, timeout=8):
+    def __init__(self, base=None, user=None, password=None, verify=False, timeout=8,
+                 status_ttl=None, missions_ttl=None, pool_size=4, retries=2):
         self.dry = (os.getenv("MIR_DRY_RUN","false").lower()=="true")
         self.base = (base or os.getenv("MIR_BASE_URL","")) .rstrip('/')
         self.user = user or os.getenv("MIR_USER","dry")
         self.password = password or os.getenv("MIR_PASS","run")
         self.verify = verify
         self.timeout = timeout
+        self.status_ttl = float(status_ttl if status_ttl is not None else os.getenv("MIR_STATUS_TTL","1.5"))
+        self.missions_ttl = float(missions_ttl if missions_ttl is not None else os.getenv("MIR_MISSIONS_TTL","30"))
+        self.cache = TTLCache()
         self._t0 = time.time()
         if not self.dry:
             if not self.base: raise RuntimeError("MIR_BASE_URL manquant")
@@ -19,36 +85,80 @@ class MiRClient:
                 'Content-Type': 'application/json',
                 'Accept-Language': 'en-US'
             }
+            # Session partagée : keep-alive + pool de connexions, retry avec backoff sur les GET seulement
+            # (un POST mission_queue rejoué pourrait lancer deux missions)
+            retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(502,503,504),
+                          allowed_methods=frozenset(['GET']), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+            self.session = requests.Session()
+            self.session.headers.update(self.headers)
+            self.session.verify = verify
+            self.session.mount('http://', adapter); self.session.mount('https://', adapter)
     def _get(self,path):
         if self.dry:
             return {'dry_run': True, 'endpoint': path}
-        r=requests.get(f"{self.base}{path}",headers=self.headers,timeout=self.timeout,verify=self.verify)
-        r.raise_for_status(); return r.json()
+        t0=time.perf_counter(); err=None
+        try:
+            r=self.session.get(f"{self.base}{path}",timeout=self.timeout)
+            r.raise_for_status(); return r.json()
+        except Exception as e:
+            err=e; raise
+        finally:
+            _notify('GET',path,t0,err)
     def _post(self,path,payload):
         if self.dry:
             return {'dry_run': True, 'endpoint': path, 'payload': payload}
-        r=requests.post(f"{self.base}{path}",json=payload,headers=self.headers,timeout=self.timeout,verify=self.verify)
-        r.raise_for_status(); return r.json() if r.text else {}
-    def status(self):
-        if self.dry:
-            elapsed=time.time()-self._t0
-            battery=max(5,100-int(elapsed)%100)
-            return {
-                'dry_run': True,
-                'robot_name':'MiR250-Demo',
-                'state_text':'Ready' if int(elapsed)%10<7 else 'Executing mission',
-                'mission_text':'Moving',
-                'battery_percentage': battery,
-                'position': {'x': round(1+0.01*elapsed,2),'y':round(2+0.02*elapsed,2),'orientation':0.0}
-            }
-        return self._get('/status')
-    def missions(self):
+        t0=time.perf_counter(); err=None
+        try:
+            r=self.session.post(f"{self.base}{path}",json=payload,timeout=self.timeout)
+            r.raise_for_status(); return r.json() if r.text else {}
+        except Exception as e:
+            err=e; raise
+        finally:
+            _notify('POST',path,t0,err)
+    def _dry_status(self):
+        elapsed=time.time()-self._t0
+        battery=max(5,100-int(elapsed)%100)
+        return {
+            'dry_run': True,
+            'robot_name':'MiR250-Demo',
+            'state_text':'Ready' if int(elapsed)%10<7 else 'Executing mission',
+            'mission_text':'Moving',
+            'battery_percentage': battery,
+            'position': {'x': round(1+0.01*elapsed,2),'y':round(2+0.02*elapsed,2),'orientation':0.0}
+        }
+    def status(self, fresh=False):
+        load=self._dry_status if self.dry else (lambda: self._get('/status'))
+        if fresh: self.cache.invalidate('status')
+        return self.cache.get('status',self.status_ttl,load,error_ttl=self.status_ttl)
+    def missions(self, fresh=False):
         if self.dry:
-            return [
-                {'name':'POSTE-PHOTO','guid':'11111111-2222-3333-4444-555555555555'},
-                {'name':'POSTE-INSPECTION','guid':'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'},
-                {'name':'POSTE-EMBALLAGE','guid':'99999999-8888-7777-6666-555555555555'}
-            ]
-        return self._get('/missions')
+            return [dict(m) for m in DRY_MISSIONS]
+        if fresh: self.cache.invalidate('missions')
+        return self.cache.get('missions',self.missions_ttl,lambda: self._get('/missions'),error_ttl=self.status_ttl)
     def start_mission(self,guid:str):
-        return self._post('/mission_queue',{'mission_id':guid})
+        result=self._post('/mission_queue',{'mission_id':guid})
+        self.cache.invalidate('status')
+        return result
+    def mission_queue(self, queue_id):
+        """État d'une mission lancée (state : Pending, Executing, Done, Aborted…), jamais en cache."""
+        if self.dry:
+            return {'dry_run': True, 'id': queue_id, 'state': 'Done'}
+        return self._get(f'/mission_queue/{queue_id}')
+    def stats(self):
+        return {'dry_run':self.dry,'status_ttl':self.status_ttl,'missions_ttl':self.missions_ttl,**self.cache.stats()}
+
+_client=None
+_client_lock=threading.Lock()
+
+def get_client():
+    """Client MiR unique du processus (session et caches partagés entre requêtes)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client=MiRClient()
+        return _client
+
+def client_stats():
+    """Statistiques du client du processus, sans le créer s'il n'existe pas encore."""
+    return _client.stats() if _client is not None else None
@@ -0,0 +1,174 @@
+import os, json, time, sqlite3, threading, logging
+from database import connect
+from events import publish
+from fleet import Fleet
+
+# File persistante des missions MiR (table mir_job) et dispatcher en arrière-plan.
+# La requête HTTP ne fait qu'enqueue() ; l'envoi au robot, les retries et le backoff
+# vivent dans le thread Dispatcher, indépendamment de la latence du robot.
+# Flotte (fleet.py) : une mission n'est confiée qu'à un robot prêt (état, batterie) sans mission
+# en cours ; les articles vers une même mission (un poste) s'ajoutent à la mission en attente
+# (mir_job_item) et partent ensemble ; la fin est suivie par GET mission_queue/<id>.
+
+log=logging.getLogger(__name__)
+
+MAX_ATTEMPTS=int(os.getenv('MIR_JOB_MAX_ATTEMPTS','5'))
+BACKOFF_BASE=float(os.getenv('MIR_JOB_BACKOFF','2'))
+BACKOFF_MAX=float(os.getenv('MIR_JOB_BACKOFF_MAX','60'))
+LEASE_SECONDS=float(os.getenv('MIR_JOB_LEASE','60'))   # RUNNING plus vieux que ça = worker mort, on reprend
+MISSION_TIMEOUT=float(os.getenv('MIR_JOB_MISSION_TIMEOUT','1800'))   # mission envoyée jamais terminée : échec
+TRACK_SECONDS=float(os.getenv('MIR_JOB_TRACK_INTERVAL','2'))
+DONE_STATES=('Done',)
+FAILED_STATES=('Aborted','Failed')
+
+def backoff(attempts):
+    return min(BACKOFF_MAX,BACKOFF_BASE*2**max(0,attempts-1))
+
+def enqueue(db, guid, source=None, item_id=None, commit=True):
+    """Met une mission en file. Retourne (job_id, créée) ; une mission identique déjà
+    en attente est réutilisée (dédoublonnage par l'index unique partiel) et l'article
+    rejoint son lot."""
+    now=time.time()
+    cur=db.execute('INSERT OR IGNORE INTO mir_job(mission_guid,source,item_id,next_attempt_at) VALUES (?,?,?,?)',
+                   (guid,source,item_id,now))
+    if cur.rowcount:
+        job_id=cur.lastrowid; created=True
+    else:
+        job_id=db.execute("SELECT id FROM mir_job WHERE mission_guid=? AND status='PENDING'",(guid,)).fetchone()[0]; created=False
+    if item_id is not None:
+        db.execute('INSERT OR IGNORE INTO mir_job_item(job_id,item_id,added_at) VALUES (?,?,?)',(job_id,item_id,now))
+    if created: publish(db,'mir-job',{'id':job_id,'status':'PENDING'})
+    if commit: db.commit()
+    return job_id,created
+
+def has_due(db, now=None):
+    now=now or time.time()
+    return db.execute("SELECT 1 FROM mir_job WHERE (status='PENDING' AND next_attempt_at<=?) OR (status='RUNNING' AND claimed_at<?) LIMIT 1",
+                      (now,now-LEASE_SECONDS)).fetchone() is not None
+
+def busy_robots(db, now=None):
+    """Robots avec une mission en cours ; une réservation au bail expiré (worker mort) ne bloque plus son robot."""
+    now=now or time.time()
+    return {r[0] for r in db.execute("""SELECT DISTINCT robot FROM mir_job WHERE status IN ('RUNNING','SENT') AND finished_at IS NULL
+                                          AND robot IS NOT NULL AND (status='SENT' OR claimed_at>=?)""",(now-LEASE_SECONDS,))}
+
+def claim_due(db, robots, limit=5, now=None):
+    """Réserve les missions dues, une par robot libre parmi `robots` (ordre de préférence).
+    Les robots occupés sont relus sous le verrou d'écriture : deux workers ne confient
+    jamais deux missions au même robot. Retourne [(job_id, guid, tentative, robot)]."""
+    now=now or time.time()
+    if not robots or not has_due(db,now): return []   # lecture seule : pas de verrou d'écriture à vide
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        for (job_id,) in db.execute("SELECT id FROM mir_job WHERE status='RUNNING' AND claimed_at<? ORDER BY id",(now-LEASE_SECONDS,)).fetchall():
+            try:
+                db.execute("UPDATE mir_job SET status='PENDING', robot=NULL, updated_at=CURRENT_TIMESTAMP WHERE id=?",(job_id,))
+            except sqlite3.IntegrityError:
+                # worker mort en plein envoi, et le poste a été redemandé depuis : la mission en attente reprend le lot
+                merge(db,job_id,'bail expiré')
+                publish(db,'mir-job',{'id':job_id,'status':'MERGED','error':'bail expiré'})
+        free=[r for r in robots if r not in busy_robots(db,now)][:limit]
+        rows=db.execute("SELECT id, mission_guid, attempts FROM mir_job WHERE status='PENDING' AND next_attempt_at<=? ORDER BY next_attempt_at, id LIMIT ?",
+                        (now,len(free))).fetchall() if free else []
+        for r,robot in zip(rows,free):
+            db.execute("UPDATE mir_job SET status='RUNNING', robot=?, claimed_at=?, attempts=attempts+1, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                       (robot,now,r[0]))
+        db.commit()
+    except BaseException:
+        db.rollback(); raise
+    return [(r[0],r[1],r[2]+1,robot) for r,robot in zip(rows,free)]
+
+def complete(db, job_id, result):
+    """Mission acceptée par le robot. Sans id de mission_queue (dry-run), elle est considérée terminée."""
+    queue_id=result.get('id') if isinstance(result,dict) else None
+    now=time.time()
+    db.execute("""UPDATE mir_job SET status='SENT', result=?, last_error=NULL, mission_queue_id=?, sent_at=?,
+                    finished_at=?, mission_state=?, updated_at=CURRENT_TIMESTAMP WHERE id=?""",
+               (json.dumps(result),queue_id,now,None if queue_id is not None else now,None if queue_id is not None else 'Done',job_id))
+    publish(db,'mir-job',{'id':job_id,'status':'SENT'})
+    db.commit()
+
+def finish(db, job_id, state):
+    db.execute("UPDATE mir_job SET mission_state=?, finished_at=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",(state,time.time(),job_id))
+    publish(db,'mir-job',{'id':job_id,'status':'SENT','mission_state':state})
+    db.commit()
+
+def merge(db, job_id, error):
+    """Une mission identique a été mise en file entre-temps : elle porte la demande (et les articles du lot)."""
+    db.execute("""INSERT OR IGNORE INTO mir_job_item(job_id,item_id,added_at)
+                  SELECT p.id, i.item_id, i.added_at FROM mir_job_item i, mir_job p
+                   WHERE i.job_id=? AND p.mission_guid=(SELECT mission_guid FROM mir_job WHERE id=?) AND p.status='PENDING'""",(job_id,job_id))
+    db.execute("UPDATE mir_job SET status='MERGED', last_error=?, finished_at=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",(error,time.time(),job_id))
+
+def fail(db, job_id, attempts, error):
+    if attempts>=MAX_ATTEMPTS:
+        db.execute("UPDATE mir_job SET status='FAILED', last_error=?, finished_at=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",(error,time.time(),job_id))
+    else:
+        try:
+            db.execute("""UPDATE mir_job SET status='PENDING', last_error=?, next_attempt_at=?, robot=NULL, mission_queue_id=NULL,
+                            mission_state=NULL, sent_at=NULL, updated_at=CURRENT_TIMESTAMP WHERE id=?""",
+                       (error,time.time()+backoff(attempts),job_id))
+        except sqlite3.IntegrityError:
+            merge(db,job_id,error)
+    publish(db,'mir-job',{'id':job_id,'status':db.execute('SELECT status FROM mir_job WHERE id=?',(job_id,)).fetchone()[0],'error':error})
+    db.commit()
+
+def active_missions(db):
+    return db.execute("""SELECT id, robot, mission_queue_id, attempts, sent_at FROM mir_job
+                          WHERE status='SENT' AND finished_at IS NULL AND mission_queue_id IS NOT NULL ORDER BY id""").fetchall()
+
+def recent_jobs(db, limit=50):
+    return db.execute("""SELECT j.id, j.mission_guid, j.source, j.item_id, j.status, j.attempts, j.next_attempt_at, j.last_error,
+                                j.robot, j.mission_state, j.sent_at, j.finished_at, j.created_at, j.updated_at,
+                                (SELECT COUNT(*) FROM mir_job_item i WHERE i.job_id=j.id) AS items
+                           FROM mir_job j ORDER BY j.id DESC LIMIT ?""",(limit,)).fetchall()
+
+class Dispatcher(threading.Thread):
+    def __init__(self, database, fleet=None, poll=1.0, track_every=TRACK_SECONDS):
+        super().__init__(name='mir-dispatcher',daemon=True)
+        self.database=database; self.fleet=fleet or Fleet.from_env(); self.poll=poll; self.track_every=track_every
+        self._wake=threading.Event(); self._stopping=threading.Event(); self._tracked=0.0
+    def wake(self): self._wake.set()
+    def stop(self): self._stopping.set(); self._wake.set()
+    def run(self):
+        db=connect(self.database,timeout=30)
+        try:
+            while not self._stopping.is_set():
+                jobs=[]
+                # aucune erreur ne doit arrêter le thread : le tour est abandonné, le suivant reprend
+                # (une mission réservée et non envoyée repart à l'expiration de son bail)
+                try:
+                    if time.monotonic()-self._tracked>=self.track_every:
+                        self.track(db); self._tracked=time.monotonic()
+                    if has_due(db):
+                        jobs=claim_due(db,self.fleet.available(busy_robots(db)))
+                    for job_id,guid,attempts,robot in jobs:
+                        self.dispatch(db,job_id,guid,attempts,robot)
+                except Exception as e:
+                    if isinstance(e,sqlite3.OperationalError): log.warning('mir-dispatcher: %s',e)
+                    else: log.exception('mir-dispatcher: tour interrompu')
+                    if db.in_transaction: db.rollback()
+                    jobs=[]
+                if not jobs:
+                    self._wake.wait(min(self.poll,self.track_every)); self._wake.clear()
+        finally:
+            db.close()
+    def dispatch(self, db, job_id, guid, attempts, robot):
+        try:
+            result=self.fleet.client(robot).start_mission(guid)
+        except Exception as e:
+            log.warning('mir-dispatcher: job %s tentative %s (%s) échouée: %s',job_id,attempts,robot,e)
+            fail(db,job_id,attempts,f'{robot}: {e}')
+        else:
+            complete(db,job_id,result)
+    def track(self, db):
+        """Suit les missions envoyées : terminées, abandonnées (nouvel essai) ou sans nouvelles."""
+        for job_id,robot,queue_id,attempts,sent_at in active_missions(db):
+            if robot not in self.fleet.clients: continue
+            try:
+                state=self.fleet.client(robot).mission_queue(queue_id).get('state')
+            except Exception as e:
+                log.warning('mir-dispatcher: suivi job %s (%s): %s',job_id,robot,e); continue
+            if state in DONE_STATES: finish(db,job_id,state)
+            elif state in FAILED_STATES: fail(db,job_id,attempts,f'{robot}: mission {state}')
+            elif time.time()-sent_at>MISSION_TIMEOUT: fail(db,job_id,attempts,f'{robot}: mission sans fin après {MISSION_TIMEOUT:.0f} s ({state})')
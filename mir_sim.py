@@ -0,0 +1,141 @@
+import re, sys, json, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from mir_client import DRY_MISSIONS
+
+# Flotte MiR simulée en local (API REST v2 réduite) pour tester et mesurer le dispatcher hors ligne :
+#   GET /<robot>/status, GET /<robot>/missions, POST /<robot>/mission_queue, GET /<robot>/mission_queue/<id>
+# Même forme de réponses que le dry-run de mir_client, mais les missions durent, la batterie se
+# vide en mission et se recharge à l'arrêt, avec latence et pannes réglables.
+#   python mir_sim.py --robots 3 --port 8090 --speed 10 --fail-rate 0.02
+#   MIR_FLEET=http://127.0.0.1:8090/mir1,http://127.0.0.1:8090/mir2,http://127.0.0.1:8090/mir3
+
+class SimRobot:
+    """Robot simulé : file de missions exécutées une à une, horloge accélérée par `speed`."""
+    def __init__(self, name, mission_seconds=120.0, speed=1.0, abort_rate=0.0, drain=0.05, charge=0.1, rnd=None):
+        self.name=name; self.mission_seconds=mission_seconds; self.speed=speed; self.abort_rate=abort_rate
+        self.drain=drain; self.charge=charge   # % de batterie par seconde simulée (en mission / à l'arrêt)
+        self.rnd=rnd or random.Random(); self.lock=threading.Lock()
+        self.battery=100.0; self.queue=[]; self.current=None; self.missions={}; self.next_id=1
+        self.started=time.monotonic(); self.clock=0.0; self.completed=self.aborted=0
+    def now(self):
+        return (time.monotonic()-self.started)*self.speed
+    def tick(self):
+        """Avance l'horloge simulée jusqu'à maintenant (appelé sous verrou à chaque requête)."""
+        now=self.now()
+        while self.clock<now:
+            if self.current is None and self.queue:
+                self.current=self.queue.pop(0); m=self.missions[self.current]
+                m['state']='Executing'; m['started']=self.clock
+                m['ends']=self.clock+self.mission_seconds*self.rnd.uniform(0.6,1.4)
+            if self.current is None:
+                self.battery=min(100.0,self.battery+self.charge*(now-self.clock)); self.clock=now; break
+            m=self.missions[self.current]; step=min(now,m['ends'])-self.clock
+            self.battery=max(0.0,self.battery-self.drain*step); self.clock+=step
+            if self.clock>=m['ends']:
+                aborted=self.rnd.random()<self.abort_rate
+                m['state']='Aborted' if aborted else 'Done'; m['finished']=self.clock; self.current=None
+                if aborted: self.aborted+=1
+                else: self.completed+=1
+    def status(self):
+        with self.lock:
+            self.tick()
+            m=self.missions.get(self.current)
+            return {'robot_name':self.name,'state_text':'Executing' if m else 'Ready',
+                    'mission_text':m['mission_id'] if m else 'Waiting for new missions',
+                    'battery_percentage':round(self.battery,1),'mission_queue_id':self.current,
+                    'position':{'x':round(self.clock%50,2),'y':0.0,'orientation':0.0}}
+    def enqueue(self, mission_id):
+        with self.lock:
+            self.tick()
+            qid=self.next_id; self.next_id+=1
+            self.missions[qid]={'id':qid,'mission_id':mission_id,'state':'Pending','queued':self.clock}
+            self.queue.append(qid)
+            return dict(self.missions[qid])
+    def mission(self, qid):
+        with self.lock:
+            self.tick()
+            m=self.missions.get(qid)
+            return dict(m) if m else None
+
+class Simulator:
+    def __init__(self, robots=3, mission_seconds=120.0, speed=1.0, latency_ms=20.0, jitter_ms=10.0,
+                 fail_rate=0.0, abort_rate=0.0, seed=None):
+        self.rnd=random.Random(seed)
+        self.robots={f'mir{i+1}':SimRobot(f'mir{i+1}',mission_seconds,speed,abort_rate,rnd=random.Random(self.rnd.random()))
+                     for i in range(robots)}
+        self.latency_ms=latency_ms; self.jitter_ms=jitter_ms; self.fail_rate=fail_rate
+        self.requests=self.failures=0; self.server=None
+    def urls(self, host='127.0.0.1'):
+        port=self.server.server_address[1]
+        return {name:f'http://{host}:{port}/{name}' for name in self.robots}
+    def fleet_spec(self, host='127.0.0.1'):
+        return ','.join(f'{n}={u}' for n,u in self.urls(host).items())
+    def handle(self, method, path, body):
+        """(code HTTP, réponse JSON) ; latence et pannes injectées ici."""
+        self.requests+=1
+        delay=max(0.0,self.latency_ms+self.rnd.uniform(-self.jitter_ms,self.jitter_ms))/1000
+        if delay: time.sleep(delay)
+        if self.rnd.random()<self.fail_rate:
+            self.failures+=1; return 503,{'error':'simulated failure'}
+        m=re.match(r'^/(\w+)(/.*)$',path)
+        robot=self.robots.get(m.group(1)) if m else None
+        if robot is None: return 404,{'error':'unknown robot'}
+        route=m.group(2).rstrip('/')
+        if method=='GET' and route=='/status': return 200,robot.status()
+        if method=='GET' and route=='/missions': return 200,[dict(x) for x in DRY_MISSIONS]
+        if method=='POST' and route=='/mission_queue':
+            mission_id=(body or {}).get('mission_id')
+            if mission_id not in {x['guid'] for x in DRY_MISSIONS}: return 400,{'error':'unknown mission'}
+            return 201,robot.enqueue(mission_id)
+        q=re.match(r'^/mission_queue/(\d+)$',route)
+        if method=='GET' and q:
+            found=robot.mission(int(q.group(1)))
+            return (200,found) if found else (404,{'error':'unknown mission_queue id'})
+        return 404,{'error':'not found'}
+    def serve(self, port=0, host='127.0.0.1'):
+        """Démarre le serveur HTTP dans un thread ; port=0 : port libre."""
+        sim=self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version='HTTP/1.1'
+            def _reply(self, code, payload):
+                data=json.dumps(payload).encode()
+                self.send_response(code); self.send_header('Content-Type','application/json')
+                self.send_header('Content-Length',str(len(data))); self.end_headers(); self.wfile.write(data)
+            def do_GET(self): self._reply(*sim.handle('GET',self.path,None))
+            def do_POST(self):
+                raw=self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                try: body=json.loads(raw or b'{}')
+                except ValueError: return self._reply(400,{'error':'invalid json'})
+                self._reply(*sim.handle('POST',self.path,body))
+            def log_message(self, *args): pass
+        self.server=ThreadingHTTPServer((host,port),Handler); self.server.daemon_threads=True
+        threading.Thread(target=self.server.serve_forever,name='mir-sim',daemon=True).start()
+        return self
+    def stop(self):
+        if self.server: self.server.shutdown(); self.server.server_close()
+    def stats(self):
+        return {'requests':self.requests,'failures':self.failures,
+                'robots':{n:{'completed':r.completed,'aborted':r.aborted,'battery':round(r.battery,1)} for n,r in self.robots.items()}}
+
+def main():
+    ap=argparse.ArgumentParser(description='Flotte MiR simulée')
+    ap.add_argument('--robots',type=int,default=3)
+    ap.add_argument('--port',type=int,default=8090)
+    ap.add_argument('--host',default='127.0.0.1')
+    ap.add_argument('--mission-seconds',type=float,default=120.0,help='durée moyenne d\'une mission (temps simulé)')
+    ap.add_argument('--speed',type=float,default=1.0,help='accélération du temps simulé')
+    ap.add_argument('--latency-ms',type=float,default=20.0)
+    ap.add_argument('--jitter-ms',type=float,default=10.0)
+    ap.add_argument('--fail-rate',type=float,default=0.0,help='part des requêtes en erreur 503')
+    ap.add_argument('--abort-rate',type=float,default=0.0,help='part des missions abandonnées')
+    ap.add_argument('--seed',type=int)
+    a=ap.parse_args()
+    sim=Simulator(a.robots,a.mission_seconds,a.speed,a.latency_ms,a.jitter_ms,a.fail_rate,a.abort_rate,a.seed).serve(a.port,a.host)
+    print(f'MIR_FLEET={sim.fleet_spec(a.host)}',flush=True)
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        sim.stop(); print(json.dumps(sim.stats()))
+
+if __name__=='__main__':
+    sys.exit(main())
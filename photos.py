@@ -0,0 +1,131 @@
+import os, re, hashlib, logging, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Photos des articles : stockage adressé par contenu (sha256), dédoublonné, et variantes
+# (vignette, taille web) générées en arrière-plan. L'upload est écrit sur disque et haché
+# au fil de la réception (PhotoRequest), sans copie ni relecture du fichier.
+#   uploads/blobs/3f/3fa9…e1.jpg            original
+#   uploads/variants/3f/3fa9…e1-thumb.jpg   vignette (et -web.jpg)
+# Pillow est optionnel : sans lui, pas de variantes, l'original est servi.
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image=None
+
+log=logging.getLogger(__name__)
+
+MAX_BYTES=int(float(os.getenv('PHOTO_MAX_MB','25'))*1024*1024)
+WORKERS=int(os.getenv('PHOTO_WORKERS','2'))
+VARIANTS={'thumb':(256,75),'web':(1280,82)}   # variante -> (plus grand côté en px, qualité JPEG)
+CHUNK=64*1024
+NAME=re.compile(r'^([0-9a-f]{64})\.(jpg|png|gif|webp)$')
+MAGIC=[(b'\xff\xd8\xff','jpg'),(b'\x89PNG\r\n\x1a\n','png'),(b'GIF87a','gif'),(b'GIF89a','gif')]
+
+def sniff(head):
+    """Type réel d'après les premiers octets (l'extension du client n'est pas fiable)."""
+    if head[:4]==b'RIFF' and head[8:12]==b'WEBP': return 'webp'
+    return next((ext for magic,ext in MAGIC if head.startswith(magic)),None)
+
+def is_addressed(name):
+    return bool(name and NAME.match(name))
+
+class Ingest:
+    """Fichier temporaire haché au fil de l'eau (à passer comme flux d'upload à werkzeug)."""
+    def __init__(self, root, max_bytes=MAX_BYTES):
+        tmp=os.path.join(root,'tmp'); os.makedirs(tmp,exist_ok=True)
+        self.file=tempfile.NamedTemporaryFile(dir=tmp,prefix='up-',delete=False)
+        self.hash=hashlib.sha256(); self.size=0; self.head=b''; self.max_bytes=max_bytes; self.kept=False
+    def write(self, data):
+        self.size+=len(data)
+        if self.size>self.max_bytes:
+            self.close()   # werkzeug abandonne le flux sans le fermer : le fichier temporaire partirait en fuite
+            raise RequestEntityTooLarge(f'photo limitée à {self.max_bytes//(1024*1024)} Mo')
+        if len(self.head)<16: self.head+=data[:16-len(self.head)]
+        self.hash.update(data)
+        return self.file.write(data)
+    def close(self):
+        self.file.close()
+        if not self.kept:
+            try: os.unlink(self.file.name)
+            except OSError: pass
+    def __getattr__(self, name):   # read, seek, tell, readline… délégués au fichier
+        return getattr(self.file,name)
+
+class PhotoRequest(Request):
+    """Requête Flask dont les uploads de la route photo passent directement par Ingest."""
+    photo_endpoints=('upload_photo',)
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint in self.photo_endpoints:
+            return Ingest(current_app.config['UPLOAD_FOLDER'])
+        return super()._get_file_stream(total_content_length,content_type,filename,content_length)
+
+def blob_path(root, name):
+    return os.path.join(root,'blobs',name[:2],name)
+
+def variant_path(root, name, variant):
+    digest=NAME.match(name).group(1)
+    return os.path.join(root,'variants',name[:2],f'{digest}-{variant}.jpg')
+
+def store(root, stream):
+    """Finalise un upload : (nom adressé, créé?). Un contenu déjà connu n'est pas réécrit."""
+    ingest=stream if isinstance(stream,Ingest) else Ingest(root)
+    try:
+        if ingest is not stream:
+            for chunk in iter(lambda: stream.read(CHUNK),b''): ingest.write(chunk)
+        ingest.file.flush()
+        ext=sniff(ingest.head)
+        if not ext: raise ValueError('Fichier non reconnu comme image (JPEG, PNG, GIF, WebP)')
+        name=f'{ingest.hash.hexdigest()}.{ext}'; final=blob_path(root,name)
+        if os.path.exists(final): return name,False
+        os.makedirs(os.path.dirname(final),exist_ok=True)
+        os.fsync(ingest.file.fileno()); ingest.file.close()
+        os.replace(ingest.file.name,final); ingest.kept=True
+        return name,True
+    finally:
+        ingest.close()
+
+def generate(root, name):
+    """Crée les variantes manquantes d'une photo (écriture atomique)."""
+    src=blob_path(root,name)
+    with Image.open(src) as im:
+        im=ImageOps.exif_transpose(im)
+        if im.mode not in ('RGB','L'): im=im.convert('RGB')
+        for variant,(side,quality) in VARIANTS.items():
+            out=variant_path(root,name,variant)
+            if os.path.exists(out): continue
+            os.makedirs(os.path.dirname(out),exist_ok=True)
+            copy=im.copy(); copy.thumbnail((side,side))
+            tmp=out+'.tmp'; copy.save(tmp,'JPEG',quality=quality,optimize=True,progressive=True)
+            os.replace(tmp,out)
+
+class VariantPool:
+    """Génération des variantes hors requête, une tâche au plus par photo."""
+    def __init__(self, root, workers=WORKERS):
+        self.root=root; self.workers=workers; self._executor=None
+        self._pending=set(); self._lock=threading.Lock()
+        self.done=self.failed=0
+    def schedule(self, name):
+        if Image is None or not is_addressed(name): return False
+        if all(os.path.exists(variant_path(self.root,name,v)) for v in VARIANTS): return False
+        with self._lock:
+            if name in self._pending: return False
+            self._pending.add(name)
+            if self._executor is None:
+                self._executor=ThreadPoolExecutor(max_workers=self.workers,thread_name_prefix='photo-variants')
+        self._executor.submit(self._run,name)
+        return True
+    def _run(self, name):
+        try:
+            generate(self.root,name); self.done+=1
+        except Exception as e:
+            self.failed+=1; log.warning('photos: variantes de %s non générées: %s',name,e)
+        finally:
+            with self._lock: self._pending.discard(name)
+    def join(self):
+        if self._executor is not None: self._executor.shutdown(wait=True); self._executor=None
+    def stats(self):
+        with self._lock:
+            return {'pillow':Image is not None,'pending':len(self._pending),'done':self.done,'failed':self.failed}
@@ -1,5 +1,6 @@
+import re, heapq, threading
 from dataclasses import dataclass
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Callable, Dict, Iterable
 
 @dataclass
 class Item:
@@ -32,6 +33,27 @@ def can_move(item: Item, location: Location, occupied_count: int = 0) -> Tuple[b
             return False, f"Le chariot {item.size} ne peut pas aller sur {location.code} (attendu: {location.size})."
     return True, "OK"
 
+def can_move_many(moves: List[Tuple[Item, Location]], occupancy: Dict[int, int]) -> List[Tuple[bool, str]]:
+    # Validation d'un lot : mêmes règles que can_move, l'occupation consommée par les
+    # mouvements acceptés du lot est prise en compte (occupancy: location_id -> nb d'articles).
+    occ = dict(occupancy)
+    out = []
+    for item, location in moves:
+        ok, msg = can_move(item, location, occ.get(location.id, 0))
+        if ok:
+            occ[location.id] = occ.get(location.id, 0) + 1
+        out.append((ok, msg))
+    return out
+
+# Actions rapides des postes -> code de l'emplacement destination
+STATION_ACTIONS = {
+    'TO_PHOTO': 'POSTE-PHOTO',
+    'TO_INSPECTION': 'POSTE-INSPECTION',
+    'TO_EMBALLAGE': 'POSTE-EMBALLAGE',
+    'INSPECT_OK': 'POSTE-EMBALLAGE',
+    'INSPECT_NOK': 'POSTE-INSPECTION',
+}
+
 def next_status_for_location(location: Location) -> Optional[str]:
     if location.code == 'POSTE-PHOTO':
         return 'PHOTO'
@@ -55,3 +77,123 @@ def choose_slot(slots: List[Location], item: Item) -> Optional[Location]:
             if loc.kind == 'SOL' and loc.size == 'PETIT':
                 return loc
     return None
+
+def fts_query(q: str) -> Optional[str]:
+    # "SKU-00 bl12" -> '"SKU"* "00"* "bl12"*' : tous les termes requis, en préfixe
+    # (sauf un terme d'un caractère : sans index de préfixe, il fusionnerait une bonne part du vocabulaire)
+    terms = re.findall(r'\w+', q)
+    if not terms:
+        return None
+    return ' '.join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in terms)
+
+# --- Allocation des emplacements SOL ---------------------------------------
+
+def sol_grid(code: str) -> Tuple[int, int]:
+    # 'S-C4' -> (2, 4) : rangée (lettre) et colonne
+    m = re.match(r'S-([A-Z])(\d+)$', code)
+    if not m:
+        return (99, 99)
+    return (ord(m.group(1)) - ord('A'), int(m.group(2)))
+
+# Stratégies de placement : clé de tri d'un emplacement, la plus petite est servie en premier
+def by_code(loc: Location):
+    return loc.code
+
+def fill_by_row(loc: Location):
+    return sol_grid(loc.code)
+
+def nearest_to(origin: str) -> Callable[[Location], tuple]:
+    orow, ocol = sol_grid(origin)
+    def key(loc: Location):
+        row, col = sol_grid(loc.code)
+        return (abs(row - orow) + abs(col - ocol), loc.code)
+    return key
+
+def placement_strategy(spec: Optional[str]) -> Callable[[Location], object]:
+    # 'code' (défaut), 'row', 'nearest:S-A1'
+    spec = (spec or 'code').strip()
+    if spec == 'row':
+        return fill_by_row
+    if spec.startswith('nearest:'):
+        return nearest_to(spec.split(':', 1)[1])
+    return by_code
+
+class SlotAllocator:
+    """Ensembles d'emplacements SOL libres par taille, ordonnés selon la stratégie.
+
+    Tas par taille avec suppression paresseuse : allocate/release en O(log n), take en O(1).
+    `generation` est la version de l'occupation en base à laquelle l'état correspond.
+    """
+    def __init__(self, strategy: Callable[[Location], object] = by_code):
+        self.strategy = strategy
+        self.generation: Optional[int] = None
+        self.lock = threading.RLock()
+        self._slots: Dict[int, Location] = {}
+        self._free: Dict[int, Location] = {}
+        self._heaps: Dict[str, list] = {}
+
+    def load(self, locations: Iterable[Location], occupied_ids: Iterable[int], generation: Optional[int] = None):
+        with self.lock:
+            occupied = set(occupied_ids)
+            self._slots = {loc.id: loc for loc in locations}
+            self._free = {i: loc for i, loc in self._slots.items() if i not in occupied}
+            self._heaps = {}
+            for loc in self._free.values():
+                self._heaps.setdefault(loc.size, []).append(self._entry(loc))
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+            self.generation = generation
+
+    def _entry(self, loc: Location):
+        return (self.strategy(loc), loc.code, loc.id)
+
+    def release(self, loc_id: int):
+        with self.lock:
+            loc = self._slots.get(loc_id)
+            if loc is None or loc_id in self._free:
+                return
+            self._free[loc_id] = loc
+            heap = self._heaps.setdefault(loc.size, [])
+            heapq.heappush(heap, self._entry(loc))
+            if len(heap) > 2 * len(self._free) + 16:
+                self._compact(loc.size)
+
+    def take(self, loc_id: int):
+        with self.lock:
+            self._free.pop(loc_id, None)
+
+    def peek(self, size: Optional[str]) -> Optional[Location]:
+        with self.lock:
+            heap = self._heaps.get(size) or []
+            while heap and heap[0][2] not in self._free:
+                heapq.heappop(heap)
+            return self._free[heap[0][2]] if heap else None
+
+    def allocate(self, size: Optional[str]) -> Optional[Location]:
+        with self.lock:
+            loc = self.peek(size)
+            if loc is not None:
+                self.take(loc.id)
+            return loc
+
+    def free_slots(self, size: Optional[str] = None) -> List[Location]:
+        with self.lock:
+            return sorted((l for l in self._free.values() if size is None or l.size == size), key=lambda l: l.code)
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            out: Dict[str, int] = {}
+            for loc in self._free.values():
+                out[loc.size] = out.get(loc.size, 0) + 1
+            return out
+
+    def diff(self, free_ids: Iterable[int]) -> Tuple[List[int], List[int]]:
+        # (libres en base mais absents ici, présents ici mais occupés en base)
+        with self.lock:
+            expected = set(free_ids)
+            return sorted(expected - set(self._free)), sorted(set(self._free) - expected)
+
+    def _compact(self, size: str):
+        heap = [self._entry(l) for l in self._free.values() if l.size == size]
+        heapq.heapify(heap)
+        self._heaps[size] = heap
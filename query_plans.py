@@ -0,0 +1,108 @@
+import os, re, sys, random, sqlite3, tempfile
+
+# Non-régression des plans de requêtes : on rejoue les routes de l'app sur une base seedée,
+# on capture chaque requête émise (trace sqlite) et on passe chacune dans EXPLAIN QUERY PLAN.
+# Échec si une requête fait un SCAN complet de item/movement. Un parcours d'index n'est toléré
+# que si la requête est bornée par LIMIT (arrêt anticipé, ex. listing ORDER BY created_at).
+#   python query_plans.py            -> code retour 1 si régression
+
+WATCHED_TABLES=('item','movement')
+SKIP_PREFIXES=('--','PRAGMA','BEGIN','COMMIT','ROLLBACK','CREATE','ALTER','DROP','SAVEPOINT','RELEASE','ANALYZE','VACUUM')
+# Scans connus et acceptés : (regex sur le SQL, raison). Toute entrée ici est une dette à résorber.
+KNOWN_SCANS=[]
+_KEYWORDS={'where','left','inner','join','on','order','group','limit','set','values','using','natural','cross'}
+
+def aliases(sql):
+    out={t:t for t in WATCHED_TABLES}
+    for table,alias in re.findall(r'\b('+'|'.join(WATCHED_TABLES)+r')\b(?:\s+AS)?\s+(\w+)',sql,re.I):
+        if alias.lower() not in _KEYWORDS: out[alias]=table.lower()
+    return out
+
+def plan(db, sql):
+    return [r[3] for r in db.execute('EXPLAIN QUERY PLAN '+sql).fetchall()]
+
+def full_scans(db, sql):
+    names=aliases(sql); bad=[]
+    details=plan(db,sql)
+    # LIMIT n'arrête le parcours que si l'ordre vient de l'index (pas de tri temporaire) ; le tri de la
+    # sortie d'une sous-requête (fusion UNION ALL de pages keyset) ne porte que sur ses LIMIT lignes
+    sorts=[d for i,d in enumerate(details) if 'TEMP B-TREE' in d and not (i and details[i-1].startswith('SCAN (subquery'))]
+    bounded=re.search(r'\bLIMIT\s+\d+',sql,re.I) is not None and not sorts
+    for detail in details:
+        m=re.match(r'SCAN (\w+)(.*)',detail)
+        if not m or m.group(1) not in names: continue
+        if bounded and 'INDEX' in m.group(2): continue
+        bad.append(detail)
+    return bad
+
+def seed_sample(db, n_items=500, n_moves=3):
+    rnd=random.Random(42)
+    locs=[r[0] for r in db.execute('SELECT id FROM location').fetchall()]
+    statuses=['RECU','PHOTO','INSPECTION','EMBALLAGE','STOCK','NOGO']
+    for i in range(1,n_items+1):
+        db.execute('INSERT INTO item(sku,description,size,status,location_id,avis_no,order_no,bl_no) VALUES (?,?,?,?,?,?,?,?)',
+                   (f'SKU-{i:05d}',f'Pièce {i}',rnd.choice(['GRAND','PETIT']),rnd.choice(statuses),None,
+                    f'AV{i%40}',f'CMD{i%70}',f'BL{i%90}'))
+        for _ in range(n_moves):
+            db.execute('INSERT INTO movement(item_id,from_location_id,to_location_id,action) VALUES (?,?,?,?)',
+                       (i,rnd.choice(locs),rnd.choice(locs),'MOVE'))
+    db.commit()
+
+def drive(client, db):
+    """Parcourt les routes de l'app pour faire émettre toutes ses requêtes."""
+    def first(status):
+        r=db.execute('SELECT id FROM item WHERE status=? AND location_id IS NULL LIMIT 1',(status,)).fetchone()
+        return r[0] if r else 1
+    for path in ['/','/items','/items?q=SKU-0001','/items?q=cmd7&page=2','/items/1','/work/photo','/work/inspection',
+                 '/work/emballage','/locations','/locations?kind=SOL&show=all','/readyz',
+                 '/api/v1/items?limit=5','/api/v1/items?status=STOCK,NOGO&limit=5','/api/v1/items?location_kind=SOL&limit=5',
+                 '/api/v1/items?bl_no=BL7','/api/v1/items?avis_no=AV3','/api/v1/items?order_no=CMD1','/api/v1/items?updated_since=2024-01-01&limit=5',
+                 '/api/v1/movements?limit=5','/api/v1/movements?item_id=1','/api/v1/movements?action=PUT_STOCK&since=2024-01-01&limit=5',
+                 '/api/v1/items/1','/api/v1/locations?kind=SOL','/api/v1/analytics/stations','/analytics?since=2024-01-01']:
+        client.get(path)
+    for path in ['/api/v1/items?limit=2','/api/v1/movements?limit=2','/api/v1/items?updated_since=2024-01-01&limit=2']:
+        cursor=client.get(path).get_json()['next_cursor']
+        if cursor: client.get(f'{path}&cursor={cursor}')
+    client.post('/items',data={'size':'PETIT','description':'plan'})
+    client.post(f"/items/{first('RECU')}/send_to_photo")
+    client.post(f"/items/{first('PHOTO')}/send_to_inspection")
+    client.post('/work/inspection',data={'item_id':first('INSPECTION'),'result':'OK'})
+    client.post('/work/emballage',data={'item_id':first('EMBALLAGE')})
+    client.post('/api/sync',json={'station':'PLANS','ops':[
+        {'key':'plan-1','kind':'create_item','size':'PETIT'},{'key':'plan-2','kind':'move','item_ref':'plan-1','action':'TO_PHOTO'},
+        {'key':'plan-3','kind':'inspect','item_id':first('INSPECTION'),'result':'NOK'},{'key':'plan-4','kind':'put_stock','item_id':first('EMBALLAGE')}]})
+
+def check(n_items=500):
+    tmp=tempfile.mkdtemp(prefix='plans-'); path=os.path.join(tmp,'plans.db')
+    os.environ['DATABASE']=path
+    from migrations import migrate
+    migrate(path)
+    db=sqlite3.connect(path); seed_sample(db,n_items)
+    import app as app_module
+    db.execute('ATTACH DATABASE ? AS archive',(app_module.ARCHIVE_DATABASE,))
+    app=app_module.app; seen=[]
+    app.config['SQL_TRACE']=seen.append
+    drive(app.test_client(),db)
+    failures=[]; checked=set()
+    for sql in seen:
+        sql=sql.strip()
+        if not sql or sql.upper().startswith(SKIP_PREFIXES) or sql in checked: continue
+        checked.add(sql)
+        bad=full_scans(db,sql)
+        if not bad: continue
+        known=next((why for pat,why in KNOWN_SCANS if re.search(pat,sql)),None)
+        failures.append((sql,bad,known))
+    db.close()
+    return checked,failures
+
+def main():
+    checked,failures=check()
+    regressions=[f for f in failures if not f[2]]
+    for sql,bad,known in failures:
+        tag='CONNU' if known else 'SCAN'
+        print(f"[{tag}] {' '.join(sql.split())[:160]}\n        {'; '.join(bad)}{' — '+known if known else ''}")
+    print(f'{len(checked)} requêtes vérifiées, {len(regressions)} régression(s), {len(failures)-len(regressions)} scan(s) connu(s)')
+    return 1 if regressions else 0
+
+if __name__=='__main__':
+    sys.exit(main())
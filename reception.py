@@ -0,0 +1,95 @@
+import io, csv, json
+from database import immediate
+from events import publish
+
+# Réception en masse : import CSV / JSON / NDJSON d'articles.
+# Les SKU automatiques sont pris par blocs contigus dans sku_sequence, les insertions
+# passent par executemany dans une seule transaction, les lignes invalides sont rapportées.
+
+FIELDS=('sku','description','size','avis_no','order_no','bl_no')
+SIZES=('GRAND','PETIT')
+BATCH_SIZE=1000
+MAX_REPORTED_ERRORS=500
+
+def format_sku(n):
+    return f'SKU-{n:05d}'
+
+def allocate_skus(db, count):
+    """Réserve `count` numéros consécutifs ; retourne le premier. À appeler dans une transaction d'écriture."""
+    db.execute("UPDATE sku_sequence SET next=next+? WHERE name='SKU'",(count,))
+    return db.execute("SELECT next FROM sku_sequence WHERE name='SKU'").fetchone()[0]-count
+
+class RowError(str):
+    """Ligne illisible (JSON invalide) : rapportée comme une ligne rejetée, l'import continue."""
+
+def parse_rows(stream, fmt):
+    """Itère les lignes (dict) d'un flux binaire. fmt: 'csv', 'json' ou 'ndjson'."""
+    if fmt=='json':
+        data=json.load(stream)
+        if isinstance(data,dict): data=data['items'] if 'items' in data else [data]
+        yield from (data if isinstance(data,list) else [data])
+        return
+    text=io.TextIOWrapper(stream,encoding='utf-8-sig',newline='')
+    if fmt=='ndjson':
+        for line in text:
+            if not line.strip(): continue
+            try: yield json.loads(line)
+            except ValueError as e: yield RowError(f'JSON invalide : {e}')
+        return
+    head=text.readline()
+    delimiter=';' if head.count(';')>head.count(',') else ','
+    reader=csv.DictReader(_chain_first(head,text),delimiter=delimiter)
+    for row in reader:
+        yield {(k or '').strip().lower():v for k,v in row.items()}
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
+
+def detect_format(filename=None, content_type=None):
+    name=(filename or '').lower(); ct=(content_type or '').lower()
+    if name.endswith('.ndjson') or name.endswith('.jsonl') or 'ndjson' in ct: return 'ndjson'
+    if name.endswith('.json') or 'json' in ct: return 'json'
+    return 'csv'
+
+def clean(row):
+    if isinstance(row,RowError): return None,str(row)
+    if not isinstance(row,dict): return None,'ligne non structurée'
+    out={f:(str(row.get(f)).strip() if row.get(f) is not None else '') or None for f in FIELDS}
+    size=(out['size'] or '').upper()
+    if size not in SIZES: return None,f"taille invalide {out['size']!r} (GRAND/PETIT)"
+    out['size']=size
+    return out,None
+
+def import_items(db, rows, batch_size=BATCH_SIZE):
+    """Valide et insère les lignes. Retourne le rapport
+    {'created', 'rejected', 'errors' (tronqué), 'first_id', 'last_id', 'skus': [premier, dernier] auto}.
+
+    Les lignes sont toutes lues et validées avant de prendre le verrou d'écriture : un envoi lent
+    (corps de requête sur le Wi-Fi) ne bloque pas les autres workers ; seuls l'attribution des SKU
+    et les insertions sont dans la transaction."""
+    report={'created':0,'rejected':0,'errors':[],'first_id':None,'last_id':None,'skus':None}
+    valid=[]
+    for n,row in enumerate(rows,start=1):
+        item,err=clean(row)
+        if err:
+            report['rejected']+=1
+            if len(report['errors'])<MAX_REPORTED_ERRORS: report['errors'].append({'row':n,'error':err})
+        else: valid.append(item)
+    if not valid: return report
+    with immediate(db):
+        missing=[it for it in valid if not it['sku']]
+        if missing:
+            first=allocate_skus(db,len(missing))
+            for k,it in enumerate(missing): it['sku']=format_sku(first+k)
+            report['skus']=[format_sku(first),format_sku(first+len(missing)-1)]
+        before=db.execute('SELECT seq FROM sqlite_sequence WHERE name=?',('item',)).fetchone()
+        report['first_id']=(before[0] if before else 0)+1
+        for i in range(0,len(valid),batch_size):
+            db.executemany("INSERT INTO item(sku,description,size,avis_no,order_no,bl_no,status,location_id) VALUES (?,?,?,?,?,?,'RECU',NULL)",
+                           [tuple(it[f] for f in ('sku','description','size','avis_no','order_no','bl_no')) for it in valid[i:i+batch_size]])
+        report['last_id']=db.execute('SELECT seq FROM sqlite_sequence WHERE name=?',('item',)).fetchone()[0]
+        report['created']=len(valid)
+        # un seul événement pour l'import : les écrans rechargent leur file au lieu de recevoir N lignes
+        publish(db,'items-imported',{'count':report['created'],'first_id':report['first_id'],'last_id':report['last_id']})
+    return report
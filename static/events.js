@@ -0,0 +1,42 @@
+// Flux /events (Server-Sent Events) : les écrans appliquent les changements au lieu de recharger.
+// EventSource se reconnecte seul et renvoie Last-Event-ID : rien n'est perdu entre deux connexions.
+function stockEvents(types, handlers, since){
+  let url='/events?types='+encodeURIComponent(types.join(','));
+  if(since!=null) url+='&since='+encodeURIComponent(since);
+  const es=new EventSource(url);
+  types.forEach(t=>es.addEventListener(t,e=>{
+    try{ handlers[t](JSON.parse(e.data)); }catch(err){ console.error(t,err); }
+  }));
+  // journal purgé ou client trop lent : la vue n'est plus fiable, on la recharge
+  es.addEventListener('resync',()=>{ es.close(); location.reload(); });
+  return es;
+}
+
+function escapeHtml(v){
+  return String(v??'').replace(/[&<>"']/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+}
+
+// File d'un poste : lignes <tr data-id>, gabarit <template> avec __ID__, __SKU__, __STATUS__, __LOC__.
+function stationQueue(tbody, tpl, statuses, fill){
+  const empty=tbody.querySelector('tr.empty');
+  const refresh=()=>{ if(empty) empty.hidden=!!tbody.querySelector('tr[data-id]'); };
+  const row=id=>tbody.querySelector(`tr[data-id="${id}"]`);
+  const upsert=it=>{
+    let tr=row(it.id);
+    if(!tr){
+      const html=tpl.innerHTML.replace(/__ID__/g,escapeHtml(it.id)).replace(/__SKU__/g,escapeHtml(it.sku))
+        .replace(/__STATUS__/g,escapeHtml(it.status)).replace(/__LOC__/g,escapeHtml(it.to_code||'—'));
+      tbody.insertAdjacentHTML('beforeend',html); tr=row(it.id);
+    }
+    const st=tr.querySelector('.status'); if(st) st.textContent=it.status;
+    const loc=tr.querySelector('.loc'); if(loc && it.to_code) loc.textContent=it.to_code;
+    if(fill) fill(tr,it);
+    refresh();
+  };
+  const remove=id=>{ const tr=row(id); if(tr) tr.remove(); refresh(); };
+  let reloading=null;
+  return {
+    apply(it){ statuses.includes(it.status)?upsert(it):remove(it.id); },
+    reload(){ clearTimeout(reloading); reloading=setTimeout(()=>location.reload(),500); },
+  };
+}
@@ -0,0 +1,100 @@
+// File locale d'un poste : chaque action est gardée dans localStorage puis envoyée par lots à /api/sync.
+// Une clé d'idempotence par action : renvoyer un lot après une coupure ne rejoue rien côté serveur.
+// Réseau coupé, le poste continue ; la file repart au retour de la connexion (backoff tant que ça échoue).
+const SYNC_BATCH=200;
+
+function syncKey(){
+  if(window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36)+'-'+Math.random().toString(36).slice(2,12);
+}
+
+// state : élément qui affiche le nombre d'actions en attente ; done(res, op) : résultat de chaque action envoyée
+function stationSync(station, state, done){
+  const store='stock-sync:'+station;
+  const load=()=>{ try{ return JSON.parse(localStorage.getItem(store))||[]; }catch(e){ return []; } };
+  const save=ops=>localStorage.setItem(store,JSON.stringify(ops));
+  let timer=null, delay=1000, sending=false, offline=false;
+  const render=()=>{
+    if(!state) return;
+    const n=load().length;
+    state.textContent=n?`${n} action(s) en attente${offline?' — hors ligne, nouvel essai automatique':''}`:'';
+    state.hidden=!n;
+  };
+  const schedule=ms=>{ clearTimeout(timer); timer=setTimeout(flush,ms); };
+  async function flush(){
+    if(sending) return;
+    const batch=load().slice(0,SYNC_BATCH);
+    if(!batch.length) return;
+    sending=true;
+    try{
+      const r=await fetch('/api/sync',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({station,ops:batch})});
+      if(r.status===400){
+        // lot refusé en entier (illisible) : le renvoyer tel quel ne passera jamais
+        const j=await r.json().catch(()=>({}));
+        batch.forEach(op=>done&&done({key:op.key,kind:op.kind,status:'rejected',error:j.error||'lot refusé'},op));
+        save(load().filter(op=>!batch.some(b=>b.key===op.key)));
+      }else{
+        if(!r.ok) throw new Error('HTTP '+r.status);
+        const j=await r.json(), byKey=new Map(batch.map(op=>[op.key,op]));
+        const acked=new Set(j.results.map(res=>res.key));
+        save(load().filter(op=>!acked.has(op.key)));   // relu : des actions ont pu s'ajouter pendant l'envoi
+        if(done) j.results.forEach(res=>done(res,byKey.get(res.key)));
+      }
+      offline=false; delay=1000;
+      if(load().length) schedule(0);
+    }catch(e){
+      offline=true; delay=Math.min(delay*2,60000); schedule(delay);
+    }finally{
+      sending=false; render();
+    }
+  }
+  window.addEventListener('online',()=>{ delay=1000; schedule(0); });
+  window.addEventListener('storage',e=>{ if(e.key===store) render(); });   // autre onglet du même poste
+  render(); schedule(0);
+  return {
+    push(op){
+      op.key=op.key||syncKey(); op.ts=Date.now()/1000;
+      const ops=load(); ops.push(op); save(ops); render(); schedule(0);
+      return op;
+    },
+    pending: load,
+    flush,
+  };
+}
+
+// Formulaires d'une file de poste : <form data-op="move|inspect|put_stock" [data-action] [data-expect]>.
+// Les champs (item_id, slot_id…) et le bouton cliqué forment l'opération, mise en file au lieu d'un POST ;
+// la ligne reste grisée jusqu'à l'événement item-moved (ou le conflit) qui la met à jour.
+function syncForms(root, sync, user){
+  root.addEventListener('submit',e=>{
+    const form=e.target.closest('form[data-op]');
+    if(!form) return;
+    e.preventDefault();
+    const op={kind:form.dataset.op};
+    if(form.dataset.action) op.action=form.dataset.action;
+    if(form.dataset.expect) op.expect_status=form.dataset.expect;
+    if(user) op.user=user;
+    new FormData(form).forEach((v,k)=>{ if(v!=='') op[k]=/^\d+$/.test(v)?Number(v):v; });
+    if(e.submitter && e.submitter.name) op[e.submitter.name]=e.submitter.value;
+    sync.push(op); markPending(root,op.item_id,true);
+  });
+  sync.pending().forEach(op=>markPending(root,op.item_id,true));
+}
+
+function markPending(root, itemId, on){
+  const tr=itemId!=null && root.querySelector(`tr[data-id="${itemId}"]`);
+  if(!tr) return;
+  tr.classList.toggle('pending',on);
+  tr.querySelectorAll('button,select').forEach(b=>b.disabled=on);
+}
+
+// Résultats à signaler : conflits et refus (l'action n'a pas eu lieu), dans la liste des messages de la page
+function syncNotice(list, root){
+  return (res, op)=>{
+    if(res.status==='applied') return;
+    if(op) markPending(root,op.item_id,false);
+    const li=document.createElement('li'); li.className='error';
+    li.textContent=`${op&&op.item_id?'#'+op.item_id+' : ':''}${res.error||res.status}`+(res.current?` (actuellement ${res.current.status}${res.current.location?' · '+res.current.location:''})`:'');
+    list.hidden=false; list.appendChild(li);
+  };
+}
@@ -0,0 +1,110 @@
+import os, json, time
+
+# Synchro des postes (POST /api/sync) : un poste (static/sync.js) garde ses opérations dans une file
+# locale et les envoie par lots. Chaque opération porte une clé d'idempotence (key), l'heure du poste
+# (ts, secondes epoch) et un type (create_item, move, inspect, put_stock). ts est gardé comme heure du
+# mouvement (movement.occurred_at) : une action faite hors ligne garde son heure, pas celle de l'envoi ;
+# created_at reste l'heure d'écriture (curseurs de /api/v1/movements). Le lot est appliqué dans
+# l'ordre, dans une seule transaction d'écriture ; une opération refusée (conflit avec l'état en base,
+# opération invalide) est annulée seule (SAVEPOINT) et signalée, les autres passent.
+# Une clé déjà vue renvoie le résultat enregistré (sync_op) : renvoyer un lot ne rejoue rien.
+
+SYNC_MAX=int(os.getenv('SYNC_MAX_OPS','500'))
+KEEP_DAYS=int(os.getenv('SYNC_KEEP_DAYS','30'))
+
+class SyncError(ValueError):
+    """Lot illisible : refusé en entier (400), rien n'est appliqué."""
+
+class Rejected(ValueError):
+    """Opération invalide (champ manquant, article inconnu…) : la rejouer ne changera rien."""
+
+class Conflict(Exception):
+    """L'état en base ne permet plus l'opération (article déplacé entre-temps, place prise…)."""
+    def __init__(self, message, current=None):
+        super().__init__(message); self.current=current
+
+def parse(data):
+    """{'station', 'ops':[{key, kind, ts, …}]} -> (station, ops)."""
+    if not isinstance(data,dict) or not isinstance(data.get('ops'),list): raise SyncError('ops requis')
+    ops=data['ops']
+    if not ops: raise SyncError('ops vide')
+    if len(ops)>SYNC_MAX: raise SyncError(f'lot limité à {SYNC_MAX} opérations')
+    keys=set()
+    for op in ops:
+        key=op.get('key') if isinstance(op,dict) else None
+        if not isinstance(key,str) or not 0<len(key)<=100: raise SyncError('chaque opération doit avoir une clé (key)')
+        if key in keys: raise SyncError(f'clé en double dans le lot : {key}')
+        keys.add(key)
+    return (str(data.get('station') or '')[:50] or None),ops
+
+def recorded(db, keys):
+    """Opérations déjà reçues : {clé: ligne sync_op}."""
+    keys=list(keys); out={}
+    for i in range(0,len(keys),500):
+        chunk=keys[i:i+500]
+        out.update({r[0]:r for r in db.execute(
+            f"SELECT key, status, item_id, result FROM sync_op WHERE key IN ({','.join('?'*len(chunk))})",chunk)})
+    return out
+
+def item_of(op, refs):
+    """Article visé : item_id, ou item_ref = clé de l'opération create_item qui l'a créé (même lot ou avant)."""
+    if op.get('item_id') is not None:
+        try: return int(op['item_id'])
+        except (TypeError,ValueError): raise Rejected('item_id invalide')
+    ref=op.get('item_ref')
+    if ref is None: return None
+    if refs.get(ref) is None: raise Rejected(f'article de référence {ref} inconnu ou non créé')
+    return refs[ref]
+
+def op_time(op, now):
+    """Heure de l'opération au poste (ts), bornée à [now - KEEP_DAYS, now] : une horloge de poste en avance
+    ne date pas un mouvement dans le futur. None si ts est absent ou illisible (l'heure d'application fait foi)."""
+    try: ts=float(op['ts']) if op.get('ts') is not None else None
+    except (TypeError,ValueError): return None
+    if ts is None or ts!=ts: return None   # NaN
+    return min(max(ts,now-KEEP_DAYS*86400),now)
+
+def stamp(ts):
+    """Epoch -> 'AAAA-MM-JJ HH:MM:SS' UTC, le format de CURRENT_TIMESTAMP."""
+    return time.strftime('%Y-%m-%d %H:%M:%S',time.gmtime(ts)) if ts is not None else None
+
+def apply(db, station, ops, handlers, now=None):
+    """Applique le lot dans la transaction d'écriture courante. handlers : {kind: fn(op, item_id, at) -> dict}
+    (le dict du résultat, avec item_id), at : heure de l'opération au poste ('AAAA-MM-JJ HH:MM:SS' UTC, None
+    à défaut) ; fn lève Conflict ou Rejected pour refuser l'opération.
+    Toute autre exception annule le lot entier (la transaction de l'appelant).
+    Retourne un résultat par opération, dans l'ordre : status applied | conflict | rejected, duplicate si déjà reçue."""
+    now=now or time.time()
+    seen=recorded(db,{op['key'] for op in ops}|{op['item_ref'] for op in ops if isinstance(op.get('item_ref'),str)})
+    refs={k:r[2] for k,r in seen.items()}; results=[]
+    for op in ops:
+        key=op['key']; kind=op.get('kind')
+        if key in seen:
+            results.append({**json.loads(seen[key][3]),'duplicate':True}); continue
+        ts=op_time(op,now)
+        res={'key':key,'kind':kind}
+        db.execute('SAVEPOINT sync_op')
+        try:
+            if kind not in handlers: raise Rejected(f"type d'opération inconnu {kind!r}")
+            res.update(handlers[kind](op,item_of(op,refs),stamp(ts)),status='applied')
+        except (Conflict,ValueError,TypeError) as e:   # ValueError/TypeError : champ mal typé -> rejected
+            db.execute('ROLLBACK TO sync_op')
+            res.update(status='conflict' if isinstance(e,Conflict) else 'rejected',error=str(e))
+            if getattr(e,'current',None): res['current']=e.current
+        db.execute('RELEASE sync_op')
+        if ts is not None: res['lag_s']=round(max(0.0,now-ts),3)
+        db.execute('INSERT INTO sync_op(key,station,kind,client_ts,status,item_id,result) VALUES (?,?,?,?,?,?,?)',
+                   (key,station,str(kind)[:30],ts,res['status'],res.get('item_id'),json.dumps(res)))
+        refs[key]=res.get('item_id') if res['status']=='applied' else None
+        results.append(res)
+    return results
+
+def purge(db, days=KEEP_DAYS):
+    """Oublie les clés plus vieilles que `days` jours (un poste ne renvoie pas un lot après si longtemps)."""
+    return db.execute("DELETE FROM sync_op WHERE created_at<datetime('now',?)",(f'-{int(days)} days',)).rowcount
+
+def summary(results):
+    counts={s:0 for s in ('applied','conflict','rejected','duplicate')}
+    for r in results:
+        counts['duplicate' if r.get('duplicate') else r['status']]+=1
+    return {**counts,'results':results}